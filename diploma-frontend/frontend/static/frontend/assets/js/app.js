@@ -184,7 +184,10 @@ createApp({
 		}
 	},
 	mounted() {
-		this.getCategories()
+		// главная страница получает категории в ответе /api/home (index.js)
+		if (!this.categoriesFromHome) {
+			this.getCategories()
+		}
 		this.getBasket()
 		// this.getLastOrder()
 	},
@@ -1,48 +1,32 @@
 var mix = {
 	methods: {
-		getBanners() {
-			this.getData("/api/banners")
+		getHomeData() {
+			// баннеры, популярные, лимитированные товары и категории одним запросом
+			this.getData("/api/home")
 				.then(data => {
-					this.banners = data
+					this.banners = data.banners
+					this.popularCards = data.popular
+					this.limitedCards = data.limited
+					this.categories = data.categories
 				}).catch(() => {
 				this.banners = []
-				console.warn('Ошибка при получении баннеров')
-			})
-		},
-		getPopularProducts() {
-			this.getData("/api/products/popular")
-				.then(data => {
-					this.popularCards = data
-				})
-				.catch((error) => {
-					console.log('----', error)
-					this.popularCards = []
-					console.warn('Ошибка при получении списка популярных товаров')
-				})
-		},
-		getLimitedProducts() {
-			this.getData("/api/products/limited")
-				.then(data => {
-					this.limitedCards = data
-				}).catch(() => {
+				this.popularCards = []
 				this.limitedCards = []
-				console.warn('Ошибка при получении списка лимитированных товаров')
+				console.warn('Ошибка при получении данных главной страницы')
+				this.getCategories()
 			})
 		},
 	},
 	mounted() {
-		this.getBanners();
-		this.getPopularProducts();
-		this.getLimitedProducts();
+		this.getHomeData();
 	},
-   created() {
-     this.getLimitedProducts()
-   },
 	data() {
 		return {
 			banners: [],
 			popularCards: [],
 			limitedCards: [],
+			// категории приходят в /api/home, app.js не запрашивает их отдельно
+			categoriesFromHome: true,
 		}
 	}
-}
\ No newline at end of file
+}
@@ -8,6 +8,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from basket.cart import merge_anonymous_cart
+
 logger = logging.getLogger(__name__)  # Создаем логгер
 
 
@@ -35,10 +37,13 @@ class SignUp(APIView):
         user.save()
         logger.info(f"Создан новый пользователь: {user.first_name}")
         # Сразу логиним нового пользователя
+        response = Response({"status": "ok"}, status=200)
         if user.is_active:
             login(request=request, user=user)
+            # переносим анонимную корзину в корзину пользователя
+            merge_anonymous_cart(request, response)
 
-        return Response({"status": "ok"}, status=200)
+        return response
 
 
 class SingIn(APIView):
@@ -61,7 +66,10 @@ class SingIn(APIView):
         if user is not None and user.is_active:
             # если пользователь и пароль верны логиним его в системе
             login(request=request, user=user)
-            return Response({"status": "ok"}, status=200)
+            response = Response({"status": "ok"}, status=200)
+            # переносим анонимную корзину в корзину пользователя
+            merge_anonymous_cart(request, response)
+            return response
         else:
             return Response({"error": "Incorrect login or password"}, status=401)
 
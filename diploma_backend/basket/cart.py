@@ -0,0 +1,321 @@
+"""
+Корзина анонимного пользователя
+
+Корзина - словарь {id товара: кол-во} в порядке добавления товаров.
+Хранится компактной строкой "12:3,15:1" в одном из хранилищ:
+
+- "db" - сессия Django (строка таблицы django_session). Изменение
+  перечитывает данные сессии под SELECT ... FOR UPDATE, поэтому запросы
+  из двух вкладок не теряют изменений друг друга;
+- "cache" - общий кеш, в cookie только id корзины. Изменение выполняется
+  под блокировкой в кеше (для нескольких процессов кеш должен быть общим);
+- "cookie" - подписанная cookie, на сервере ничего не хранится.
+  Параллельные изменения не сливаются: побеждает последний ответ.
+
+Хранилище выбирает настройка BASKET_ANONYMOUS_CART.
+Изменения корзины - приращения кол-ва (add/remove), которые применяются
+к актуальному состоянию хранилища, а не к прочитанной в начале запроса копии.
+Сравнение хранилищ: python manage.py benchmark_cart
+"""
+
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import transaction
+
+from products.models import Product
+
+from .models import Basket
+
+# ключ корзины в данных сессии и имена cookie
+SESSION_CART_KEY = "cart"
+CART_COOKIE = "cart"
+CART_ID_COOKIE = "cart_id"
+CART_COOKIE_SALT = "basket.cart"
+CART_CACHE_KEY = "basket:cart:{cart_id}"
+DB_SESSION_ENGINE = "django.contrib.sessions.backends.db"
+
+
+def cart_max_age() -> int:
+    """
+    Время жизни анонимной корзины в секундах
+    """
+    return getattr(settings, "BASKET_CART_MAX_AGE", 60 * 60 * 24 * 30)
+
+
+def encode_cart(lines: dict) -> str:
+    """
+    Упаковывает {id товара: кол-во} в строку "12:3,15:1"
+    """
+    return ",".join(f"{product_id}:{count}" for product_id, count in lines.items())
+
+
+def decode_cart(value) -> dict:
+    """
+    Распаковывает корзину из encode_cart
+
+    Понимает и прежний формат сессии - список
+    [{"product_id": 12, "count": 3}, ...]. Испорченная строка - пустая корзина
+    """
+    lines = {}
+    try:
+        if isinstance(value, list):
+            pairs = ((item["product_id"], item["count"]) for item in value)
+        elif value:
+            pairs = (line.split(":") for line in value.split(","))
+        else:
+            pairs = ()
+        for product_id, count in pairs:
+            lines[int(product_id)] = lines.get(int(product_id), 0) + int(count)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return {}
+    return {product_id: count for product_id, count in lines.items() if count > 0}
+
+
+def merge_line(lines: dict, product_id: int, delta: int) -> dict:
+    """
+    Добавит к позиции product_id delta единиц товара
+
+    Позиция, кол-во в которой стало нулевым или отрицательным, удаляется
+    """
+    count = lines.get(product_id, 0) + delta
+    if count > 0:
+        lines[product_id] = count
+    else:
+        lines.pop(product_id, None)
+    return lines
+
+
+@contextmanager
+def cache_lock(key: str, timeout: int = 5):
+    """
+    Блокировка на cache.add: ждет освобождения не дольше timeout секунд
+    """
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + timeout
+    while not cache.add(lock_key, 1, timeout):
+        if time.monotonic() > deadline:
+            # владелец блокировки завис - ключ истечет сам, работаем без нее
+            break
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+class AnonymousCart:
+    """
+    Базовый класс хранилища корзины анонимного пользователя
+
+    Наследники реализуют lines() и apply(), а cookie, если они нужны,
+    выставляют в save()
+    """
+
+    name = ""
+
+    def __init__(self, request):
+        self.request = request
+
+    def lines(self) -> dict:
+        """
+        Вернет корзину {id товара: кол-во}
+        """
+        raise NotImplementedError
+
+    def apply(self, product_id: int, delta: int) -> dict:
+        """
+        Атомарно изменит кол-во товара product_id на delta и вернет корзину
+        """
+        raise NotImplementedError
+
+    def add(self, product_id: int, count: int) -> dict:
+        return self.apply(int(product_id), int(count))
+
+    def remove(self, product_id: int, count: int) -> dict:
+        return self.apply(int(product_id), -int(count))
+
+    def clear(self) -> None:
+        """
+        Очистит корзину
+        """
+        raise NotImplementedError
+
+    def save(self, response) -> None:
+        """
+        Запишет в ответ cookie хранилища
+        """
+
+
+class SessionCart(AnonymousCart):
+    """
+    Корзина в сессии Django
+
+    С движком сессий db изменение выполняется в транзакции: строка сессии
+    блокируется SELECT ... FOR UPDATE, корзина читается из нее же,
+    и записывается только эта строка. Сессия запроса при этом
+    не помечается измененной, и middleware не перезапишет ее старой копией
+    """
+
+    name = "db"
+
+    def lines(self) -> dict:
+        return decode_cart(self.request.session.get(SESSION_CART_KEY))
+
+    def apply(self, product_id: int, delta: int) -> dict:
+        session = self.request.session
+        if session.session_key and settings.SESSION_ENGINE == DB_SESSION_ENGINE:
+            with transaction.atomic():
+                row = (
+                    Session.objects.select_for_update()
+                    .filter(session_key=session.session_key)
+                    .first()
+                )
+                if row is not None:
+                    data = session.decode(row.session_data)
+                    lines = merge_line(
+                        decode_cart(data.get(SESSION_CART_KEY)), product_id, delta
+                    )
+                    data[SESSION_CART_KEY] = encode_cart(lines)
+                    row.session_data = session.encode(data)
+                    row.save(update_fields=["session_data"])
+                    return lines
+        # новая сессия (ее ключ знает только этот запрос) или другой движок сессий
+        lines = merge_line(self.lines(), product_id, delta)
+        session[SESSION_CART_KEY] = encode_cart(lines)
+        return lines
+
+    def clear(self) -> None:
+        self.request.session.pop(SESSION_CART_KEY, None)
+
+
+class CacheCart(AnonymousCart):
+    """
+    Корзина в кеше по id из cookie cart_id
+    """
+
+    name = "cache"
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.cart_id = request.COOKIES.get(CART_ID_COOKIE)
+        self.created = False
+        self.changed = False
+        self.cleared = False
+        if not self.cart_id:
+            self.cart_id = uuid.uuid4().hex
+            self.created = True
+
+    @property
+    def key(self) -> str:
+        return CART_CACHE_KEY.format(cart_id=self.cart_id)
+
+    def lines(self) -> dict:
+        if self.created:
+            return {}
+        return decode_cart(cache.get(self.key))
+
+    def apply(self, product_id: int, delta: int) -> dict:
+        with cache_lock(self.key):
+            lines = merge_line(self.lines(), product_id, delta)
+            cache.set(self.key, encode_cart(lines), cart_max_age())
+        self.created = False
+        self.changed = True
+        return lines
+
+    def clear(self) -> None:
+        if not self.created:
+            cache.delete(self.key)
+        self.cleared = True
+
+    def save(self, response) -> None:
+        if self.cleared:
+            response.delete_cookie(CART_ID_COOKIE, samesite="Lax")
+        elif self.changed:
+            response.set_cookie(
+                CART_ID_COOKIE,
+                self.cart_id,
+                max_age=cart_max_age(),
+                httponly=True,
+                samesite="Lax",
+            )
+
+
+class CookieCart(AnonymousCart):
+    """
+    Корзина в подписанной cookie
+    """
+
+    name = "cookie"
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._lines = decode_cart(
+            request.get_signed_cookie(
+                CART_COOKIE, default="", salt=CART_COOKIE_SALT, max_age=cart_max_age()
+            )
+        )
+        self.changed = False
+
+    def lines(self) -> dict:
+        return dict(self._lines)
+
+    def apply(self, product_id: int, delta: int) -> dict:
+        merge_line(self._lines, product_id, delta)
+        self.changed = True
+        return self.lines()
+
+    def clear(self) -> None:
+        self._lines = {}
+        self.changed = True
+
+    def save(self, response) -> None:
+        if self.changed and not self._lines:
+            response.delete_cookie(CART_COOKIE, samesite="Lax")
+        elif self.changed:
+            response.set_signed_cookie(
+                CART_COOKIE,
+                encode_cart(self._lines),
+                salt=CART_COOKIE_SALT,
+                max_age=cart_max_age(),
+                httponly=True,
+                samesite="Lax",
+            )
+
+
+CART_STORES = {store.name: store for store in (SessionCart, CacheCart, CookieCart)}
+
+
+def get_anonymous_cart(request, store: str | None = None) -> AnonymousCart:
+    """
+    Корзина анонимного пользователя в хранилище store
+
+    None - хранилище из настройки BASKET_ANONYMOUS_CART (по умолчанию "db")
+    """
+    store = store or getattr(settings, "BASKET_ANONYMOUS_CART", "db")
+    return CART_STORES[store](request)
+
+
+def merge_anonymous_cart(request, response) -> None:
+    """
+    Переносит корзину анонимного пользователя в корзину request.user после входа
+
+    Кол-во складывается с позициями, которые уже есть у пользователя;
+    товары, удаленные из каталога, пропускаются. Анонимная корзина очищается,
+    ее cookie (если есть) удаляются в response
+    """
+    cart = get_anonymous_cart(request)
+    lines = cart.lines()
+    if not lines:
+        return
+    existing = set(Product.objects.filter(pk__in=lines).values_list("pk", flat=True))
+    with transaction.atomic():
+        for product_id, count in lines.items():
+            if product_id in existing:
+                Basket.objects.add_product(request.user, product_id, count)
+    cart.clear()
+    cart.save(response)
@@ -0,0 +1,156 @@
+import statistics
+import time
+
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from basket.cart import CART_CACHE_KEY, CART_ID_COOKIE, CART_STORES
+
+
+def legacy_add(request, product_id: int, count: int) -> None:
+    """
+    Прежняя корзина: список словарей в сессии и поиск позиции перебором
+    """
+    cart = request.session.get("cart", [])
+    for item in cart:
+        if item["product_id"] == product_id:
+            item["count"] += count
+            break
+    else:
+        cart.append({"product_id": product_id, "count": count})
+    request.session["cart"] = cart
+    request.session.modified = True
+
+
+class Command(BaseCommand):
+    """
+    Команда сравнивает хранилища корзины анонимного пользователя
+
+    python manage.py benchmark_cart --lines 1 10 100
+    Для каждого хранилища (и прежней корзины-списка в сессии) замеряет
+    полный цикл запроса с middleware сессий: чтение корзины и добавление
+    товара при заданном кол-ве позиций. Затем проверяет, что две вкладки,
+    одновременно добавившие один и тот же товар, не теряют изменений.
+    Сессии удаляются откатом транзакции после замера
+    """
+
+    help = "Бенчмарк хранилищ корзины анонимного пользователя"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lines",
+            type=int,
+            nargs="+",
+            default=[1, 10, 100],
+            help="кол-во позиций в корзине, на которых выполняется замер",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=50, help="кол-во повторов каждого запроса"
+        )
+
+    def handle(self, *args, **options):
+        self.factory = RequestFactory()
+        self.sessions = SessionMiddleware(lambda request: HttpResponse())
+        self.cart_ids = []
+        with transaction.atomic():
+            for lines in sorted(options["lines"]):
+                results = {}
+                for store in ("legacy", *CART_STORES):
+                    cookies = self.fill(store, lines)
+                    results[f"{store} read"] = self.measure(
+                        lambda: self.read(store, cookies), options["repeat"]
+                    )
+                    results[f"{store} add"] = self.measure(
+                        lambda: self.add(store, cookies, 1), options["repeat"]
+                    )
+                self.report(lines, results)
+            self.stdout.write(
+                "Две вкладки добавили товар одновременно, изменения сохранены: "
+                + ", ".join(
+                    f"{store}: {self.concurrent_tabs(store)}" for store in CART_STORES
+                )
+            )
+            transaction.set_rollback(True)
+        cache.delete_many(
+            [CART_CACHE_KEY.format(cart_id=cart_id) for cart_id in self.cart_ids]
+        )
+
+    def measure(self, func, repeat: int) -> float:
+        """
+        Вернет медианное время выполнения func в миллисекундах
+        """
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def report(self, lines: int, results: dict[str, float]) -> None:
+        line = ", ".join(f"{name}: {ms:.3f} ms" for name, ms in results.items())
+        self.stdout.write(f"{lines:>4} позиций | {line}")
+
+    def request(self, cookies: dict):
+        """
+        Запрос с cookie браузера и сессией, как после SessionMiddleware
+        """
+        request = self.factory.post("/api/basket")
+        request.COOKIES.update(cookies)
+        self.sessions.process_request(request)
+        return request
+
+    def finish(self, request, response, cookies: dict) -> None:
+        """
+        Сохраняет сессию как middleware и запоминает cookie ответа
+        """
+        self.sessions.process_response(request, response)
+        cookies.update(
+            {name: morsel.value for name, morsel in response.cookies.items()}
+        )
+        if CART_ID_COOKIE in response.cookies:
+            self.cart_ids.append(response.cookies[CART_ID_COOKIE].value)
+
+    def read(self, store: str, cookies: dict) -> dict:
+        request = self.request(cookies)
+        if store == "legacy":
+            cart = request.session.get("cart", [])
+            return {item["product_id"]: item["count"] for item in cart}
+        return CART_STORES[store](request).lines()
+
+    def add(self, store: str, cookies: dict, product_id: int, count: int = 1):
+        request = self.request(cookies)
+        response = HttpResponse()
+        if store == "legacy":
+            legacy_add(request, product_id, count)
+        else:
+            cart = CART_STORES[store](request)
+            cart.add(product_id, count)
+            cart.save(response)
+        self.finish(request, response, cookies)
+
+    def fill(self, store: str, lines: int) -> dict:
+        """
+        Новая корзина с lines позициями, вернет ее cookie
+        """
+        cookies = {}
+        for product_id in range(1, lines + 1):
+            self.add(store, cookies, product_id)
+        return cookies
+
+    def concurrent_tabs(self, store: str) -> bool:
+        """
+        Две вкладки читают корзину до того, как любая из них ответила
+        """
+        cookies = self.fill(store, 3)
+        first, second = self.request(dict(cookies)), self.request(dict(cookies))
+        carts = [CART_STORES[store](request) for request in (first, second)]
+        for request, cart in zip((first, second), carts):
+            cart.add(1, 1)
+            response = HttpResponse()
+            cart.save(response)
+            self.finish(request, response, cookies)
+        return self.read(store, cookies).get(1) == 3
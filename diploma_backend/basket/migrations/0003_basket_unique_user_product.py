@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-03-25 09:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_positions(apps, schema_editor):
+    """
+    Сливает повторяющиеся позиции (user, product) в одну с суммой кол-ва
+    """
+    Basket = apps.get_model("basket", "Basket")
+    duplicates = (
+        Basket.objects.order_by()
+        .values("user_id", "product_id")
+        .annotate(positions=Count("id"), keep_id=Min("id"), total=Sum("count"))
+        .filter(positions__gt=1)
+    )
+    for duplicate in list(duplicates):
+        positions = Basket.objects.filter(
+            user_id=duplicate["user_id"], product_id=duplicate["product_id"]
+        )
+        positions.filter(pk=duplicate["keep_id"]).update(count=duplicate["total"])
+        positions.exclude(pk=duplicate["keep_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("basket", "0002_alter_basket_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_positions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="basket",
+            constraint=models.UniqueConstraint(
+                fields=["user", "product"], name="unique_basket_user_product"
+            ),
+        ),
+    ]
@@ -1,9 +1,56 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 
 from products.models import Product
 
 
+class BasketQuerySet(models.QuerySet):
+    """
+    QuerySet позиций корзины с атомарным изменением кол-ва товара
+
+    Каждое изменение - один UPDATE с F("count") (или INSERT новой позиции),
+    поэтому параллельные запросы не теряют приращений
+    """
+
+    def lines(self) -> dict:
+        """
+        Позиции корзины {id товара: кол-во} в порядке добавления, один запрос
+        """
+        return dict(self.order_by("pk").values_list("product_id", "count"))
+
+    def add_product(self, user, product_id: int, count: int) -> None:
+        """
+        Добавит в корзину user count единиц товара product_id
+
+        Сначала увеличивает кол-во в существующей позиции, а если ее нет -
+        создает новую. Если позицию успел создать параллельный запрос,
+        INSERT нарушит ограничение unique_basket_user_product,
+        и кол-во увеличивается повторным UPDATE
+        """
+        position = self.filter(user=user, product_id=product_id)
+        if position.update(count=F("count") + count):
+            return
+        try:
+            with transaction.atomic():
+                self.create(user=user, product_id=product_id, count=count)
+        except IntegrityError:
+            position.update(count=F("count") + count)
+
+    def remove_product(self, user, product_id: int, count: int) -> bool:
+        """
+        Уберет из корзины user count единиц товара product_id
+
+        Позиция, в которой останется ноль единиц, удаляется.
+        Вернет False, если товара в корзине нет
+        """
+        position = self.filter(user=user, product_id=product_id)
+        deleted, _ = position.filter(count__lte=count).delete()
+        if deleted:
+            return True
+        return bool(position.filter(count__gt=count).update(count=F("count") - count))
+
+
 class Basket(models.Model):
     """
     Модель Basket представляет одну позицию в корзине пользователя.
@@ -31,3 +78,13 @@ class Basket(models.Model):
     count = models.PositiveIntegerField(
         default=0, verbose_name="Количество добавляемого товара"
     )
+
+    objects = BasketQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # одна позиция на товар: кол-во меняют add_product/remove_product
+            models.UniqueConstraint(
+                fields=["user", "product"], name="unique_basket_user_product"
+            ),
+        ]
@@ -1,34 +1,16 @@
-from django.db.models.aggregates import Avg
+from products.fast_serializers import serialize_product_cards
 
-from products.serializers import ProductSerializer
 
-from .models import Basket
-
-
-class BasketSerializer(ProductSerializer):
+def basket_data(lines: dict) -> list[dict]:
     """
-    Сериализатор для модлели Basket
+    Позиции корзины {id товара: кол-во} в JSON для фронта
 
-    Преобразует объекты Product <-> JSON. В рамках Basket.
-    Используется для чтения, создания, обновления и удаления товаров из корзины
+    Общий формат для корзины пользователя и анонимной корзины:
+    карточка товара (ProductSerializer) и кол-во товара в позиции count.
+    Карточки загружаются пакетно (serialize_product_cards), поэтому
+    кол-во запросов не зависит от кол-ва позиций
     """
-
-    class Meta(ProductSerializer.Meta):
-        fields = ProductSerializer.Meta.fields
-
-    def to_representation(self, instance: Basket):
-        data = super().to_representation(instance.product)
-        data["count"] = instance.count
-        return data
-
-    def get_reviews(self, obj):
-        """
-        Метод вернет кол-во отзывов(кол-во записей в табл Review)
-        """
-        return obj.reviews.count()
-
-    def get_rating(self, obj):
-        """
-        Метод вернет средний рейтинг товара
-        """
-        return obj.reviews.aggregate(avg=Avg("rate"))["avg"] or 0
+    cards = serialize_product_cards(list(lines))
+    for card in cards:
+        card["count"] = lines[card["id"]]
+    return cards
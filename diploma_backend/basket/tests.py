@@ -1,3 +1,274 @@
-from django.test import TestCase
+import random
+import threading
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from basket.cart import CART_STORES, SESSION_CART_KEY, encode_cart
+from basket.models import Basket
+from products.management.commands._synthetic import (
+    seed_images_and_specifications, seed_products, seed_tags)
+from products.models import Category, Product, Tag
+
+
+class BasketConcurrencyTestCase(TransactionTestCase):
+    """
+    Параллельные добавления в корзину не теряют приращений кол-ва
+
+    Потоки одновременно добавляют и убирают один товар в корзине одного
+    пользователя через Basket.objects (как POST и DELETE /api/basket).
+    У потоков свои соединения, поэтому нужна база в файле
+    и TransactionTestCase (данные коммитятся)
+    """
+
+    THREADS = 6
+    ADDS = 20
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="basket-concurrency")
+        self.product = Product.objects.create(
+            title="basket-concurrency",
+            category=Category.objects.create(title="basket-concurrency"),
+            price=1,
+            count=1,
+            full_description="",
+        )
+
+    def run_threads(self, operation, repeat: int) -> int:
+        """
+        Выполнит operation repeat раз в каждом из THREADS потоков одновременно
+        """
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(repeat):
+                    operation()
+            except Exception as exc:  # ошибку потока проверяем после join
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        self.assertEqual(errors, [])
+        return self.THREADS * repeat
+
+    def positions(self) -> list[int]:
+        return list(
+            Basket.objects.filter(user=self.user).values_list("count", flat=True)
+        )
+
+    def test_concurrent_add_and_remove(self):
+        added = self.run_threads(
+            lambda: Basket.objects.add_product(self.user, self.product.pk, 1),
+            self.ADDS,
+        )
+        self.assertEqual(self.positions(), [added])
+        removed = self.run_threads(
+            lambda: Basket.objects.remove_product(self.user, self.product.pk, 1),
+            self.ADDS // 2,
+        )
+        self.assertEqual(self.positions(), [added - removed])
+        self.run_threads(
+            lambda: Basket.objects.remove_product(self.user, self.product.pk, 1),
+            self.ADDS,
+        )
+        # последняя единица товара удаляет позицию
+        self.assertEqual(self.positions(), [])
+
+
+@override_settings(BASKET_ANONYMOUS_CART="db")
+class BasketQueriesTestCase(TestCase):
+    """
+    Ответ корзины строится за постоянное кол-во запросов
+
+    Карточки товаров всех позиций загружаются одним пакетом
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(25)
+        category = Category.objects.create(title="basket-queries")
+        tags = [Tag.objects.create(name=f"basket-queries-{n}") for n in range(5)]
+        cls.product_ids = seed_products(50, [category])
+        seed_tags(cls.product_ids, tags)
+        seed_images_and_specifications(cls.product_ids)
+        cls.user = User.objects.create_user(username="basket-queries")
+
+    def fill_user_basket(self, lines: int) -> None:
+        Basket.objects.filter(user=self.user).delete()
+        Basket.objects.bulk_create(
+            Basket(user=self.user, product_id=product_id, count=2)
+            for product_id in self.product_ids[:lines]
+        )
+
+    def fill_session_basket(self, lines: int) -> None:
+        session = self.client.session
+        session[SESSION_CART_KEY] = encode_cart(
+            {product_id: 2 for product_id in self.product_ids[:lines]}
+        )
+        session.save()
+
+    def assert_basket(self, queries: int, lines: int) -> None:
+        with self.assertNumQueries(queries):
+            response = self.client.get("/api/basket/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), lines)
+
+    def test_user_basket(self):
+        self.client.force_login(self.user)
+        for lines in (1, 50):
+            with self.subTest(lines=lines):
+                self.fill_user_basket(lines)
+                # сессия, пользователь, позиции корзины + карточки товаров
+                self.assert_basket(6, lines)
+
+    def test_anonymous_basket(self):
+        for lines in (1, 50):
+            with self.subTest(lines=lines):
+                self.fill_session_basket(lines)
+                # сессия + карточки товаров
+                self.assert_basket(4, lines)
+
+
+class AnonymousCartTestCase(TestCase):
+    """
+    Анонимная корзина во всех хранилищах (BASKET_ANONYMOUS_CART):
+    добавление, удаление, кол-во и перенос в корзину пользователя при входе
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="anonymous-cart")
+        cls.first, cls.second = (
+            Product.objects.create(
+                title=f"anonymous-cart-{number}",
+                category=category,
+                price=1,
+                count=10,
+                full_description="",
+            )
+            for number in range(2)
+        )
+        cls.user = User.objects.create_user(
+            username="anonymous-cart", password="anonymous-cart"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def change(self, method: str, product: Product, count: int) -> dict:
+        """
+        POST или DELETE /api/basket, вернет корзину {id товара: кол-во}
+        """
+        response = getattr(self.client, method)(
+            "/api/basket/",
+            {"id": product.pk, "count": count},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return {line["id"]: line["count"] for line in response.json()}
+
+    def basket(self) -> dict:
+        response = self.client.get("/api/basket/")
+        self.assertEqual(response.status_code, 200)
+        return {line["id"]: line["count"] for line in response.json()}
+
+    def test_add_and_remove(self):
+        for store in CART_STORES:
+            with self.subTest(store=store), self.settings(
+                BASKET_ANONYMOUS_CART=store
+            ):
+                self.client.cookies.clear()
+                self.assertEqual(self.change("post", self.first, 2), {self.first.pk: 2})
+                self.change("post", self.second, 1)
+                # повторное добавление увеличивает кол-во в позиции
+                self.assertEqual(
+                    self.change("post", self.first, 3),
+                    {self.first.pk: 5, self.second.pk: 1},
+                )
+                self.assertEqual(
+                    self.change("delete", self.first, 4),
+                    {self.first.pk: 1, self.second.pk: 1},
+                )
+                # последняя единица товара удаляет позицию
+                self.assertEqual(
+                    self.change("delete", self.first, 1), {self.second.pk: 1}
+                )
+                self.assertEqual(self.basket(), {self.second.pk: 1})
+
+    def test_merge_on_login(self):
+        for store in CART_STORES:
+            with self.subTest(store=store), self.settings(
+                BASKET_ANONYMOUS_CART=store
+            ):
+                self.client.logout()
+                self.client.cookies.clear()
+                Basket.objects.filter(user=self.user).delete()
+                Basket.objects.create(user=self.user, product=self.first, count=1)
+                self.change("post", self.first, 2)
+                self.change("post", self.second, 3)
+
+                response = self.client.post(
+                    "/api/sign-in",
+                    {"username": "anonymous-cart", "password": "anonymous-cart"},
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 200)
+                # кол-во складывается с позициями, которые уже были у пользователя
+                expected = {self.first.pk: 3, self.second.pk: 3}
+                self.assertEqual(
+                    dict(
+                        Basket.objects.filter(user=self.user).values_list(
+                            "product_id", "count"
+                        )
+                    ),
+                    expected,
+                )
+                self.assertEqual(self.basket(), expected)
+
+                # анонимная корзина после входа пуста
+                self.client.logout()
+                self.assertEqual(self.basket(), {})
+
+    def test_merge_skips_missing_products(self):
+        for store in CART_STORES:
+            with self.subTest(store=store), self.settings(
+                BASKET_ANONYMOUS_CART=store
+            ):
+                self.client.logout()
+                self.client.cookies.clear()
+                Basket.objects.filter(user=self.user).delete()
+                removed = Product.objects.create(
+                    title=f"anonymous-cart-removed-{store}",
+                    category=self.first.category,
+                    price=1,
+                    count=10,
+                    full_description="",
+                )
+                self.change("post", removed, 1)
+                self.change("post", self.second, 2)
+                removed.delete()
+
+                response = self.client.post(
+                    "/api/sign-in",
+                    {"username": "anonymous-cart", "password": "anonymous-cart"},
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    list(
+                        Basket.objects.filter(user=self.user).values_list(
+                            "product_id", "count"
+                        )
+                    ),
+                    [(self.second.pk, 2)],
+                )
@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.schedules import crontab
 
 # 1. Указываем Django settings для Celery
 # Celery должен знать где настройки Django
@@ -17,3 +18,17 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # 4. Автоматически находит tasks.py во всех приложениях
 # Ищет файлы tasks.py в каждом app (payment/tasks.py, orders/tasks.py и т.д.)
 app.autodiscover_tasks()
+
+# 5. Периодические задачи (запускаются процессом celery beat)
+app.conf.beat_schedule = {
+    # ежедневно в полночь применяем начавшиеся и снимаем закончившиеся скидки
+    "refresh-effective-prices": {
+        "task": "products.tasks.refresh_effective_prices",
+        "schedule": crontab(minute=0, hour=0),
+    },
+    # ежечасно пересчитываем индекс популярности и рейтинг популярных товаров
+    "refresh-popularity-ranking": {
+        "task": "products.tasks.refresh_popularity_ranking",
+        "schedule": crontab(minute=15),
+    },
+}
@@ -88,6 +88,9 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # тестовая база в файле, а не в памяти: тесты с потоками
+        # (параллельные изменения корзины) работают с ней через свои соединения
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -137,6 +140,29 @@ frontend_static_path = BASE_DIR / "diploma-frontend" / "frontend" / "static"
 # STATICFILES_DIRS добавляем только если путь реально существует
 STATICFILES_DIRS = [frontend_static_path] if frontend_static_path.exists() else []
 
+# Кеш (ответы каталога, счетчики версий, отметки изменения товаров, корзины).
+# Кеш должен быть общим для всех процессов gunicorn и воркеров Celery:
+# задачи сбрасывают версию каталога, и веб-процессы должны это увидеть.
+# Общий кеш - Redis, адрес задается переменной окружения CACHE_REDIS_URL
+# (например redis://localhost:6379/1). Без нее - LocMemCache: у каждого
+# процесса свой кеш, условные GET (ETag / Last-Modified) отключаются,
+# изменения из Celery видны только после истечения CATALOG_CACHE_TIMEOUT.
+# DatabaseCache не подходит: каждое обращение к кешу - запрос к базе
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # Настойка логирования
 LOGGING = {
     "version": 1,
@@ -179,3 +205,64 @@ CELERY_TASK_TRACK_STARTED = True
 # Максимальное время выполнения задачи — 5 минут
 # Если задача зависнет дольше, Celery её принудительно завершитт
 CELERY_TASK_TIME_LIMIT = 5 * 60
+
+# Полнотекстовый поиск по каталогу (filter[name]):
+# SQLite - FTS5, PostgreSQL - tsvector + GIN. Если False - поиск title__icontains
+CATALOG_FULL_TEXT_SEARCH = True
+
+# Конфигурация текстового поиска PostgreSQL ("simple", "russian", ...)
+# После смены выполнить: python manage.py rebuild_search_index
+CATALOG_SEARCH_CONFIG = "simple"
+
+# Время жизни закешированной страницы каталога, секунды
+CATALOG_CACHE_TIMEOUT = 5 * 60
+# Доля запросов, попадания и промахи которых учитываются в
+# /api/catalog/cache-stats/ (запись счетчика в кеш - на каждый учтенный запрос)
+CATALOG_CACHE_STATS_SAMPLE_RATE = 0.01
+
+# Время жизни отметок изменения товаров и каталога (ETag / Last-Modified), секунды
+CATALOG_MODIFIED_TIMEOUT = 60 * 60
+
+# Колоночный движок каталога в памяти процесса для анонимного трафика (нужен numpy).
+# Снимок обновляется сигналами и полностью перечитывается раз в
+# CATALOG_ENGINE_MAX_AGE секунд (изменения из других процессов, celery beat)
+CATALOG_COLUMNAR_ENGINE = False
+CATALOG_ENGINE_MAX_AGE = 5 * 60
+
+# Кол-во товаров каталога (lastPage) кешируется по набору фильтров, секунды
+CATALOG_COUNT_CACHE_TIMEOUT = 30
+# Для каталога без фильтров использовать оценку планировщика вместо COUNT(*)
+# (полный просмотр товаров), если оценка не меньше CATALOG_ESTIMATED_COUNT_MIN.
+# PostgreSQL - оценка плана, SQLite - статистика ANALYZE (sqlite_stat1);
+# без статистики считается точное кол-во
+CATALOG_ESTIMATED_COUNT = True
+CATALOG_ESTIMATED_COUNT_MIN = 100_000
+
+# Карточки и страница товара сериализуются быстрым путем через values_list()
+# (products/fast_serializers.py) вместо ProductSerializer; представление
+# может переопределить выбор атрибутом fast_serializer
+CATALOG_FAST_SERIALIZER = True
+
+# Страница товара: время жизни кеша (сбрасывается изменениями самого товара)
+# и сколько последних отзывов встраивается в ответ
+PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 60
+PRODUCT_DETAIL_REVIEWS = 20
+# Остальные отзывы - постранично: GET /api/product/{id}/reviews?cursor=&limit=
+PRODUCT_REVIEWS_PAGE_SIZE = 10
+
+# Кол-во товаров на странице скидок по умолчанию (GET /sales?limit=...)
+CATALOG_SALES_PAGE_SIZE = 10
+
+# Индекс популярности товара (products/popularity.py, celery beat ежечасно):
+# sales * продано за CATALOG_POPULARITY_WINDOW_DAYS дней + rating * рейтинг
+# - sort_index * индекс сортировки. В рейтинге хранится топ CATALOG_POPULARITY_TOP_N
+# товаров: общий и по каждой категории
+CATALOG_POPULARITY_WINDOW_DAYS = 30
+CATALOG_POPULARITY_TOP_N = 50
+CATALOG_POPULARITY_WEIGHTS = {"sales": 1.0, "rating": 5.0, "sort_index": 0.1}
+
+# Корзина анонимного пользователя (basket/cart.py): "db" - сессия Django,
+# "cache" - общий кеш (id корзины в cookie), "cookie" - подписанная cookie.
+# Сравнение: python manage.py benchmark_cart
+BASKET_ANONYMOUS_CART = "db"
+BASKET_CART_MAX_AGE = 60 * 60 * 24 * 30
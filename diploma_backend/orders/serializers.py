@@ -1,8 +1,8 @@
 from decimal import Decimal
 
-from django.db.models.aggregates import Avg
 from rest_framework import serializers  # Импортируем модуль сериализаторов DRF
 
+from products.loaders import attach_product_cards
 from products.models import Product
 from products.serializers import ProductSerializer
 
@@ -43,11 +43,8 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         for item in products_data:
             product = Product.objects.get(pk=item["id"])
             count = item["count"]
-            # получаем цену со скидкой
-            if hasattr(product, "sale") and product.sale:
-                price = product.sale.sale_price
-            else:
-                price = product.price
+            # получаем цену с учетом действующей скидки
+            price = product.effective_price
 
             total_cost += price * count
 
@@ -67,9 +64,6 @@ class OrderProductsSerializer(ProductSerializer):
     с актуальной ценой и количеством из заказа
     """
 
-    reviews = serializers.SerializerMethodField()
-    rating = serializers.SerializerMethodField()
-
     def to_representation(self, instance):
         # instance = OrderProduct
         data = super().to_representation(instance.product)
@@ -77,20 +71,6 @@ class OrderProductsSerializer(ProductSerializer):
         data["count"] = instance.count
         return data
 
-    def get_reviews(self, obj: Product):
-        """
-        Переопределяем метод родителя get_reviews
-        возвращает количество отзывов на товаре
-        """
-        return obj.reviews.count()
-
-    def get_rating(self, obj: Product):
-        """
-        Переопределяем метод родителя get_rating
-        Возвращает рейтинг товара
-        """
-        return obj.reviews.aggregate(avg=Avg("rate"))["avg"]
-
 
 class OrderDetailSerializer(serializers.ModelSerializer):
     """
@@ -184,7 +164,9 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         """
         Метод вернет список товаров с актуальной ценой, и количеством из заказа
         """
-        order_products = obj.products.all()
+        # карточки товаров загружаются пакетно, если представление
+        # еще не подставило их для всех заказов сразу
+        order_products = attach_product_cards(obj.products.all())
         return OrderProductsSerializer(order_products, many=True).data
 
     def get_paymentStatus(self, obj: Order):
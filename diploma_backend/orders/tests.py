@@ -1,3 +1,54 @@
+import random
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from orders.models import Order, OrderProduct
+from products.management.commands._synthetic import (
+    seed_images_and_specifications, seed_products, seed_tags)
+from products.models import Category, Tag
+
+
+class OrderListQueriesTestCase(TestCase):
+    """
+    Карточки товаров всех заказов загружаются одним пакетом
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(14)
+        category = Category.objects.create(title="orders")
+        tags = [Tag.objects.create(name=f"orders-{n}") for n in range(5)]
+        cls.product_ids = seed_products(30, [category])
+        seed_tags(cls.product_ids, tags)
+        seed_images_and_specifications(cls.product_ids)
+        cls.user = User.objects.create_user(username="orders-queries")
+
+    def create_orders(self, orders: int, lines: int) -> None:
+        Order.objects.filter(user=self.user).delete()
+        for number in range(orders):
+            order = Order.objects.create(user=self.user)
+            product_ids = self.product_ids[number * lines : (number + 1) * lines]
+            OrderProduct.objects.bulk_create(
+                OrderProduct(order=order, product_id=product_id, count=1, price=1)
+                for product_id in product_ids
+            )
+
+    def count_product_queries(self) -> int:
+        """
+        Кол-во запросов к таблицам товаров при GET /api/orders
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/orders")
+        self.assertEqual(response.status_code, 200)
+        return sum('FROM "products_' in query["sql"] for query in queries)
 
-# Create your tests here.
+    def test_product_queries_do_not_depend_on_orders(self):
+        self.client.force_login(self.user)
+        self.create_orders(1, 1)
+        # товары, картинки и теги карточек
+        self.assertEqual(self.count_product_queries(), 3)
+        self.create_orders(5, 6)
+        self.assertEqual(self.count_product_queries(), 3)
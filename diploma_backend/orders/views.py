@@ -8,6 +8,7 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from basket.models import Basket
+from products.loaders import attach_product_cards
 from products.models import Product
 
 from .models import Order
@@ -44,7 +45,15 @@ def order_create(request):
         """
         current_user = request.user
         logger.info(f"Текущий юзер: {current_user}")
-        orders = Order.objects.filter(user=current_user).order_by("-created_at")
+        orders = (
+            Order.objects.filter(user=current_user)
+            .order_by("-created_at")
+            .prefetch_related("products")
+        )
+        # карточки товаров всех заказов загружаем одним пакетом
+        attach_product_cards(
+            item for order in orders for item in order.products.all()
+        )
         serializer = OrderDetailSerializer(orders, many=True)
         return Response(serializer.data)
 
@@ -84,6 +93,8 @@ def order_detail(request, id):
                         {"error": f"Недостаточно тора {product.title} на складе"}
                     )
                 product.count -= order_product_count
+                # счетчик покупок учитывается в индексе популярности
+                product.purchases_count += order_product_count
                 product.save()
             # после того как заказ состоялся\обновился\подтвердился
             # удаляем товары из корзины
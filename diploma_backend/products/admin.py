@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Category, Image, Product, Review, Sale, Specification, Tag
+from .models import (RATING_HISTOGRAM_FIELDS, Category, CategoryTag, Image,
+                     Product, ProductRanking, Review, Sale, Specification, Tag)
 
 
 class ImageInline(admin.StackedInline):
@@ -42,12 +43,24 @@ class ProductAdmin(admin.ModelAdmin):
         "product_tags",
         "sort_index",
         "purchases_count",
+        "reviews_count",
+        "avg_rating",
         "is_limited",
         "is_banner",
         "archived",
     )
     list_filter = ("is_limited", "free_delivery", "category")
     search_fields = ("title", "description", "full_description", "is_banner")
+    # производные поля: счетчики отзывов сдвигают сигналы отзыва,
+    # цену со скидкой пересчитывают сигналы товара и скидки (products/signals.py)
+    readonly_fields = (
+        "effective_price",
+        "reviews_count",
+        "rating_sum",
+        "avg_rating",
+        *RATING_HISTOGRAM_FIELDS,
+        "popularity_score",
+    )
     filter_horizontal = ("tags",)
     inlines = [ImageInline, SpecificationInline, SaleInline, ReviewInline]
 
@@ -66,8 +79,10 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "image", "parent", "is_active")
+    list_display = ("id", "title", "image", "parent", "is_active", "path")
     search_fields = ("title", "is_active")
+    # по материализованному пути потомки идут сразу за своим родителем
+    ordering = ("path",)
 
 
 @admin.register(Tag)
@@ -80,3 +95,15 @@ class TagAdmin(admin.ModelAdmin):
 class ImageAdmin(admin.ModelAdmin):
     list_display = ("src", "alt")
     search_fields = ("alt",)
+
+
+@admin.register(ProductRanking)
+class ProductRankingAdmin(admin.ModelAdmin):
+    list_display = ("position", "product", "category", "score")
+    list_filter = ("category",)
+
+
+@admin.register(CategoryTag)
+class CategoryTagAdmin(admin.ModelAdmin):
+    list_display = ("category", "tag", "product_count")
+    list_filter = ("category",)
@@ -0,0 +1,210 @@
+"""
+Кеширование ответов каталога
+
+Ключи кеша содержат номер версии каталога. Любое изменение товаров,
+скидок, отзывов, тегов или картинок увеличивает версию (products/signals.py),
+поэтому старые записи перестают читаться и истекают сами по TTL.
+
+Кроме версии хранятся отметки времени изменения (в микросекундах):
+всего каталога и каждого товара. По ним строятся ETag и Last-Modified
+условных GET-запросов (products/conditional.py) без запросов к базе.
+Отметки живут CATALOG_MODIFIED_TIMEOUT секунд, после чего начинаются
+заново с текущего времени: устаревший ответ 304 ограничен этим сроком,
+даже если изменение было сделано в обход кеша этого процесса.
+"""
+
+import hashlib
+import json
+import random
+import time
+
+from datetime import datetime, time as day_time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_HITS_KEY = "catalog:stats:hits"
+CATALOG_MISSES_KEY = "catalog:stats:misses"
+CATALOG_MODIFIED_KEY = "catalog:modified"
+# отметка массового изменения товаров в обход сигналов (задачи celery)
+PRODUCTS_MODIFIED_KEY = "catalog:products:modified"
+PRODUCT_MODIFIED_KEY = "catalog:product:{pk}:modified"
+
+
+def catalog_cache_timeout() -> int:
+    """
+    Время жизни закешированной страницы каталога в секундах
+    """
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+
+
+def modified_timeout() -> int:
+    """
+    Время жизни отметок времени изменения в секундах
+    """
+    return getattr(settings, "CATALOG_MODIFIED_TIMEOUT", 60 * 60)
+
+
+def seconds_until_midnight() -> int:
+    """
+    Сколько секунд осталось до следующей полуночи по местному времени
+
+    Таймаут для данных, которые меняются только со сменой даты (скидки)
+    """
+    now = timezone.localtime()
+    midnight = datetime.combine(
+        now.date() + timedelta(days=1), day_time.min, tzinfo=now.tzinfo
+    )
+    return max(int((midnight - now).total_seconds()), 1)
+
+
+def get_catalog_version() -> int:
+    """
+    Вернет текущую версию каталога
+
+    Начальное значение - текущее время: если счетчик будет вытеснен из кеша,
+    новая версия не совпадет ни с одной из уже использованных
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY, int(time.time()))
+    return version
+
+
+def bump_catalog_version() -> None:
+    """
+    Увеличивает версию каталога, делая недействительными все его записи в кеше
+
+    и обновляет отметку изменения каталога (ETag). Вызывается после коммита
+    изменения (transaction.on_commit): иначе новый ETag достанется ответу
+    со старыми данными, и по нему клиент получит неверные 304
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # счетчика в кеше нет - его инициализирует следующий get_catalog_version
+        pass
+    cache.set(CATALOG_MODIFIED_KEY, _now(), modified_timeout())
+
+
+def _now() -> int:
+    return time.time_ns() // 1000
+
+
+def _modified(key: str) -> int:
+    """
+    Отметка времени изменения из кеша
+
+    Если отметка истекла или вытеснена из кеша, она начинается с текущего
+    времени: клиенты один раз получат полный ответ вместо неверного 304
+    """
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, _now(), modified_timeout())
+        stamp = cache.get(key, _now())
+    return stamp
+
+
+def catalog_modified() -> int:
+    """
+    Время последнего изменения каталога, микросекунды
+    """
+    return _modified(CATALOG_MODIFIED_KEY)
+
+
+def product_modified(pk) -> tuple[int, int]:
+    """
+    (время массового изменения товаров, время изменения товара pk), микросекунды
+    """
+    return (
+        _modified(PRODUCTS_MODIFIED_KEY),
+        _modified(PRODUCT_MODIFIED_KEY.format(pk=pk)),
+    )
+
+
+def product_cache_timeout() -> int:
+    """
+    Время жизни закешированной страницы товара в секундах
+    """
+    return getattr(settings, "PRODUCT_DETAIL_CACHE_TIMEOUT", 60 * 60)
+
+
+def product_cache_key(pk) -> str:
+    """
+    Ключ кеша страницы товара
+
+    Содержит отметки изменения товара: запись перестает читаться
+    после любого изменения этого товара (products/signals.py)
+    """
+    bulk, product = product_modified(pk)
+    return f"catalog:product:{pk}:detail:{bulk}-{product}"
+
+
+def touch_products(product_ids=None) -> None:
+    """
+    Отмечает изменение товаров product_ids (None - всех товаров сразу)
+    """
+    now = _now()
+    if product_ids is None:
+        cache.set(PRODUCTS_MODIFIED_KEY, now, modified_timeout())
+        return
+    cache.set_many(
+        {PRODUCT_MODIFIED_KEY.format(pk=pk): now for pk in product_ids},
+        modified_timeout(),
+    )
+
+
+def catalog_cache_key(prefix: str, params: dict) -> str:
+    """
+    Ключ кеша для нормализованных параметров запроса с учетом версии каталога
+    """
+    payload = json.dumps(params, sort_keys=True, default=str)
+    digest = hashlib.md5(payload.encode()).hexdigest()
+    return f"catalog:{prefix}:{get_catalog_version()}:{digest}"
+
+
+def _sample(key: str) -> None:
+    """
+    Учитывает запрос в счетчике key с вероятностью CATALOG_CACHE_STATS_SAMPLE_RATE
+
+    Учтенный запрос прибавляет 1 / rate: счетчик остается оценкой общего
+    кол-ва, а запись в кеш делает только выборка запросов
+    """
+    rate = getattr(settings, "CATALOG_CACHE_STATS_SAMPLE_RATE", 0.01)
+    if rate <= 0 or random.random() >= rate:
+        return
+    delta = max(round(1 / rate), 1)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # счетчика еще нет (или вытеснен); гонка теряет только одну выборку
+        cache.add(key, delta, None)
+
+
+def record_cache_hit() -> None:
+    _sample(CATALOG_HITS_KEY)
+
+
+def record_cache_miss() -> None:
+    _sample(CATALOG_MISSES_KEY)
+
+
+def get_cache_stats() -> dict:
+    """
+    Счетчики попаданий и промахов кеша каталога
+
+    Счетчики - оценка по выборке запросов (CATALOG_CACHE_STATS_SAMPLE_RATE)
+    """
+    hits = cache.get(CATALOG_HITS_KEY, 0)
+    misses = cache.get(CATALOG_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hitRate": round(hits / total, 4) if total else 0,
+        "version": get_catalog_version(),
+        "timeout": catalog_cache_timeout(),
+    }
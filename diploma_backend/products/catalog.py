@@ -0,0 +1,461 @@
+"""
+Вспомогательные функции каталога товаров (GET /api/catalog/)
+
+Разбор и применение фильтров, сортировки каталога
+и постраничная навигация по курсору (keyset pagination)
+"""
+
+import base64
+import json
+import logging
+import math
+from datetime import datetime
+from decimal import ROUND_CEILING, Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import DatabaseError, connection
+from django.db.models import (Case, Count, Exists, F, FloatField, IntegerField,
+                              Max, Min, OuterRef, Q, QuerySet, Value, When)
+from django.http import QueryDict
+
+from .cache import catalog_cache_key, catalog_cache_timeout
+from .models import Category, Product, Tag
+from .search import search_products
+
+logger = logging.getLogger(__name__)
+
+# параметр sort из запроса -> колонка товара, по которой сортируем
+CATALOG_SORT_FIELDS = {
+    "price": "effective_price",
+    "reviews": "reviews_count",
+    "date": "date",
+    "rating": "avg_rating",
+    "popularity": "popularity_score",
+}
+
+
+# частичный индекс всех не архивных товаров: по его статистике в SQLite
+# оценивается кол-во товаров каталога без фильтров (_estimated_count)
+CATALOG_STAT_INDEX = "product_catalog_price_idx"
+
+# значения фильтра цены по умолчанию (границы слайдера на фронте)
+DEFAULT_MIN_PRICE = 0
+DEFAULT_MAX_PRICE = 50000
+
+# кол-во столбцов гистограммы цен в фасетах
+PRICE_HISTOGRAM_BUCKETS = 10
+
+
+def catalog_filters(params) -> dict:
+    """
+    Достает фильтры каталога из строки запроса и приводит их к каноническому виду
+
+    Одинаковые по смыслу запросы дают одинаковый словарь
+    (порядок и повторы тегов, пробелы вокруг имени, "0" и "0.0" в цене),
+    поэтому словарь годится и как часть ключа кеша
+    """
+    return {
+        "name": params.get("filter[name]", "").strip(),
+        "min_price": float(params.get("filter[minPrice]", DEFAULT_MIN_PRICE)),
+        "max_price": float(params.get("filter[maxPrice]", DEFAULT_MAX_PRICE)),
+        "available": params.get("filter[available]") == "true",
+        "free_delivery": params.get("filter[freeDelivery]") == "true",
+        "tags": sorted({tag for tag in params.getlist("tags[]") if tag}),
+        # any - у товара есть хотя бы один из тегов, all - есть все теги
+        "tags_mode": "all" if params.get("tagsMode") == "all" else "any",
+        "category": params.get("category") or None,
+    }
+
+
+def filter_products(products: QuerySet, filters: dict, ranked=True) -> QuerySet:
+    """
+    Накапливает в qs товаров условия фильтрации из catalog_filters
+
+    ranked=False - не добавлять релевантность поиска search_rank
+    """
+    # полнотекстовый поиск по названию, описанию и тегам товара
+    # (или title__icontains, если поиск выключен настройкой)
+    if filters["name"]:
+        products = search_products(products, filters["name"], ranked=ranked)
+    # фильтры цены применяем, только если значения отличаются от границ по умолчанию;
+    # фильтруем по цене с учетом действующей скидки (индексируемая колонка)
+    if filters["min_price"] != DEFAULT_MIN_PRICE:
+        products = products.filter(effective_price__gte=filters["min_price"])
+    if filters["max_price"] != DEFAULT_MAX_PRICE:
+        products = products.filter(effective_price__lte=filters["max_price"])
+    # только товары в наличии
+    if filters["available"]:
+        products = products.filter(count__gt=0)
+    # только товары с бесплатной доставкой
+    if filters["free_delivery"]:
+        products = products.filter(free_delivery=True)
+    # фильтр по тегам - коррелированные EXISTS к таблице связей товар-тег:
+    # в отличие от join строки товаров не размножаются и distinct() не нужен
+    if filters["tags"]:
+        product_tags = Product.tags.through.objects.filter(product_id=OuterRef("pk"))
+        if filters["tags_mode"] == "all":
+            for tag in filters["tags"]:
+                products = products.filter(Exists(product_tags.filter(tag_id=tag)))
+        else:
+            products = products.filter(
+                Exists(product_tags.filter(tag_id__in=filters["tags"]))
+            )
+    # категория вместе со всеми подкатегориями любой глубины: один IN
+    # по id поддерева, взятому из материализованного пути
+    if filters["category"]:
+        products = products.filter(
+            category_id__in=category_subtree_ids(filters["category"])
+        )
+    return products
+
+
+def category_subtree_ids(category) -> list[int]:
+    """
+    Вернет id категории и всех ее потомков
+
+    Поддерево выбирается запросом по диапазону индекса path
+    (без рекурсивного обхода) и кешируется под версией каталога (любое изменение категорий ее меняет).
+    Если путь категории пустой (категории загружены loaddata, а команда
+    rebuild_category_paths еще не запускалась), потомки ищутся по parent_id
+    уровень за уровнем
+    """
+    cache_key = catalog_cache_key("category-subtree", {"id": str(category)})
+    ids = cache.get(cache_key)
+    if ids is None:
+        path = (
+            Category.objects.filter(pk=category).values_list("path", flat=True).first()
+        )
+        if path:
+            ids = list(Category.objects.subtree_of(path).values_list("pk", flat=True))
+        elif path is None:
+            ids = []
+        else:
+            logger.warning(
+                f"У категории {category} нет материализованного пути,"
+                " запустите python manage.py rebuild_category_paths"
+            )
+            ids = _subtree_ids_by_parent(int(category))
+        cache.set(cache_key, ids, catalog_cache_timeout())
+    return ids
+
+
+def _subtree_ids_by_parent(category: int) -> list[int]:
+    """
+    Обход поддерева по parent_id: один запрос на уровень дерева
+    """
+    ids, level = [category], [category]
+    while level:
+        level = [
+            pk
+            for pk in Category.objects.filter(parent_id__in=level).values_list(
+                "pk", flat=True
+            )
+            if pk not in ids
+        ]
+        ids.extend(level)
+    return ids
+
+
+def is_unfiltered(filters: dict) -> bool:
+    """
+    Фильтры совпадают со значениями по умолчанию (весь каталог)
+    """
+    return filters == catalog_filters(QueryDict())
+
+
+def _estimated_count(products: QuerySet) -> int | None:
+    """
+    Оценка кол-ва строк по статистике планировщика
+
+    PostgreSQL - оценка плана запроса products. SQLite - кол-во строк
+    частичного индекса каталога (archived=False) в sqlite_stat1, поэтому
+    годится только для каталога без фильтров. Если статистики нет
+    (ANALYZE не выполнялся) или СУБД другая - вернет None
+    """
+    if connection.vendor == "postgresql":
+        plan = json.loads(products.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+    if connection.vendor != "sqlite":
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE idx = %s", [CATALOG_STAT_INDEX]
+            )
+            row = cursor.fetchone()
+    except DatabaseError:
+        # таблицы sqlite_stat1 нет, пока ANALYZE ни разу не выполнялся;
+        # в SQLite такая ошибка транзакцию не прерывает, savepoint не нужен
+        return None
+    return int(row[0].split()[0]) if row else None
+
+
+def count_queryset(filters: dict) -> QuerySet:
+    """
+    Голый qs товаров каталога для подсчета кол-ва
+
+    Без select_related, prefetch, релевантности поиска и сортировки
+    """
+    return filter_products(
+        Product.objects.filter(archived=False), filters, ranked=False
+    ).order_by()
+
+
+def catalog_count(filters: dict) -> int:
+    """
+    Кол-во товаров каталога для расчета lastPage
+
+    Считается по голому qs (count_queryset) и кешируется по набору
+    фильтров на короткое время.
+    Для каталога без фильтров при CATALOG_ESTIMATED_COUNT используется
+    оценка планировщика, если она больше CATALOG_ESTIMATED_COUNT_MIN
+    """
+    cache_key = catalog_cache_key("count", filters)
+    total = cache.get(cache_key)
+    if total is not None:
+        return total
+
+    products = count_queryset(filters)
+    if getattr(settings, "CATALOG_ESTIMATED_COUNT", False) and is_unfiltered(filters):
+        total = _estimated_count(products)
+        if total is not None and total < getattr(
+            settings, "CATALOG_ESTIMATED_COUNT_MIN", 100_000
+        ):
+            total = None
+    if total is None:
+        total = products.count()
+    cache.set(cache_key, total, getattr(settings, "CATALOG_COUNT_CACHE_TIMEOUT", 30))
+    return total
+
+
+def page_number(page: int, total: int, limit: int) -> tuple[int, int]:
+    """
+    Вернет (номер страницы, кол-во страниц) по правилам Paginator.get_page:
+
+    страница вне диапазона заменяется последней
+    """
+    num_pages = max(math.ceil(total / limit), 1)
+    number = page if 1 <= page <= num_pages else num_pages
+    return number, num_pages
+
+
+def catalog_facets(products: QuerySet, buckets=PRICE_HISTOGRAM_BUCKETS) -> dict:
+    """
+    Считает фасеты каталога для отфильтрованного qs товаров
+
+    Всегда 4 агрегирующих запроса независимо от кол-ва тегов и категорий:
+    сводка (кол-во, наличие, доставка, min/max цены), теги, категории
+    и гистограмма цен
+    """
+    # фасеты считаем по id отобранных товаров: так условия фильтра
+    # (EXISTS по тегам, поиск) не смешиваются с join подсчета тегов
+    matched = Product.objects.filter(pk__in=products.order_by().values("pk"))
+
+    summary = matched.aggregate(
+        total=Count("pk"),
+        available=Count("pk", filter=Q(count__gt=0)),
+        free_delivery=Count("pk", filter=Q(free_delivery=True)),
+        min_price=Min("effective_price"),
+        max_price=Max("effective_price"),
+    )
+    tags = (
+        Tag.objects.filter(products__in=matched)
+        .annotate(count=Count("products"))
+        .values("id", "name", "count")
+        .order_by("-count", "name")
+    )
+    categories = (
+        matched.values("category_id", "category__title")
+        .annotate(count=Count("pk"))
+        .order_by("-count", "category__title")
+    )
+
+    histogram = []
+    min_price, max_price = summary["min_price"], summary["max_price"]
+    if min_price is not None:
+        # границы столбцов - точные Decimal с шагом цены (копейки): цена
+        # на границе попадает в столбец справа, как и показывают from / to
+        places = Product._meta.get_field("effective_price").decimal_places
+        cent = Decimal(1).scaleb(-places)
+        width = ((max_price - min_price) / buckets).quantize(
+            cent, rounding=ROUND_CEILING
+        ) or cent
+        bounds = [min_price + width * number for number in range(buckets + 1)]
+        # номер столбца - сравнением с границами, без деления в float;
+        # максимальная цена - в последний столбец
+        rows = (
+            matched.annotate(
+                bucket=Case(
+                    *(
+                        When(effective_price__lt=bound, then=Value(number))
+                        for number, bound in enumerate(bounds[1:buckets])
+                    ),
+                    default=Value(buckets - 1),
+                    output_field=IntegerField(),
+                )
+            )
+            .values("bucket")
+            .annotate(count=Count("pk"))
+        )
+        counts = {row["bucket"]: row["count"] for row in rows}
+        histogram = [
+            {
+                "from": bounds[number],
+                "to": bounds[number + 1],
+                "count": counts.get(number, 0),
+            }
+            for number in range(buckets)
+        ]
+
+    return {
+        "total": summary["total"],
+        "available": summary["available"],
+        "freeDelivery": summary["free_delivery"],
+        "tags": list(tags),
+        "categories": [
+            {
+                "id": row["category_id"],
+                "title": row["category__title"],
+                "count": row["count"],
+            }
+            for row in categories
+        ],
+        "price": {"min": min_price, "max": max_price, "histogram": histogram},
+    }
+
+
+class InvalidCursor(ValueError):
+    """
+    Курсор из запроса не удалось разобрать
+    """
+
+
+class CursorPage(NamedTuple):
+    """
+    Страница каталога, полученная по курсору
+    """
+
+    items: list
+    number: int
+    next_cursor: str | None
+
+
+def catalog_ordering(sort: str | None, sort_type: str | None, ranked=False) -> list:
+    """
+    Вернет список полей для order_by по параметрам sort и sortType
+
+    Последним всегда идет id: он разрешает равенство ключа сортировки,
+    поэтому порядок товаров стабилен и пригоден для курсора.
+    ranked=True - в qs есть релевантность поиска search_rank,
+    она используется, если явная сортировка не передана.
+    Без сортировки - новые товары сверху: этот порядок читается по индексу
+    product_catalog_date_idx (по id SQLite просматривал бы всю таблицу)
+    """
+    field = CATALOG_SORT_FIELDS.get(sort)
+    if field and sort == "rating":
+        # рейтинг: по убыванию только при sortType=dec, иначе по возрастанию
+        descending = sort_type == "dec"
+    elif field and sort_type in ("inc", "dec"):
+        descending = sort_type == "dec"
+    elif ranked:
+        field, descending = "search_rank", True
+    else:
+        field, descending = "date", True
+    sign = "-" if descending else ""
+    return [f"{sign}{field}", f"{sign}pk"]
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value)} нельзя сохранить в курсоре")
+
+
+def encode_cursor(key, pk: int, number: int, order: str) -> str:
+    """
+    Упаковывает ключ сортировки последнего товара страницы в непрозрачную строку
+
+    order - первое поле ordering ("-effective_price"): курсор годится
+    только для той сортировки, с которой он получен
+    """
+    payload = json.dumps(
+        {"o": order, "k": key, "id": pk, "p": number}, default=_json_default
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order: str) -> dict:
+    """
+    Распаковывает курсор, полученный из encode_cursor с той же сортировкой order
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        decoded = {
+            "o": payload["o"],
+            "k": payload["k"],
+            "id": int(payload["id"]),
+            "p": int(payload["p"]),
+        }
+    except (ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if decoded["o"] != order:
+        # курсор другой сортировки: его ключ нельзя сравнивать с этим полем
+        raise InvalidCursor(cursor)
+    return decoded
+
+
+def _cursor_key(queryset: QuerySet, field: str, key):
+    """
+    Приводит ключ курсора к типу поля сортировки (аннотации - числа)
+    """
+    try:
+        model_field = queryset.model._meta.get_field(field)
+    except FieldDoesNotExist:
+        model_field = FloatField()
+    return model_field.to_python(key)
+
+
+def paginate_by_cursor(
+    queryset: QuerySet, ordering: list, cursor: str | None, limit: int
+) -> CursorPage:
+    """
+    Вернет страницу qs, следующую за курсором
+
+    Вместо COUNT(*) и OFFSET используется условие
+    (ключ, id) > (ключ курсора, id курсора) по направлению сортировки,
+    а наличие следующей страницы определяется выборкой limit + 1 строк.
+    Курсор другой сортировки или с ключом не того типа - InvalidCursor
+    """
+    field = ordering[0].lstrip("-")
+    descending = ordering[0].startswith("-")
+    number = 1
+    if cursor:
+        payload = decode_cursor(cursor, ordering[0])
+        number = payload["p"] + 1
+        after = "lt" if descending else "gt"
+        try:
+            if field == "pk":
+                queryset = queryset.filter(**{f"pk__{after}": payload["id"]})
+            else:
+                key = _cursor_key(queryset, field, payload["k"])
+                queryset = queryset.filter(
+                    Q(**{f"{field}__{after}": key})
+                    | Q(**{field: key, f"pk__{after}": payload["id"]})
+                )
+        except (ValidationError, TypeError, ValueError) as exc:
+            raise InvalidCursor(cursor) from exc
+
+    rows = list(queryset.order_by(*ordering)[: limit + 1])
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        key = last.pk if field == "pk" else getattr(last, field)
+        next_cursor = encode_cursor(key, last.pk, number, ordering[0])
+    return CursorPage(items, number, next_cursor)
@@ -0,0 +1,60 @@
+"""
+Дерево категорий товаров (GET /api/categories/)
+
+Готовый JSON дерева вместе со ссылками на картинки хранится в кеше
+без срока жизни и пересобирается только после изменения категории
+или картинки (products/signals.py).
+"""
+
+from django.core.cache import cache
+
+from .models import Category
+from .serializers import CategorySerializer
+
+CATEGORY_TREE_KEY = "catalog:categories:tree"
+
+
+def build_category_tree() -> list[dict]:
+    """
+    Собирает дерево активных категорий произвольной глубины
+
+    Один запрос: категории упорядочены по материализованному пути
+    (подкатегории идут в порядке id). Узлы связываются по parent_id
+    после выборки, поэтому дерево верное и при пустых путях (до команды
+    rebuild_category_paths). Подкатегории неактивной категории
+    не показываются вместе с ней
+    """
+    categories = (
+        Category.objects.filter(is_active=True)
+        .select_related("image")
+        .order_by("path", "pk")
+    )
+    nodes = {}
+    for category, node in zip(
+        categories, CategorySerializer(categories, many=True).data
+    ):
+        node["subcategories"] = []
+        nodes[category.pk] = (category.parent_id, node)
+    tree = []
+    for parent_id, node in nodes.values():
+        if parent_id is None:
+            tree.append(node)
+        elif parent_id in nodes:
+            nodes[parent_id][1]["subcategories"].append(node)
+        # иначе родитель неактивен - ветка скрыта целиком
+    return tree
+
+
+def category_tree() -> list[dict]:
+    """
+    Вернет дерево категорий из кеша, при промахе соберет его заново
+    """
+    tree = cache.get(CATEGORY_TREE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(CATEGORY_TREE_KEY, tree, None)
+    return tree
+
+
+def invalidate_category_tree() -> None:
+    cache.delete(CATEGORY_TREE_KEY)
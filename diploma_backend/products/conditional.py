@@ -0,0 +1,104 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для публичных эндпоинтов товаров
+
+ETag и Last-Modified строятся только по отметкам времени изменения
+из кеша (products/cache.py), поэтому на совпавший If-None-Match или
+If-Modified-Since ответ 304 отдается без запросов к базе.
+Cache-Control: no-cache заставляет браузер проверять актуальность
+ответа при каждой навигации, а не держать его по эвристике.
+
+Отметки должны быть общими для всех процессов: с кешем в памяти процесса
+(LocMemCache, DummyCache) изменения из других процессов и задач Celery
+не видны, поэтому ETag и Last-Modified не отдаются и 304 не бывает.
+"""
+
+from datetime import datetime, time, timezone
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone as django_timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .cache import catalog_modified, product_modified
+
+
+def shared_cache() -> bool:
+    """
+    Общий ли кеш у процессов (отметкам изменения можно доверять)
+    """
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def _as_datetime(stamp: int) -> datetime:
+    return datetime.fromtimestamp(stamp / 1_000_000, tz=timezone.utc)
+
+
+def catalog_etag(request, *args, **kwargs) -> str:
+    return f"catalog-{catalog_modified()}"
+
+
+def catalog_last_modified(request, *args, **kwargs) -> datetime:
+    return _as_datetime(catalog_modified())
+
+
+def product_etag(request, pk, *args, **kwargs) -> str:
+    bulk, product = product_modified(pk)
+    return f"product-{pk}-{bulk}-{product}"
+
+
+def product_last_modified(request, pk, *args, **kwargs) -> datetime:
+    return _as_datetime(max(product_modified(pk)))
+
+
+def sales_etag(request, *args, **kwargs) -> str:
+    # список действующих скидок меняется и без изменений в базе - в полночь
+    return f"sales-{django_timezone.localdate()}-{catalog_modified()}"
+
+
+def sales_last_modified(request, *args, **kwargs) -> datetime:
+    midnight = datetime.combine(
+        django_timezone.localdate(),
+        time.min,
+        tzinfo=django_timezone.get_current_timezone(),
+    )
+    return max(_as_datetime(catalog_modified()), midnight)
+
+
+def conditional(etag_func, last_modified_func):
+    """
+    Декоратор функции представления: 304 по ETag / Last-Modified и no-cache
+
+    Ставится над @api_view, чтобы проверка выполнялась до DRF
+    """
+
+    def etag(request, *args, **kwargs):
+        return etag_func(request, *args, **kwargs) if shared_cache() else None
+
+    def last_modified(request, *args, **kwargs):
+        if not shared_cache():
+            return None
+        return last_modified_func(request, *args, **kwargs)
+
+    def decorator(view):
+        view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+        return cache_control(no_cache=True)(view)
+
+    return decorator
+
+
+def conditional_view(etag_func, last_modified_func):
+    """
+    То же для представления на основе класса (оборачивает dispatch)
+    """
+    return method_decorator(
+        conditional(etag_func, last_modified_func), name="dispatch"
+    )
+
+
+catalog_conditional = conditional(catalog_etag, catalog_last_modified)
+catalog_conditional_view = conditional_view(catalog_etag, catalog_last_modified)
+product_conditional_view = conditional_view(product_etag, product_last_modified)
+sales_conditional = conditional(sales_etag, sales_last_modified)
@@ -0,0 +1,286 @@
+"""
+Колоночный in-memory движок каталога для анонимного трафика
+
+Держит в памяти процесса NumPy-снимок всех не архивных товаров
+(id, категория, цена со скидкой, остаток, бесплатная доставка, дата,
+кол-во отзывов, рейтинг, популярность и битовая карта тегов) и выполняет фильтрацию,
+сортировку и пагинацию каталога векторными операциями. Из базы затем
+загружаются только товары текущей страницы.
+
+Движок необязательный: включается настройкой CATALOG_COLUMNAR_ENGINE
+и требует установленного numpy. Снимок обновляется точечно сигналами
+(products/signals.py), а изменения, сделанные в других процессах,
+подхватываются полной перезагрузкой раз в CATALOG_ENGINE_MAX_AGE секунд.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+from .catalog import (DEFAULT_MAX_PRICE, DEFAULT_MIN_PRICE, catalog_ordering,
+                      category_subtree_ids, page_number)
+from .models import Product
+
+try:
+    import numpy as np
+except ImportError:  # numpy - необязательная зависимость
+    np = None
+
+# колонки товара, которые попадают в снимок
+SNAPSHOT_FIELDS = (
+    "id",
+    "category_id",
+    "effective_price",
+    "count",
+    "free_delivery",
+    "date",
+    "reviews_count",
+    "avg_rating",
+    "popularity_score",
+)
+
+
+class Snapshot:
+    """
+    Неизменяемый снимок колонок каталога
+
+    При обновлении строится новый снимок, поэтому читающие потоки
+    всегда работают с согласованным набором массивов
+    """
+
+    __slots__ = (
+        "ids",
+        "category",
+        "price",
+        "count",
+        "free_delivery",
+        "date",
+        "reviews_count",
+        "avg_rating",
+        "popularity",
+        "tag_bits",
+        "tag_columns",
+        "built_at",
+    )
+
+    def __init__(self, rows: list, links: list, tag_columns: dict, built_at: float):
+        """
+        rows - строки values_list(*SNAPSHOT_FIELDS), links - пары (product_id, tag_id),
+        tag_columns - номер бита в битовой карте для каждого id тега
+        """
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.category = np.array([row[1] for row in rows], dtype=np.int64)
+        self.price = np.array([float(row[2]) for row in rows], dtype=np.float64)
+        self.count = np.array([row[3] for row in rows], dtype=np.int64)
+        self.free_delivery = np.array([row[4] for row in rows], dtype=bool)
+        self.date = np.array(
+            [int(row[5].timestamp() * 1_000_000) for row in rows], dtype=np.int64
+        )
+        self.reviews_count = np.array([row[6] for row in rows], dtype=np.int64)
+        self.avg_rating = np.array([row[7] for row in rows], dtype=np.float64)
+        self.popularity = np.array([row[8] for row in rows], dtype=np.float64)
+        self.tag_columns = tag_columns
+        self.built_at = built_at
+
+        # битовая карта тегов: строка на товар, по биту на тег
+        tag_matrix = np.zeros((len(rows), max(len(tag_columns), 1)), dtype=bool)
+        position = {product_id: index for index, product_id in enumerate(self.ids)}
+        for product_id, tag_id in links:
+            if product_id in position:
+                tag_matrix[position[product_id], tag_columns[tag_id]] = True
+        self.tag_bits = np.packbits(tag_matrix, axis=1)
+
+    def tag_mask(self, column: int):
+        """
+        Вектор "у товара есть тег" для номера бита column
+        """
+        return ((self.tag_bits[:, column >> 3] >> (7 - (column & 7))) & 1).astype(bool)
+
+    def merged(self, other: "Snapshot", replaced_ids) -> "Snapshot":
+        """
+        Вернет новый снимок: строки replaced_ids заменены строками other
+        """
+        keep = ~np.isin(self.ids, np.asarray(list(replaced_ids), dtype=np.int64))
+        merged = Snapshot.__new__(Snapshot)
+        for name in (
+            "ids",
+            "category",
+            "price",
+            "count",
+            "free_delivery",
+            "date",
+            "reviews_count",
+            "avg_rating",
+            "popularity",
+            "tag_bits",
+        ):
+            setattr(
+                merged,
+                name,
+                np.concatenate([getattr(self, name)[keep], getattr(other, name)]),
+            )
+        merged.tag_columns = self.tag_columns
+        merged.built_at = self.built_at
+        return merged
+
+
+class CatalogEngine:
+    """
+    Обслуживает запросы каталога из снимка в памяти
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def snapshot(self) -> Snapshot:
+        """
+        Вернет актуальный снимок, при необходимости перезагрузив его целиком
+        """
+        snapshot = self._snapshot
+        max_age = getattr(settings, "CATALOG_ENGINE_MAX_AGE", 300)
+        if snapshot is None or time.monotonic() - snapshot.built_at > max_age:
+            snapshot = self.reload()
+        return snapshot
+
+    def _read(self, product_ids=None, tag_columns=None) -> Snapshot | None:
+        """
+        Читает строки товаров из базы и строит по ним снимок
+
+        Вернет None, если у товаров есть теги, которых нет в tag_columns
+        """
+        products = Product.objects.filter(archived=False)
+        links = Product.tags.through.objects.filter(product__archived=False)
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+            links = links.filter(product_id__in=product_ids)
+        rows = list(products.order_by("pk").values_list(*SNAPSHOT_FIELDS))
+        links = list(links.values_list("product_id", "tag_id"))
+        if tag_columns is None:
+            tag_ids = sorted({tag_id for _, tag_id in links})
+            tag_columns = {tag_id: column for column, tag_id in enumerate(tag_ids)}
+        elif any(tag_id not in tag_columns for _, tag_id in links):
+            return None
+        return Snapshot(rows, links, tag_columns, time.monotonic())
+
+    def reload(self) -> Snapshot:
+        """
+        Полностью перечитывает снимок из базы
+        """
+        snapshot = self._read()
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def refresh_products(self, product_ids) -> None:
+        """
+        Точечно перечитывает строки изменившихся товаров
+
+        Архивные и удаленные товары из снимка пропадают, новые добавляются
+        """
+        product_ids = set(product_ids)
+        if self._snapshot is None or not product_ids:
+            return
+        with self._lock:
+            current = self._snapshot
+            changed = self._read(product_ids, current.tag_columns)
+            if changed is None:
+                # появился новый тег - битовую карту нужно расширять целиком
+                self._snapshot = None
+                return
+            self._snapshot = current.merged(changed, product_ids)
+
+    def query(self, filters: dict, sort, sort_type, page: int, limit: int):
+        """
+        Фильтрует, сортирует и режет на страницы снимок каталога
+
+        Вернет (id товаров страницы, всего товаров) или None, если запрос
+        движком не поддерживается (поиск по имени) - тогда работает ORM
+        """
+        if filters["name"]:
+            return None
+        try:
+            category = int(filters["category"]) if filters["category"] else None
+            tag_ids = [int(tag) for tag in filters["tags"]]
+        except ValueError:
+            return None
+
+        snap = self.snapshot()
+        mask = np.ones(len(snap.ids), dtype=bool)
+        if filters["min_price"] != DEFAULT_MIN_PRICE:
+            mask &= snap.price >= filters["min_price"]
+        if filters["max_price"] != DEFAULT_MAX_PRICE:
+            mask &= snap.price <= filters["max_price"]
+        if filters["available"]:
+            mask &= snap.count > 0
+        if filters["free_delivery"]:
+            mask &= snap.free_delivery
+        if category is not None:
+            # категория вместе с подкатегориями, как и в ORM-пути
+            mask &= np.isin(snap.category, category_subtree_ids(category))
+        if tag_ids:
+            columns = [snap.tag_columns.get(tag_id) for tag_id in tag_ids]
+            known = [snap.tag_mask(column) for column in columns if column is not None]
+            if filters["tags_mode"] == "all":
+                # тега нет ни у одного товара - под условие "все теги" не попадет никто
+                if len(known) < len(columns):
+                    mask[:] = False
+                else:
+                    mask &= np.logical_and.reduce(known)
+            else:
+                mask &= np.logical_or.reduce(known) if known else False
+
+        selected = np.flatnonzero(mask)
+        total = len(selected)
+        ordering = catalog_ordering(sort, sort_type)
+        field = ordering[0].lstrip("-")
+        keys = {
+            "pk": snap.ids,
+            "effective_price": snap.price,
+            "date": snap.date,
+            "reviews_count": snap.reviews_count,
+            "avg_rating": snap.avg_rating,
+            "popularity_score": snap.popularity,
+        }[field][selected]
+        ids = snap.ids[selected]
+        # как и в ORM: ключ сортировки, затем id в том же направлении
+        if ordering[0].startswith("-"):
+            order = np.lexsort((-ids, -keys))
+        else:
+            order = np.lexsort((ids, keys))
+
+        # номер страницы ограничиваем так же, как в ORM-пути каталога
+        number, _ = page_number(page, total, limit)
+        start = (number - 1) * limit
+        return ids[order[start : start + limit]].tolist(), total
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_catalog_engine() -> CatalogEngine | None:
+    """
+    Вернет движок каталога процесса или None, если он выключен или нет numpy
+    """
+    global _engine
+    if np is None or not getattr(settings, "CATALOG_COLUMNAR_ENGINE", False):
+        return None
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = CatalogEngine()
+    return _engine
+
+
+def loaded_catalog_engine() -> CatalogEngine | None:
+    """
+    Вернет движок, только если его снимок уже загружен (для точечных обновлений)
+    """
+    engine = get_catalog_engine()
+    return engine if engine is not None and engine.loaded else None
@@ -0,0 +1,58 @@
+"""
+Пакетная загрузка карточек товаров
+
+Карточка - товар со всем, что нужно ProductSerializer: картинки и теги.
+Кол-во отзывов, рейтинг и цена со скидкой хранятся в колонках товара,
+а категория отдается как category_id, поэтому дополнительных запросов
+они не требуют. Все эндпоинты, которые отдают карточки товаров
+(главная, каталог, корзина, заказы), загружают их через этот модуль.
+"""
+
+from django.db.models import Prefetch
+
+from .models import Image, Product, Tag
+
+
+def load_product_cards(product_ids) -> list[Product]:
+    """
+    Загружает карточки товаров по списку id
+
+    Всегда 3 запроса (товары, картинки, теги) независимо от кол-ва
+    товаров. Вернет товары в порядке product_ids, повторы
+    и отсутствующие id пропускаются
+    """
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return []
+    products = Product.objects.prefetch_related(
+        Prefetch("tags", queryset=Tag.objects.order_by("pk")),
+        Prefetch("images", queryset=Image.objects.order_by("pk")),
+    ).in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def attach_product_cards(items, field="product") -> list:
+    """
+    Подставляет карточки товаров в объекты со ссылкой на товар
+
+    items - позиции корзины, заказа и т.п. с внешним ключом field на Product.
+    Карточки всех позиций загружаются одним вызовом load_product_cards;
+    позиции, у которых товар уже загружен, не трогаются. Вернет список items
+    """
+    items = list(items)
+    pending = [
+        item
+        for item in items
+        if not item._meta.get_field(field).is_cached(item)
+    ]
+    cards = {
+        product.pk: product
+        for product in load_product_cards(
+            getattr(item, f"{field}_id") for item in pending
+        )
+    }
+    for item in pending:
+        card = cards.get(getattr(item, f"{field}_id"))
+        if card is not None:
+            setattr(item, field, card)
+    return items
@@ -0,0 +1,166 @@
+"""
+Генерация синтетического каталога для бенчмарков и проверки планов запросов
+
+Модуль начинается с "_", поэтому Django не считает его management-командой
+"""
+
+import random
+from datetime import timedelta
+
+from django.utils import timezone
+
+from products.models import Category, Image, Product, Review, Sale, Specification, Tag
+
+# словарь для генерации названий и описаний синтетических товаров
+WORDS = [
+    "ноутбук",
+    "смартфон",
+    "телевизор",
+    "наушники",
+    "монитор",
+    "клавиатура",
+    "gaming",
+    "rgb",
+    "wireless",
+    "pro",
+    "ultra",
+    "black",
+    "white",
+    "mini",
+    "max",
+    "smart",
+]
+
+
+def seed_products(total: int, categories: list[Category]) -> list[int]:
+    """
+    Досоздает синтетические товары, пока их не станет total
+
+    Товары равномерно распределяются по categories. Вернет id созданных товаров.
+    bulk_create не вызывает сигналы: производные данные (поисковый индекс и т.п.)
+    вызывающий код перестраивает сам
+    """
+    existing = Product.objects.count()
+    products = []
+    for _ in range(max(total - existing, 0)):
+        title = " ".join(random.sample(WORDS, 3))
+        price = random.randint(100, 100_000)
+        products.append(
+            Product(
+                title=title,
+                category=random.choice(categories),
+                price=price,
+                effective_price=price,
+                count=random.randint(0, 50),
+                description=" ".join(random.sample(WORDS, 6)),
+                full_description=title,
+                free_delivery=random.random() < 0.3,
+                is_limited=random.random() < 0.05,
+                is_banner=random.random() < 0.01,
+                archived=random.random() < 0.1,
+                sort_index=random.randint(1, 100),
+                purchases_count=random.randint(0, 1000),
+                reviews_count=random.randint(0, 50),
+                avg_rating=round(random.uniform(1, 5), 2),
+            )
+        )
+    created = Product.objects.bulk_create(products, batch_size=5_000)
+    return [product.pk for product in created]
+
+
+def seed_category_tree(depth: int, width: int, title="benchmark") -> list[Category]:
+    """
+    Создает полное дерево категорий: width детей у каждого узла, depth уровней
+
+    Вернет все категории дерева, первой идет корневая.
+    Категории сохраняются по одной, чтобы Category.save построил пути
+    """
+    root = Category.objects.create(title=title)
+    categories, level = [root], [root]
+    for _ in range(depth):
+        level = [
+            Category.objects.create(title=title, parent=parent)
+            for parent in level
+            for _ in range(width)
+        ]
+        categories.extend(level)
+    return categories
+
+
+def seed_tags(product_ids: list[int], tags: list[Tag], max_per_product=4) -> None:
+    """
+    Привязывает к товарам от 0 до max_per_product случайных тегов
+    """
+    through = Product.tags.through
+    links = [
+        through(product_id=product_id, tag_id=tag.pk)
+        for product_id in product_ids
+        for tag in random.sample(tags, random.randint(0, max_per_product))
+    ]
+    through.objects.bulk_create(links, batch_size=5_000)
+
+
+def seed_reviews(product_ids: list[int], max_per_product=5) -> None:
+    """
+    Создает товарам случайные отзывы и пересчитывает счетчики отзывов
+    """
+    reviews = [
+        Review(
+            product_id=product_id,
+            author="benchmark",
+            email="benchmark@example.com",
+            text="benchmark",
+            rate=random.randint(1, 5),
+        )
+        for product_id in product_ids
+        for _ in range(random.randint(0, max_per_product))
+    ]
+    Review.objects.bulk_create(reviews, batch_size=5_000)
+    products = Product.objects.filter(pk__in=product_ids)
+    products.update_rating_counters()
+    products.update_rating_histograms()
+
+
+def seed_images_and_specifications(product_ids: list[int], per_product=3) -> None:
+    """
+    Создает товарам картинки (без файлов, только имя) и характеристики
+    """
+    Image.objects.bulk_create(
+        [
+            Image(product_id=product_id, src=f"images/bench-{number}.jpg", alt="")
+            for product_id in product_ids
+            for number in range(per_product)
+        ],
+        batch_size=5_000,
+    )
+    Specification.objects.bulk_create(
+        [
+            Specification(product_id=product_id, name=word, value=word)
+            for product_id in product_ids
+            for word in random.sample(WORDS, per_product)
+        ],
+        batch_size=5_000,
+    )
+
+
+def seed_sales(product_ids: list[int], share=0.3) -> None:
+    """
+    Создает скидки у доли share товаров и пересчитывает их цены со скидкой
+
+    Даты как у накопившейся истории акций: большая часть скидок
+    уже закончилась, часть действует сегодня, часть еще не началась
+    """
+    today = timezone.localdate()
+    sales = []
+    for product_id in random.sample(product_ids, int(len(product_ids) * share)):
+        date_from = today + timedelta(days=random.randint(-365, 30))
+        sales.append(
+            Sale(
+                product_id=product_id,
+                sale_price=random.randint(50, 50_000),
+                date_from=date_from,
+                date_to=date_from + timedelta(days=random.randint(1, 60)),
+            )
+        )
+    Sale.objects.bulk_create(sales, batch_size=5_000)
+    Product.objects.filter(pk__in=product_ids).update_effective_price()
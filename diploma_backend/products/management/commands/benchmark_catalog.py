@@ -0,0 +1,281 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+
+from products import fast_serializers, search
+from products.catalog import (catalog_filters, category_subtree_ids,
+                              filter_products)
+from products.loaders import load_product_cards
+from products.models import Category, Product, Tag
+from products.serializers import ProductDetailSerializer, ProductSerializer
+from products.views import ProductDetailView
+
+from ._synthetic import (seed_category_tree, seed_images_and_specifications,
+                         seed_products, seed_reviews, seed_tags)
+
+
+class Command(BaseCommand):
+    """
+    Команда сравнивает производительность запросов каталога на синтетических данных
+
+    python manage.py benchmark_catalog search --sizes 10000 100000 1000000
+    python manage.py benchmark_catalog tags --sizes 10000 100000
+    python manage.py benchmark_catalog categories --sizes 10000 100000
+    python manage.py benchmark_catalog serializer --sizes 1000
+    Все созданные данные удаляются откатом транзакции после замера
+    """
+
+    help = "Бенчмарк запросов каталога на синтетическом наборе товаров"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenario", choices=["search", "tags", "categories", "serializer"]
+        )
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="размеры каталога, на которых выполняется замер",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="кол-во повторов каждого запроса"
+        )
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        with transaction.atomic():
+            getattr(self, f"bench_{options['scenario']}")(options)
+            # синтетические данные в базе не оставляем
+            transaction.set_rollback(True)
+
+    def measure(self, func, repeat: int) -> float:
+        """
+        Вернет медианное время выполнения func в миллисекундах
+        """
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def report(self, size: int, results: dict[str, float]) -> None:
+        line = ", ".join(f"{name}: {ms:.2f} ms" for name, ms in results.items())
+        self.stdout.write(f"{size:>9} товаров | {line}")
+
+    def bench_search(self, options):
+        """
+        filter[name]: title__icontains против полнотекстового индекса
+        """
+        if not search.search_enabled():
+            self.stderr.write("Полнотекстовый поиск выключен, сравнение невозможно")
+            return
+        category = Category.objects.create(title="benchmark")
+        base = Product.objects.filter(archived=False)
+        query = "smart"
+
+        def icontains_page():
+            qs = base.filter(title__icontains=query)
+            qs.count()
+            list(qs.order_by("-date")[:20])
+
+        def fts_page():
+            qs = search.search_products(base, query)
+            qs.count()
+            list(qs.order_by("-search_rank")[:20])
+
+        for size in sorted(options["sizes"]):
+            seed_products(size, [category])
+            # bulk_create не вызывает сигналы, поэтому индекс перестраиваем явно
+            search.index_products()
+            self.report(
+                size,
+                {
+                    "icontains": self.measure(icontains_page, options["repeat"]),
+                    "full-text": self.measure(fts_page, options["repeat"]),
+                },
+            )
+
+    def bench_tags(self, options):
+        """
+        tags[]: join + distinct() против коррелированных EXISTS
+
+        Дополнительно проверяет, что кол-во отзывов при нескольких тегах
+        не размножается (у старого варианта Count("reviews") поверх join
+        с тегами считает каждый отзыв по разу на каждый совпавший тег)
+        """
+        category = Category.objects.create(title="benchmark")
+        tags = [Tag.objects.create(name=f"bench-{number}") for number in range(30)]
+        tag_ids = [str(tag.pk) for tag in tags[:3]]
+        base = Product.objects.filter(archived=False)
+
+        def join_page():
+            qs = (
+                base.filter(tags__pk__in=tag_ids)
+                .annotate(reviews_total=Count("reviews"))
+                .distinct()
+            )
+            qs.count()
+            return list(qs.order_by("-date", "-pk")[:20])
+
+        def exists_page(mode):
+            params = QueryDict(mutable=True)
+            params.setlist("tags[]", tag_ids)
+            params["tagsMode"] = mode
+            qs = filter_products(base, catalog_filters(params))
+            qs.count()
+            return list(qs.order_by("-date", "-pk")[:20])
+
+        for size in sorted(options["sizes"]):
+            new_ids = seed_products(size, [category])
+            seed_tags(new_ids, tags)
+            seed_reviews(new_ids[:2_000])
+
+            joined = join_page()
+            exists = exists_page("any")
+            wrong_counts = sum(
+                product.reviews_total != product.reviews_count for product in joined
+            )
+            same_rows = [p.pk for p in joined] == [p.pk for p in exists]
+            self.report(
+                size,
+                {
+                    "join+distinct": self.measure(join_page, options["repeat"]),
+                    "exists any": self.measure(
+                        lambda: exists_page("any"), options["repeat"]
+                    ),
+                    "exists all": self.measure(
+                        lambda: exists_page("all"), options["repeat"]
+                    ),
+                },
+            )
+            self.stdout.write(
+                f"{'':>9}          совпадение страниц: {same_rows}, "
+                f"неверных reviews у join: {wrong_counts} из {len(joined)}"
+            )
+
+    def bench_categories(self, options):
+        """
+        category: рекурсивный обход подкатегорий в Python против диапазона path
+
+        Замер на глубоком (8 уровней по 2 ветки) и широком
+        (2 уровня по 40 веток) деревьях. Запрашивается корневая категория,
+        то есть все товары дерева
+        """
+        trees = {
+            "deep": seed_category_tree(depth=8, width=2, title="benchmark-deep"),
+            "wide": seed_category_tree(depth=2, width=40, title="benchmark-wide"),
+        }
+        base = Product.objects.filter(archived=False)
+
+        def walk_ids(category):
+            # по запросу на каждый узел дерева
+            ids = [category.pk]
+            for child in category.subcategories.all():
+                ids.extend(walk_ids(child))
+            return ids
+
+        def walk_page(root):
+            qs = base.filter(category_id__in=walk_ids(root))
+            qs.count()
+            return list(qs.order_by("effective_price", "pk")[:20])
+
+        def path_page(root):
+            # без кеша id поддерева: замеряется сам запрос по пути
+            ids = list(
+                Category.objects.subtree_of(root.path).values_list("pk", flat=True)
+            )
+            qs = base.filter(category_id__in=ids)
+            qs.count()
+            return list(qs.order_by("effective_price", "pk")[:20])
+
+        def catalog_page(root):
+            filters = catalog_filters(QueryDict(f"category={root.pk}"))
+            qs = filter_products(base, filters)
+            qs.count()
+            return list(qs.order_by("effective_price", "pk")[:20])
+
+        all_categories = [category for tree in trees.values() for category in tree]
+        for size in sorted(options["sizes"]):
+            seed_products(size, all_categories)
+            for name, tree in trees.items():
+                root = tree[0]
+                same_rows = walk_page(root) == path_page(root) == catalog_page(root)
+                self.report(
+                    size,
+                    {
+                        f"{name} ({len(tree)} кат.) walk": self.measure(
+                            lambda: walk_page(root), options["repeat"]
+                        ),
+                        "path": self.measure(
+                            lambda: path_page(root), options["repeat"]
+                        ),
+                        "catalog (кеш id)": self.measure(
+                            lambda: catalog_page(root), options["repeat"]
+                        ),
+                    },
+                )
+                self.stdout.write(
+                    f"{'':>9}          совпадение страниц: {same_rows}, "
+                    f"id поддерева: {len(category_subtree_ids(root.pk))}"
+                )
+
+    def bench_serializer(self, options):
+        """
+        ProductSerializer против быстрого пути через values_list()
+
+        Сначала сверяет JSON обоих путей байт в байт (карточки страницы
+        каталога и страница товара), затем замеряет сериализацию страницы
+        из 20 карточек и страницы товара
+        """
+        category = Category.objects.create(title="benchmark")
+        tags = [Tag.objects.create(name=f"bench-{number}") for number in range(30)]
+        renderer = JSONRenderer()
+
+        for size in sorted(options["sizes"]):
+            new_ids = seed_products(size, [category])
+            seed_tags(new_ids, tags)
+            seed_reviews(new_ids[:200])
+            seed_images_and_specifications(new_ids[:200])
+            page_ids = new_ids[:20]
+            detail_id = new_ids[0]
+
+            def drf_cards():
+                cards = load_product_cards(page_ids)
+                return renderer.render(ProductSerializer(cards, many=True).data)
+
+            def fast_cards():
+                return renderer.render(fast_serializers.render_product_cards(page_ids))
+
+            def drf_detail():
+                product = ProductDetailView().get_queryset().get(pk=detail_id)
+                return renderer.render(ProductDetailSerializer(product).data)
+
+            def fast_detail():
+                data = fast_serializers.render_product_detail(detail_id)
+                return renderer.render(data)
+
+            same_cards = drf_cards() == fast_cards()
+            same_detail = drf_detail() == fast_detail()
+            self.report(
+                size,
+                {
+                    "cards drf": self.measure(drf_cards, options["repeat"]),
+                    "cards fast": self.measure(fast_cards, options["repeat"]),
+                    "detail drf": self.measure(drf_detail, options["repeat"]),
+                    "detail fast": self.measure(fast_detail, options["repeat"]),
+                },
+            )
+            self.stdout.write(
+                f"{'':>9}          одинаковый JSON: карточки {same_cards}, "
+                f"страница товара {same_detail}"
+            )
+            if not (same_cards and same_detail):
+                raise CommandError("Быстрый путь сериализации отличается от DRF")
@@ -0,0 +1,60 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from products.models import Category
+from products.query_plans import endpoint_queries, full_scans
+
+from ._synthetic import seed_products, seed_reviews, seed_sales
+
+
+class Command(BaseCommand):
+    """
+    Планы запросов публичных эндпоинтов на каталоге нужного размера
+
+    python manage.py check_query_plans --size 20000
+    Наполняет базу синтетическими товарами (в транзакции, которая откатывается)
+    и печатает результат проверки products/query_plans.py для каждого запроса.
+    Регрессионная проверка - тест QueryPlansTestCase
+    """
+
+    help = "Проверяет, что запросы каталога используют индексы (EXPLAIN)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size", type=int, default=20_000, help="кол-во синтетических товаров"
+        )
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="печатать планы целиком"
+        )
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        failures = []
+        with transaction.atomic():
+            categories = [
+                Category.objects.create(title=f"plan-check-{number}")
+                for number in range(20)
+            ]
+            product_ids = seed_products(options["size"], categories)
+            seed_reviews(product_ids)
+            seed_sales(product_ids)
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            for name, queryset in endpoint_queries(categories[0]).items():
+                scans, plan = full_scans(queryset)
+                status = "FULL SCAN: " + ", ".join(sorted(scans)) if scans else "ok"
+                self.stdout.write(f"{name:<32} {status}")
+                if options["verbose_plans"] or scans:
+                    self.stdout.write(plan)
+                if scans:
+                    failures.append(name)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                "Полный просмотр таблицы в запросах: " + ", ".join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS("Все запросы используют индексы"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import bump_catalog_version
+from products.categories import invalidate_category_tree
+from products.models import Category
+
+
+class Command(BaseCommand):
+    """
+    Команда пересчитывает материализованные пути категорий (Category.path)
+
+    python manage.py rebuild_category_paths
+    Нужна после загрузки фикстур: loaddata сохраняет категории в обход
+    Category.save, и пути остаются пустыми. По путям выбираются
+    подкатегории в фильтре каталога и строится дерево категорий
+    """
+
+    help = "Пересчитывает материализованные пути всех категорий"
+
+    def handle(self, *args, **options):
+        updated = Category.objects.rebuild_paths()
+        # bulk_update() не вызывает сигналы: дерево и кеш каталога сбрасываем явно
+        invalidate_category_tree()
+        bump_catalog_version()
+        self.stdout.write(
+            self.style.SUCCESS(f"Пути пересчитаны у {updated} категорий")
+        )
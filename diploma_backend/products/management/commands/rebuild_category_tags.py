@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.tag_index import rebuild_category_tags
+
+
+class Command(BaseCommand):
+    """
+    Команда пересчитывает индекс "категория - тег" (CategoryTag)
+
+    python manage.py rebuild_category_tags
+    Нужна после загрузки фикстур или массовых правок товаров и тегов
+    в обход приложения (update(), bulk_create())
+    """
+
+    help = "Пересчитывает кол-во товаров по парам категория - тег"
+
+    def handle(self, *args, **options):
+        total = rebuild_category_tags()
+        self.stdout.write(
+            self.style.SUCCESS(f"Индекс категория - тег пересчитан: {total} пар")
+        )
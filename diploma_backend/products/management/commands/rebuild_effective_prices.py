@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from products.cache import bump_catalog_version, touch_products
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Команда пересчитывает цены товаров с учетом скидок (effective_price)
+
+    python manage.py rebuild_effective_prices
+    Нужна после загрузки фикстур: сохранение товаров через loaddata
+    цену со скидкой не пересчитывает
+    """
+
+    help = "Пересчитывает effective_price у всех товаров"
+
+    def handle(self, *args, **options):
+        updated = Product.objects.all().update_effective_price()
+        # update() не вызывает сигналы, кеш каталога сбрасываем явно
+        bump_catalog_version()
+        touch_products()
+        self.stdout.write(
+            self.style.SUCCESS(f"Цены со скидкой пересчитаны у {updated} товаров")
+        )
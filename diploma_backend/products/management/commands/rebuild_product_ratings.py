@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Команда пересчитывает денормализованные счетчики отзывов у товаров
+
+    и гистограмму оценок (кол-во отзывов с оценкой 1-5) одним GROUP BY по Review
+
+    python manage.py rebuild_product_ratings
+    Нужна после загрузки фикстур или ручных правок таблицы Review в обход приложения
+    """
+
+    help = (
+        "Пересчитывает reviews_count, rating_sum, avg_rating"
+        " и гистограмму оценок у всех товаров"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--product",
+            type=int,
+            nargs="*",
+            help="id товаров для пересчета (по умолчанию - все товары)",
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options["product"]:
+            products = products.filter(pk__in=options["product"])
+        updated = products.update_rating_counters()
+        products.update_rating_histograms()
+        self.stdout.write(
+            self.style.SUCCESS(f"Счетчики отзывов пересчитаны у {updated} товаров")
+        )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products import search
+
+
+class Command(BaseCommand):
+    """
+    Команда полностью перестраивает поисковый индекс товаров
+
+    python manage.py rebuild_search_index
+    Нужна после включения CATALOG_FULL_TEXT_SEARCH, смены CATALOG_SEARCH_CONFIG
+    или массовой загрузки товаров в обход сигналов (bulk_create, loaddata)
+    """
+
+    help = "Перестраивает полнотекстовый индекс товаров каталога"
+
+    def handle(self, *args, **options):
+        if not search.search_enabled():
+            raise CommandError(
+                "Полнотекстовый поиск выключен (CATALOG_FULL_TEXT_SEARCH)"
+                " или не поддерживается текущей СУБД"
+            )
+        search.index_products()
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс товаров перестроен"))
@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-03-02 10:12
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_counters(apps, schema_editor):
+    """
+    Заполняет счетчики отзывов у уже существующих товаров
+    """
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("products", "Review")
+    reviews = Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+    Product.objects.update(
+        reviews_count=Coalesce(
+            Subquery(reviews.annotate(total=Count("id")).values("total")),
+            0,
+            output_field=models.IntegerField(),
+        ),
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum("rate")).values("total")),
+            0,
+            output_field=models.IntegerField(),
+        ),
+        avg_rating=Coalesce(
+            Subquery(reviews.annotate(avg=Avg("rate")).values("avg")),
+            0.0,
+            output_field=models.FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0015_alter_sale_product"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="avg_rating",
+            field=models.FloatField(
+                default=0,
+                help_text="Обновляется автоматически вместе с количеством отзывов.",
+                verbose_name="средний рейтинг",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Обновляется автоматически вместе с количеством отзывов.",
+                verbose_name="сумма оценок отзывов",
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="reviews_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Обновляется автоматически при добавлении, изменении и удалении отзывов.",
+                verbose_name="количество отзывов",
+            ),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
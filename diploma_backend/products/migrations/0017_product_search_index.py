@@ -0,0 +1,79 @@
+# Generated by Django 6.0.1 on 2026-03-04 09:41
+
+from django.db import migrations
+
+FTS_TABLE = "products_product_fts"
+
+SQLITE_INDEX_ROWS_SQL = """
+    SELECT p.id, p.title, COALESCE(p.description, ''),
+        COALESCE((
+            SELECT group_concat(t.name, ' ')
+            FROM products_product_tags pt
+            JOIN products_tag t ON t.id = pt.tag_id
+            WHERE pt.product_id = p.id
+        ), '')
+    FROM products_product p
+"""
+
+POSTGRES_SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector('simple', COALESCE(p.title, '')), 'A')
+    || setweight(to_tsvector('simple', COALESCE(p.description, '')), 'B')
+    || setweight(to_tsvector('simple', COALESCE((
+        SELECT string_agg(t.name, ' ')
+        FROM products_product_tags pt
+        JOIN products_tag t ON t.id = pt.tag_id
+        WHERE pt.product_id = p.id
+    ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Создает поисковый индекс товаров и заполняет его текущими данными
+
+    SQLite - виртуальная таблица FTS5, PostgreSQL - колонка tsvector + GIN индекс
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            "USING fts5(title, description, tags, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags) "
+            f"{SQLITE_INDEX_ROWS_SQL}"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "ALTER TABLE products_product ADD COLUMN IF NOT EXISTS search_vector tsvector"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS products_product_search_idx "
+            "ON products_product USING GIN (search_vector)"
+        )
+        schema_editor.execute(
+            "UPDATE products_product p SET search_vector = "
+            + POSTGRES_SEARCH_VECTOR_SQL
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS products_product_search_idx")
+        schema_editor.execute(
+            "ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0016_product_reviews_count_rating_sum_avg_rating"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
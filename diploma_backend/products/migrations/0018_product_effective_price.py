@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-03-06 11:27
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def fill_effective_price(apps, schema_editor):
+    """
+    Заполняет цену с учетом действующей скидки у существующих товаров
+    """
+    Product = apps.get_model("products", "Product")
+    Sale = apps.get_model("products", "Sale")
+    today = timezone.localdate()
+    active_sale = Sale.objects.filter(
+        product=OuterRef("pk"), date_from__lte=today, date_to__gte=today
+    ).values("sale_price")[:1]
+    Product.objects.update(effective_price=Coalesce(Subquery(active_sale), F("price")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0017_product_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                help_text="Обновляется автоматически при изменении цены и скидок, а также ежедневно на границах дат действия скидок.",
+                max_digits=10,
+                verbose_name="актуальная цена с учетом скидки",
+            ),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
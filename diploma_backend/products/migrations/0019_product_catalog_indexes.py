@@ -0,0 +1,81 @@
+# Generated by Django 6.0.1 on 2026-03-10 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0018_product_effective_price"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("archived", False)),
+                fields=["category", "effective_price", "id"],
+                name="product_catalog_cat_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("archived", False)),
+                fields=["effective_price", "id"],
+                name="product_catalog_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("archived", False)),
+                fields=["date", "id"],
+                name="product_catalog_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("archived", False)),
+                fields=["reviews_count", "id"],
+                name="product_catalog_reviews_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("archived", False)),
+                fields=["avg_rating", "id"],
+                name="product_catalog_rating_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(
+                    ("archived", False), ("count__gt", 0), ("is_limited", True)
+                ),
+                fields=["-date"],
+                name="product_limited_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(
+                    ("archived", False), ("is_banner", False), ("is_limited", False)
+                ),
+                fields=["sort_index", "-purchases_count"],
+                name="product_popular_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_banner", True), ("is_limited", False)),
+                fields=["-date"],
+                name="product_banner_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-03-14 11:20
+
+from django.db import migrations, models
+
+
+def fill_category_paths(apps, schema_editor):
+    """
+    Заполняет материализованные пути у уже существующих категорий
+    """
+    Category = apps.get_model("products", "Category")
+    parents = dict(Category.objects.values_list("pk", "parent_id"))
+    paths = {}
+
+    def build(pk, seen=()):
+        if pk not in paths:
+            parent_id = parents[pk]
+            # цикл в старых данных обрываем: категория становится корневой
+            if parent_id is None or parent_id in seen or parent_id not in parents:
+                prefix = ""
+            else:
+                prefix = build(parent_id, seen + (pk,))
+            paths[pk] = f"{prefix}{pk:08d}/"
+        return paths[pk]
+
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.path = build(category.pk)
+    Category.objects.bulk_update(categories, ["path"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0019_product_catalog_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="Заполняется автоматически при сохранении категории.",
+                max_length=500,
+                verbose_name="материализованный путь",
+            ),
+        ),
+        migrations.RunPython(fill_category_paths, migrations.RunPython.noop),
+    ]
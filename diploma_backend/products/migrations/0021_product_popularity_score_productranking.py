@@ -0,0 +1,80 @@
+# Generated by Django 6.0.1 on 2026-03-18 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0020_category_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="popularity_score",
+            field=models.FloatField(
+                default=0,
+                help_text="Пересчитывается периодической задачей по продажам за последние дни, рейтингу и индексу сортировки.",
+                verbose_name="индекс популярности",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("archived", False)),
+                fields=["popularity_score", "id"],
+                name="product_catalog_popular_idx",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ProductRanking",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "position",
+                    models.PositiveIntegerField(verbose_name="место в рейтинге"),
+                ),
+                ("score", models.FloatField(verbose_name="индекс популярности")),
+                (
+                    "category",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rankings",
+                        to="products.category",
+                        verbose_name="категория (пусто - общий рейтинг)",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rankings",
+                        to="products.product",
+                        verbose_name="товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Product ranking",
+                "verbose_name_plural": "Product rankings",
+                "indexes": [
+                    models.Index(
+                        fields=["category", "position"],
+                        name="product_ranking_pos_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 6.0.1 on 2026-03-20 16:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_category_tags(apps, schema_editor):
+    """
+    Заполняет индекс "категория - тег" по уже существующим товарам
+    """
+    Product = apps.get_model("products", "Product")
+    CategoryTag = apps.get_model("products", "CategoryTag")
+    rows = (
+        Product.tags.through.objects.filter(product__archived=False)
+        .values("product__category_id", "tag_id")
+        .annotate(total=Count("product_id"))
+    )
+    CategoryTag.objects.bulk_create(
+        [
+            CategoryTag(
+                category_id=row["product__category_id"],
+                tag_id=row["tag_id"],
+                product_count=row["total"],
+            )
+            for row in rows
+        ],
+        batch_size=1_000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0021_product_popularity_score_productranking"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryTag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "product_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="кол-во товаров категории с тегом"
+                    ),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tag_counts",
+                        to="products.category",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="category_counts",
+                        to="products.tag",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Category tag",
+                "verbose_name_plural": "Category tags",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("category", "tag"), name="unique_category_tag"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_category_tags, migrations.RunPython.noop),
+    ]
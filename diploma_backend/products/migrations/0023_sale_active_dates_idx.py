@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-03-23 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0022_categorytag"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["date_from", "date_to"], name="sale_active_dates_idx"
+            ),
+        ),
+    ]
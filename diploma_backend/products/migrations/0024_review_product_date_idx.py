@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-03-24 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0023_sale_active_dates_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "-date", "-id"], name="review_product_date_idx"
+            ),
+        ),
+    ]
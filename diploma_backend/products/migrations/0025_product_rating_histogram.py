@@ -0,0 +1,68 @@
+# Generated by Django 6.0.1 on 2026-03-24 15:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_rating_histograms(apps, schema_editor):
+    """
+    Заполняет гистограммы оценок существующих товаров одним GROUP BY
+    """
+    Product = apps.get_model("products", "Product")
+    Review = apps.get_model("products", "Review")
+    products = {}
+    for product_id, rate, total in (
+        Review.objects.order_by()
+        .values_list("product_id", "rate")
+        .annotate(total=Count("id"))
+    ):
+        product = products.setdefault(product_id, Product(pk=product_id))
+        setattr(product, f"rating_{rate}_count", total)
+    fields = [f"rating_{rate}_count" for rate in range(1, 6)]
+    Product.objects.bulk_update(list(products.values()), fields, batch_size=1_000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0024_review_product_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="отзывов с оценкой 1"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="отзывов с оценкой 2"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="отзывов с оценкой 3"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="отзывов с оценкой 4"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="отзывов с оценкой 5"
+            ),
+        ),
+        migrations.RunPython(fill_rating_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-03-27 10:12
+
+from django.db import migrations
+
+FTS_TABLE = "products_product_fts"
+
+SQLITE_INDEX_ROWS_SQL = """
+    SELECT p.id, p.title, COALESCE(p.description, ''),
+        COALESCE((
+            SELECT group_concat(t.name, ' ')
+            FROM products_product_tags pt
+            JOIN products_tag t ON t.id = pt.tag_id
+            WHERE pt.product_id = p.id
+        ), '')
+    FROM products_product p
+"""
+
+
+def recreate_search_index(tokenizer):
+    """
+    Пересоздает таблицу FTS5 с токенизатором tokenizer и заполняет ее
+
+    trigram ищет слово запроса как подстроку ("phone" находит "iPhone"),
+    как прежний поиск title__icontains. На PostgreSQL ничего не меняется
+    """
+
+    def migrate(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+            f"USING fts5(title, description, tags, tokenize='{tokenizer}')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags) "
+            f"{SQLITE_INDEX_ROWS_SQL}"
+        )
+
+    return migrate
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0025_product_rating_histogram"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_search_index("trigram"), recreate_search_index("unicode61")
+        ),
+    ]
@@ -1,5 +1,205 @@
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import (Avg, Count, F, FloatField, OuterRef, Subquery, Sum,
+                              Value)
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf, Substr
+from django.utils import timezone
+
+# оценки отзыва и колонки товара с кол-вом отзывов по каждой оценке
+REVIEW_RATES = range(1, 6)
+
+
+def rating_histogram_field(rate: int) -> str:
+    """
+    Имя колонки товара с кол-вом отзывов с оценкой rate
+    """
+    return f"rating_{rate}_count"
+
+
+RATING_HISTOGRAM_FIELDS = tuple(rating_histogram_field(rate) for rate in REVIEW_RATES)
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    QuerySet товаров с операциями над денормализованными счетчиками отзывов
+    """
+
+    def _shift_review_counters(self, count: int, rate_sum: int, rates: dict) -> int:
+        """
+        Сдвигает счетчики отзывов на count отзывов с суммой оценок rate_sum,
+
+        rates - изменение кол-ва отзывов по оценкам {оценка: +-1}.
+        Выполняется одним UPDATE: в правой части SET используются
+        значения колонок до обновления, поэтому средний рейтинг
+        считается по уже сдвинутым сумме и количеству
+        """
+        reviews_count = F("reviews_count") + count
+        return self.update(
+            reviews_count=reviews_count,
+            rating_sum=F("rating_sum") + rate_sum,
+            avg_rating=Coalesce(
+                Cast(F("rating_sum") + rate_sum, FloatField())
+                / NullIf(reviews_count, 0),
+                0.0,
+                output_field=FloatField(),
+            ),
+            **{
+                rating_histogram_field(rate): F(rating_histogram_field(rate)) + delta
+                for rate, delta in rates.items()
+            },
+        )
+
+    def add_review_rate(self, rate: int) -> int:
+        """
+        Инкрементально учитывает новый отзыв с оценкой rate
+        """
+        return self._shift_review_counters(1, rate, {rate: 1})
+
+    def remove_review_rate(self, rate: int) -> int:
+        """
+        Инкрементально убирает из счетчиков удаленный отзыв с оценкой rate
+        """
+        return self._shift_review_counters(-1, -rate, {rate: -1})
+
+    def change_review_rate(self, old_rate: int, new_rate: int) -> int:
+        """
+        Учитывает изменение оценки отзыва с old_rate на new_rate
+        """
+        if old_rate == new_rate:
+            return 0
+        return self._shift_review_counters(
+            0, new_rate - old_rate, {old_rate: -1, new_rate: 1}
+        )
+
+    def update_rating_counters(self) -> int:
+        """
+        Пересчитывает счетчики отзывов из таблицы Review
+
+        Один UPDATE с коррелированными подзапросами для всех товаров qs
+        """
+        reviews = (
+            Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+        )
+        return self.update(
+            reviews_count=Coalesce(
+                Subquery(reviews.annotate(total=Count("id")).values("total")),
+                0,
+                output_field=models.IntegerField(),
+            ),
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(total=Sum("rate")).values("total")),
+                0,
+                output_field=models.IntegerField(),
+            ),
+            avg_rating=Coalesce(
+                Subquery(reviews.annotate(avg=Avg("rate")).values("avg")),
+                0.0,
+                output_field=FloatField(),
+            ),
+        )
+
+    def update_rating_histograms(self) -> int:
+        """
+        Пересчитывает кол-во отзывов по оценкам из таблицы Review
+
+        Отзывы читаются одним GROUP BY (товар, оценка); товары без отзывов
+        обнуляются одним UPDATE, остальные записываются bulk_update
+        """
+        histograms = {}
+        for product_id, rate, total in (
+            Review.objects.filter(product__in=self.values("pk"))
+            .order_by()
+            .values_list("product_id", "rate")
+            .annotate(total=Count("id"))
+        ):
+            histograms.setdefault(product_id, dict.fromkeys(REVIEW_RATES, 0))[
+                rate
+            ] = total
+        with transaction.atomic():
+            updated = self.update(**dict.fromkeys(RATING_HISTOGRAM_FIELDS, 0))
+            products = []
+            for product_id, histogram in histograms.items():
+                product = Product(pk=product_id)
+                for rate, total in histogram.items():
+                    setattr(product, rating_histogram_field(rate), total)
+                products.append(product)
+            Product.objects.bulk_update(
+                products, RATING_HISTOGRAM_FIELDS, batch_size=1_000
+            )
+        return updated
+
+    def update_effective_price(self, today=None) -> int:
+        """
+        Пересчитывает effective_price: цена действующей на дату today скидки,
+
+        а если скидки нет или она не действует - обычная цена товара.
+        Один UPDATE с коррелированным подзапросом к Sale
+        """
+        today = today or timezone.localdate()
+        active_sale = Sale.objects.filter(
+            product=OuterRef("pk"), date_from__lte=today, date_to__gte=today
+        ).values("sale_price")[:1]
+        return self.update(
+            effective_price=Coalesce(Subquery(active_sale), F("price"))
+        )
+
+
+class CategoryQuerySet(models.QuerySet):
+    """
+    QuerySet категорий с выборкой поддеревьев по материализованному пути
+    """
+
+    def subtree_of(self, path: str) -> "CategoryQuerySet":
+        """
+        Категория с путем path и все ее потомки
+
+        Условие записано диапазоном path >= prefix AND path < верхняя граница,
+        а не LIKE 'prefix%': диапазон использует обычный btree-индекс
+        на любой СУБД. В пути только цифры и "/", а следующий за "/"
+        символ - "0", поэтому верхняя граница - префикс с "0" вместо "/"
+        """
+        return self.filter(path__gte=path, path__lt=path[:-1] + "0")
+
+    def descendants_of(self, path: str) -> "CategoryQuerySet":
+        """
+        Только потомки категории с путем path, без нее самой
+        """
+        return self.subtree_of(path).exclude(path=path)
+
+    def rebuild_paths(self) -> int:
+        """
+        Пересчитывает материализованные пути всех категорий по parent_id
+
+        Нужен после загрузки категорий в обход Category.save (loaddata,
+        bulk_create). Цикл в данных обрывается: категория становится корневой.
+        Вернет кол-во категорий, путь которых изменился
+        """
+        rows = {
+            pk: (parent_id, path)
+            for pk, parent_id, path in self.model.objects.values_list(
+                "pk", "parent_id", "path"
+            )
+        }
+        paths = {}
+
+        def build(pk, seen=()):
+            if pk not in paths:
+                parent_id = rows[pk][0]
+                if parent_id is None or parent_id in seen or parent_id not in rows:
+                    prefix = ""
+                else:
+                    prefix = build(parent_id, seen + (pk,))
+                paths[pk] = prefix + category_path_segment(pk)
+            return paths[pk]
+
+        changed = [
+            self.model(pk=pk, path=build(pk))
+            for pk, (_, path) in rows.items()
+            if build(pk) != path
+        ]
+        self.model.objects.bulk_update(changed, ["path"], batch_size=500)
+        return len(changed)
 
 
 class Product(models.Model):
@@ -14,6 +214,15 @@ class Product(models.Model):
         verbose_name="Связь один ко многим с категориями",
     )
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        verbose_name="актуальная цена с учетом скидки",
+        help_text="Обновляется автоматически при изменении цены и скидок,"
+        " а также ежедневно на границах дат действия скидок.",
+    )
     count = models.PositiveIntegerField(default=0)
     date = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True, null=True)
@@ -51,18 +260,127 @@ class Product(models.Model):
         help_text="Если включено, товар попадает в блок banners на главной странице."
         " Он же считается рекламным, продающим.",
     )
+    reviews_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="количество отзывов",
+        help_text="Обновляется автоматически при добавлении, изменении"
+        " и удалении отзывов.",
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        verbose_name="сумма оценок отзывов",
+        help_text="Обновляется автоматически вместе с количеством отзывов.",
+    )
+    avg_rating = models.FloatField(
+        default=0,
+        verbose_name="средний рейтинг",
+        help_text="Обновляется автоматически вместе с количеством отзывов.",
+    )
+    # распределение оценок отзывов (гистограмма 1-5 звезд)
+    rating_1_count = models.PositiveIntegerField(
+        default=0, verbose_name="отзывов с оценкой 1", editable=False
+    )
+    rating_2_count = models.PositiveIntegerField(
+        default=0, verbose_name="отзывов с оценкой 2", editable=False
+    )
+    rating_3_count = models.PositiveIntegerField(
+        default=0, verbose_name="отзывов с оценкой 3", editable=False
+    )
+    rating_4_count = models.PositiveIntegerField(
+        default=0, verbose_name="отзывов с оценкой 4", editable=False
+    )
+    rating_5_count = models.PositiveIntegerField(
+        default=0, verbose_name="отзывов с оценкой 5", editable=False
+    )
+    popularity_score = models.FloatField(
+        default=0,
+        verbose_name="индекс популярности",
+        help_text="Пересчитывается периодической задачей по продажам"
+        " за последние дни, рейтингу и индексу сортировки.",
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        # Частичные индексы повторяют условия публичных запросов:
+        # план проверяется командой python manage.py check_query_plans
+        indexes = [
+            # каталог: категория + цена/сортировки среди не архивных товаров
+            models.Index(
+                fields=["category", "effective_price", "id"],
+                name="product_catalog_cat_price_idx",
+                condition=models.Q(archived=False),
+            ),
+            models.Index(
+                fields=["effective_price", "id"],
+                name="product_catalog_price_idx",
+                condition=models.Q(archived=False),
+            ),
+            models.Index(
+                fields=["date", "id"],
+                name="product_catalog_date_idx",
+                condition=models.Q(archived=False),
+            ),
+            models.Index(
+                fields=["reviews_count", "id"],
+                name="product_catalog_reviews_idx",
+                condition=models.Q(archived=False),
+            ),
+            models.Index(
+                fields=["avg_rating", "id"],
+                name="product_catalog_rating_idx",
+                condition=models.Q(archived=False),
+            ),
+            models.Index(
+                fields=["popularity_score", "id"],
+                name="product_catalog_popular_idx",
+                condition=models.Q(archived=False),
+            ),
+            # лимитированные товары в наличии, новые сверху
+            models.Index(
+                fields=["-date"],
+                name="product_limited_date_idx",
+                condition=models.Q(is_limited=True, archived=False, count__gt=0),
+            ),
+            # популярные товары
+            models.Index(
+                fields=["sort_index", "-purchases_count"],
+                name="product_popular_idx",
+                condition=models.Q(
+                    archived=False, is_limited=False, is_banner=False
+                ),
+            ),
+            # баннеры на главной, новые сверху
+            models.Index(
+                fields=["-date"],
+                name="product_banner_date_idx",
+                condition=models.Q(is_limited=False, is_banner=True),
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
 
+# ширина номера категории в материализованном пути: при одинаковой ширине
+# строковый порядок путей совпадает с порядком id внутри каждого уровня
+CATEGORY_PATH_WIDTH = 8
+
+
+def category_path_segment(pk: int) -> str:
+    return f"{pk:0{CATEGORY_PATH_WIDTH}d}/"
+
+
 class Category(models.Model):
     """
     Модель Category представляет категории товара
+
+    Дерево категорий хранится материализованным путем: path - id всех
+    предков и самой категории, например "00000001/00000005/". Поддерево
+    выбирается одним запросом по диапазону индексированной колонки path,
+    глубина дерева не ограничена
     """
 
     title = models.CharField(max_length=100)
@@ -80,10 +398,79 @@ class Category(models.Model):
         help_text="Если True, категория отображается на сайте."
         " Если False — архивируется и не показывается.",
     )
+    path = models.CharField(
+        max_length=500,
+        editable=False,
+        db_index=True,
+        default="",
+        verbose_name="материализованный путь",
+        help_text="Заполняется автоматически при сохранении категории.",
+    )
+
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    @property
+    def depth(self) -> int:
+        """
+        Уровень вложенности категории, у корневых - 0
+        """
+        return self.path.count("/") - 1
+
+    def clean(self):
+        # нельзя перенести категорию внутрь ее собственного поддерева
+        if self.path and self.parent_id:
+            parent_path = (
+                Category.objects.filter(pk=self.parent_id)
+                .values_list("path", flat=True)
+                .first()
+            )
+            if parent_path and parent_path.startswith(self.path):
+                raise ValidationError(
+                    {"parent": "Категория не может быть вложена сама в себя."}
+                )
+
+    def build_path(self) -> str:
+        parent_path = ""
+        if self.parent_id:
+            parent_path = (
+                Category.objects.filter(pk=self.parent_id)
+                .values_list("path", flat=True)
+                .get()
+            )
+        return parent_path + category_path_segment(self.pk)
+
+    def save(self, *args, **kwargs):
+        """
+        Сохраняет категорию и пересчитывает материализованный путь
+
+        При переносе категории к другому родителю пути всех ее потомков
+        обновляются одним UPDATE заменой префикса. Все выполняется в одной
+        транзакции: обработчики on_commit (сброс кеша дерева) увидят
+        уже пересчитанные пути
+        """
+        with transaction.atomic():
+            old_path = self.path
+            super().save(*args, **kwargs)
+            new_path = self.build_path()
+            if new_path == old_path:
+                return
+            Category.objects.filter(pk=self.pk).update(path=new_path)
+            self.path = new_path
+            if old_path:
+                Category.objects.descendants_of(old_path).update(
+                    path=Concat(Value(new_path), Substr("path", len(old_path) + 1))
+                )
+
+    def descendants(self, include_self=False) -> "CategoryQuerySet":
+        """
+        Все потомки категории любой глубины (поддерево одним запросом)
+        """
+        subtree = Category.objects.subtree_of(self.path)
+        return subtree if include_self else subtree.exclude(pk=self.pk)
+
 
 class Specification(models.Model):
     """
@@ -132,6 +519,12 @@ class Review(models.Model):
     class Meta:
         verbose_name = "Review"
         verbose_name_plural = "Reviews"
+        indexes = [
+            # отзывы товара постранично, новые сверху (курсор по дате и id)
+            models.Index(
+                fields=["product", "-date", "-id"], name="review_product_date_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Review by {self.author} for {self.product.title}"
@@ -200,6 +593,84 @@ class Sale(models.Model):
     class Meta:
         verbose_name = "Sale"
         verbose_name_plural = "Sales"
+        indexes = [
+            # действующие скидки: date_from <= сегодня <= date_to
+            models.Index(
+                fields=["date_from", "date_to"], name="sale_active_dates_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Sale for {self.product.title}"
+
+
+class ProductRanking(models.Model):
+    """
+    Рейтинг популярных товаров, рассчитанный заранее
+
+    Топ товаров по popularity_score: общий (category=None) и по каждой
+    категории. Полностью перестраивается периодической задачей
+    products.tasks.refresh_popularity_ranking
+    """
+
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="rankings",
+        verbose_name="категория (пусто - общий рейтинг)",
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="rankings",
+        verbose_name="товар",
+    )
+    position = models.PositiveIntegerField(verbose_name="место в рейтинге")
+    score = models.FloatField(verbose_name="индекс популярности")
+
+    class Meta:
+        verbose_name = "Product ranking"
+        verbose_name_plural = "Product rankings"
+        indexes = [
+            models.Index(
+                fields=["category", "position"], name="product_ranking_pos_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.position}. {self.product_id}"
+
+
+class CategoryTag(models.Model):
+    """
+    Индекс "категория - тег" для списка тегов каталога
+
+    product_count - кол-во не архивных товаров категории с этим тегом.
+    Поддерживается сигналами (products/signals.py) при изменении тегов,
+    категории и архивации товаров; полный пересчет -
+    python manage.py rebuild_category_tags
+    """
+
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name="tag_counts"
+    )
+    tag = models.ForeignKey(
+        Tag, on_delete=models.CASCADE, related_name="category_counts"
+    )
+    product_count = models.PositiveIntegerField(
+        default=0, verbose_name="кол-во товаров категории с тегом"
+    )
+
+    class Meta:
+        verbose_name = "Category tag"
+        verbose_name_plural = "Category tags"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "tag"], name="unique_category_tag"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id} / {self.tag_id}: {self.product_count}"
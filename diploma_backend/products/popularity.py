@@ -0,0 +1,139 @@
+"""
+Рейтинг популярных товаров
+
+Индекс популярности товара:
+    sales * кол-во проданных за CATALOG_POPULARITY_WINDOW_DAYS дней
+    + rating * средний рейтинг
+    - sort_index * индекс сортировки (чем он меньше, тем выше товар)
+Веса задаются настройкой CATALOG_POPULARITY_WEIGHTS. Индекс и топ
+товаров (общий и по категориям) пересчитывает периодическая задача
+products.tasks.refresh_popularity_ranking, эндпоинты читают готовый рейтинг.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (ExpressionWrapper, F, FloatField, OuterRef, Q,
+                              QuerySet, Subquery, Sum, Value, Window)
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+
+from orders.models import OrderProduct
+
+from .models import Product, ProductRanking
+
+DEFAULT_POPULARITY_WEIGHTS = {"sales": 1.0, "rating": 5.0, "sort_index": 0.1}
+
+# товары, которые могут попасть в блок популярных на главной
+POPULAR_PRODUCTS = Q(archived=False, is_limited=False, is_banner=False)
+
+
+def popularity_weights() -> dict:
+    return {
+        **DEFAULT_POPULARITY_WEIGHTS,
+        **getattr(settings, "CATALOG_POPULARITY_WEIGHTS", {}),
+    }
+
+
+def popularity_top_n() -> int:
+    return getattr(settings, "CATALOG_POPULARITY_TOP_N", 50)
+
+
+def update_popularity_scores() -> int:
+    """
+    Пересчитывает popularity_score всех товаров одним UPDATE
+
+    Продажи - сумма кол-ва товара в подтвержденных (не pending) заказах
+    за последние CATALOG_POPULARITY_WINDOW_DAYS дней
+    """
+    weights = popularity_weights()
+    since = timezone.now() - timedelta(
+        days=getattr(settings, "CATALOG_POPULARITY_WINDOW_DAYS", 30)
+    )
+    sold = (
+        OrderProduct.objects.filter(product=OuterRef("pk"), order__created_at__gte=since)
+        .exclude(order__status="pending")
+        .order_by()
+        .values("product")
+        .annotate(total=Sum("count"))
+        .values("total")
+    )
+    score = (
+        Coalesce(Subquery(sold), 0) * Value(weights["sales"])
+        + F("avg_rating") * Value(weights["rating"])
+        - F("sort_index") * Value(weights["sort_index"])
+    )
+    return Product.objects.update(
+        popularity_score=ExpressionWrapper(score, output_field=FloatField())
+    )
+
+
+def rebuild_ranking(top_n: int | None = None) -> int:
+    """
+    Перестраивает таблицу ProductRanking по текущему popularity_score
+
+    Общий топ и топ каждой категории (один запрос с ROW_NUMBER по категориям).
+    Таблица заменяется целиком в одной транзакции. Вернет кол-во строк рейтинга
+    """
+    top_n = top_n or popularity_top_n()
+    candidates = Product.objects.filter(POPULAR_PRODUCTS)
+    order = [F("popularity_score").desc(), F("pk").asc()]
+
+    rows = [
+        ProductRanking(product_id=pk, score=score, position=position)
+        for position, (pk, score) in enumerate(
+            candidates.order_by(*order).values_list("pk", "popularity_score")[:top_n],
+            start=1,
+        )
+    ]
+    by_category = (
+        candidates.annotate(
+            position=Window(RowNumber(), partition_by=F("category_id"), order_by=order)
+        )
+        .filter(position__lte=top_n)
+        .values_list("pk", "category_id", "popularity_score", "position")
+    )
+    rows.extend(
+        ProductRanking(
+            product_id=pk, category_id=category_id, score=score, position=position
+        )
+        for pk, category_id, score, position in by_category
+    )
+
+    with transaction.atomic():
+        ProductRanking.objects.all().delete()
+        ProductRanking.objects.bulk_create(rows, batch_size=1_000)
+    return len(rows)
+
+
+def fallback_popular_products() -> QuerySet:
+    """
+    Популярные товары без рассчитанного рейтинга (задача еще не выполнялась)
+    """
+    return Product.objects.filter(POPULAR_PRODUCTS).order_by(
+        "sort_index", "-purchases_count"
+    )
+
+
+def popular_product_ids(limit: int, category=None) -> list[int]:
+    """
+    Вернет id популярных товаров из готового рейтинга
+
+    category=None - общий рейтинг. Один запрос по индексу рейтинга;
+    пока рейтинг ни разу не рассчитывался, используется сортировка
+    по sort_index и кол-ву покупок
+    """
+    ids = list(
+        ProductRanking.objects.filter(
+            category=category, product__archived=False
+        )
+        .order_by("position")
+        .values_list("product_id", flat=True)[:limit]
+    )
+    if not ids and not ProductRanking.objects.exists():
+        products = fallback_popular_products()
+        if category is not None:
+            products = products.filter(category=category)
+        ids = list(products.values_list("pk", flat=True)[:limit])
+    return ids
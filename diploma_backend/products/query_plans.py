@@ -0,0 +1,145 @@
+"""
+Проверка планов запросов публичных эндпоинтов (EXPLAIN)
+
+Регрессией считается полный просмотр большой таблицы: и самой таблицы,
+и всего ее индекса. Просмотр индекса без условия допустим только в запросе
+с LIMIT, если индекс сам дает нужный порядок строк: тогда чтение
+останавливается на первых LIMIT подходящих строках.
+Проверку выполняют тесты (products/tests.py, QueryPlansTestCase)
+и команда check_query_plans на синтетических данных нужного размера.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import QuerySet
+from django.http import QueryDict
+from django.utils import timezone
+
+from .catalog import (catalog_filters, catalog_ordering, count_queryset,
+                      filter_products)
+from .models import Category, Product, ProductRanking, Review, Sale
+from .serializers import REVIEWS_ORDERING
+from .views import SALES_ORDERING, ProductsBannersListView, ProductsLimitedListView
+
+# большие таблицы, полный просмотр которых считается регрессией
+CHECKED_TABLES = {"products_product", "products_review", "products_sale"}
+
+# SQLite: "SCAN t" - просмотр таблицы, "SCAN t USING [COVERING] INDEX i" -
+# просмотр всего индекса (с условием по индексу план пишет SEARCH)
+SQLITE_SCAN = re.compile(r"\bSCAN (\w+)(?P<index> USING (?:COVERING )?INDEX \w+)?")
+# сортировка всех отобранных строк: индекс порядок не дает
+SQLITE_SORT = "USE TEMP B-TREE FOR"
+# PostgreSQL: Seq Scan - просмотр таблицы, Index Scan без Index Cond -
+# просмотр всего индекса
+POSTGRESQL_SCAN = re.compile(
+    r"(?P<kind>Seq Scan|Index Scan|Index Only Scan)(?: Backward)?"
+    r"(?: using \w+)? on (\w+)"
+)
+
+
+def full_scans(queryset: QuerySet) -> tuple[set, str]:
+    """
+    Вернет (большие таблицы, прочитанные целиком, план запроса qs)
+    """
+    plan = queryset.explain()
+    limited = queryset.query.high_mark is not None
+    if connection.vendor == "sqlite":
+        scans = _sqlite_full_scans(plan, limited)
+    elif connection.vendor == "postgresql":
+        scans = _postgresql_full_scans(plan, limited)
+    else:
+        raise NotImplementedError(f"СУБД {connection.vendor} не поддерживается")
+    return scans & CHECKED_TABLES, plan
+
+
+def _sqlite_full_scans(plan: str, limited: bool) -> set:
+    ordered = SQLITE_SORT not in plan
+    scans = set()
+    for line in plan.splitlines():
+        match = SQLITE_SCAN.search(line)
+        if match and not (match.group("index") and limited and ordered):
+            scans.add(match.group(1))
+    return scans
+
+
+def _postgresql_full_scans(plan: str, limited: bool) -> set:
+    lines = plan.splitlines()
+    scans = set()
+    for number, line in enumerate(lines):
+        match = POSTGRESQL_SCAN.search(line)
+        if match is None:
+            continue
+        if match.group("kind") == "Seq Scan":
+            scans.add(match.group(2))
+            continue
+        # условия узла - строки до следующего узла плана ("->")
+        details = []
+        for detail in lines[number + 1 :]:
+            if "->" in detail:
+                break
+            details.append(detail)
+        if not limited and not any("Index Cond" in detail for detail in details):
+            scans.add(match.group(2))
+    return scans
+
+
+def catalog_query(query_string: str) -> QuerySet:
+    """
+    Запрос страницы каталога так, как его строит product_catalog
+    """
+    params = QueryDict(query_string)
+    products = filter_products(
+        Product.objects.filter(archived=False), catalog_filters(params)
+    )
+    ordering = catalog_ordering(params.get("sort"), params.get("sortType"))
+    return products.order_by(*ordering)[:20].values_list("pk", flat=True)
+
+
+def catalog_count_query(query_string: str) -> QuerySet:
+    """
+    Запрос кол-ва товаров каталога (catalog_count) для фильтров из строки
+    """
+    return count_queryset(catalog_filters(QueryDict(query_string)))
+
+
+def endpoint_queries(category: Category) -> dict:
+    """
+    Запросы публичных эндпоинтов, план которых проверяется
+
+    Кол-во товаров каталога без фильтров здесь нет: для большого каталога
+    оно берется из статистики планировщика (catalog_count), а не COUNT(*)
+    """
+    product = Product.objects.order_by("pk").first()
+    today = timezone.localdate()
+    return {
+        "products_limited": ProductsLimitedListView.queryset,
+        "products_popular": ProductRanking.objects.filter(
+            category=None, product__archived=False
+        ).order_by("position")[:8],
+        "products_banners": ProductsBannersListView.queryset,
+        "product_detail": Product.objects.filter(archived=False, pk=product.pk),
+        "catalog_default": catalog_query(""),
+        "catalog_price_inc": catalog_query("sort=price&sortType=inc"),
+        "catalog_price_dec": catalog_query("sort=price&sortType=dec"),
+        "catalog_date_dec": catalog_query("sort=date&sortType=dec"),
+        "catalog_reviews_dec": catalog_query("sort=reviews&sortType=dec"),
+        "catalog_rating_dec": catalog_query("sort=rating&sortType=dec"),
+        "catalog_popularity_dec": catalog_query("sort=popularity&sortType=dec"),
+        "catalog_category_price": catalog_query(
+            f"category={category.pk}&sort=price&sortType=inc"
+        ),
+        "catalog_price_range": catalog_query(
+            "filter[minPrice]=1000&filter[maxPrice]=2000&sort=price&sortType=inc"
+        ),
+        "catalog_count_category": catalog_count_query(f"category={category.pk}"),
+        "catalog_count_price_range": catalog_count_query(
+            "filter[minPrice]=1000&filter[maxPrice]=2000"
+        ),
+        "product_reviews": Review.objects.filter(product_id=product.pk).order_by(
+            *REVIEWS_ORDERING
+        )[:10],
+        "sales_active": Sale.objects.filter(
+            date_from__lte=today, date_to__gte=today
+        ).order_by(*SALES_ORDERING)[:10],
+    }
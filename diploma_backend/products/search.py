@@ -0,0 +1,191 @@
+"""
+Полнотекстовый поиск товаров для фильтра каталога filter[name]
+
+На SQLite используется виртуальная таблица FTS5 с токенизатором trigram,
+на PostgreSQL - колонка search_vector (tsvector) с GIN индексом. Индекс
+покрывает название, описание и имена тегов товара и поддерживается
+сигналами (products/signals.py), после loaddata его перестраивает
+команда rebuild_search_index.
+Для остальных СУБД, а также при выключенной настройке
+CATALOG_FULL_TEXT_SEARCH используется прежний поиск title__icontains.
+
+Слово запроса на SQLite ищется как подстрока, как и в прежнем поиске
+("phone" находит "iPhone"). Слова короче 3 символов индекс trigram
+не находит, их ищем по title__icontains среди найденных по индексу товаров.
+На PostgreSQL слово ищется как префикс слова товара, а если по индексу
+ничего не нашлось - используется прежний поиск title__icontains.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+FTS_TABLE = "products_product_fts"
+
+# минимальная длина слова, которое находит токенизатор trigram
+TRIGRAM_MIN_LENGTH = 3
+
+# SQL, собирающий строку индекса товара: название, описание, имена тегов
+SQLITE_INDEX_ROWS_SQL = """
+    SELECT p.id, p.title, COALESCE(p.description, ''),
+        COALESCE((
+            SELECT group_concat(t.name, ' ')
+            FROM products_product_tags pt
+            JOIN products_tag t ON t.id = pt.tag_id
+            WHERE pt.product_id = p.id
+        ), '')
+    FROM products_product p
+"""
+
+POSTGRES_SEARCH_VECTOR_SQL = """
+    setweight(to_tsvector(%(config)s::regconfig, COALESCE(p.title, '')), 'A')
+    || setweight(to_tsvector(%(config)s::regconfig, COALESCE(p.description, '')), 'B')
+    || setweight(to_tsvector(%(config)s::regconfig, COALESCE((
+        SELECT string_agg(t.name, ' ')
+        FROM products_product_tags pt
+        JOIN products_tag t ON t.id = pt.tag_id
+        WHERE pt.product_id = p.id
+    ), '')), 'C')
+"""
+
+
+def search_enabled() -> bool:
+    """
+    Включен ли полнотекстовый поиск и поддерживает ли его текущая СУБД
+    """
+    return getattr(settings, "CATALOG_FULL_TEXT_SEARCH", False) and (
+        connection.vendor in ("sqlite", "postgresql")
+    )
+
+
+def search_config() -> str:
+    """
+    Конфигурация текстового поиска PostgreSQL (словарь стемминга)
+    """
+    return getattr(settings, "CATALOG_SEARCH_CONFIG", "simple")
+
+
+def _tokens(query: str) -> list[str]:
+    """
+    Разбивает поисковую строку на слова, отбрасывая служебные символы
+
+    Служебные символы синтаксиса MATCH/tsquery в запрос не попадают
+    """
+    return re.findall(r"\w+", query.lower())
+
+
+def index_products(product_ids=None) -> None:
+    """
+    Обновляет поисковый индекс для переданных товаров (None - для всех)
+    """
+    if not search_enabled():
+        return
+    ids = list(product_ids) if product_ids is not None else None
+    if ids == []:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            if ids is None:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+                where, params = "", []
+            else:
+                placeholders = ", ".join(["%s"] * len(ids))
+                cursor.execute(
+                    f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids
+                )
+                where, params = f" WHERE p.id IN ({placeholders})", ids
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags) "
+                f"{SQLITE_INDEX_ROWS_SQL}{where}",
+                params,
+            )
+        else:
+            sql = "UPDATE products_product p SET search_vector = " + (
+                POSTGRES_SEARCH_VECTOR_SQL
+            )
+            params = {"config": search_config()}
+            if ids is not None:
+                sql += " WHERE p.id = ANY(%(ids)s)"
+                params["ids"] = ids
+            cursor.execute(sql, params)
+
+
+def remove_products(product_ids) -> None:
+    """
+    Удаляет товары из поискового индекса
+
+    На PostgreSQL индекс хранится в строке товара и удаляется вместе с ней
+    """
+    ids = list(product_ids)
+    if not ids or not search_enabled() or connection.vendor != "sqlite":
+        return
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids)
+
+
+def search_products(queryset: QuerySet, query: str, ranked=True) -> QuerySet:
+    """
+    Фильтрует qs товаров по поисковой строке
+
+    Вернет qs с вычисляемым полем search_rank (чем больше, тем релевантнее),
+    ranked=False - без него (например, для подсчета кол-ва товаров).
+    Все слова запроса должны совпасть.
+    """
+    tokens = _tokens(query)
+    if not search_enabled() or not tokens:
+        return queryset.filter(title__icontains=query)
+
+    table = Product._meta.db_table
+    if connection.vendor == "sqlite":
+        indexed = [token for token in tokens if len(token) >= TRIGRAM_MIN_LENGTH]
+        if not indexed:
+            return queryset.filter(title__icontains=query)
+        short = Q()
+        for token in tokens:
+            if len(token) < TRIGRAM_MIN_LENGTH:
+                short &= Q(title__icontains=token)
+        # таблица индекса присоединяется к товарам один раз: MATCH и bm25
+        # вычисляются за один проход по индексу, а не подзапросом на каждый товар
+        match = " ".join(f'"{token}"' for token in indexed)
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+        ).filter(short)
+        if not ranked:
+            return queryset
+        return queryset.annotate(
+            # bm25 возвращает отрицательные значения: чем меньше, тем релевантнее.
+            # Веса колонок: название, описание, теги
+            search_rank=RawSQL(
+                f"-bm25({FTS_TABLE}, 10.0, 1.0, 5.0)", [], output_field=FloatField()
+            )
+        )
+
+    tsquery = " & ".join(f"{token}:*" for token in tokens)
+    config = search_config()
+    found = queryset.filter(
+        pk__in=RawSQL(
+            f"SELECT id FROM {table} "
+            f"WHERE search_vector @@ to_tsquery(%s::regconfig, %s)",
+            [config, tsquery],
+        )
+    )
+    if not found.exists():
+        # слово запроса - часть слова товара ("phone" в "iPhone")
+        return queryset.filter(title__icontains=query)
+    if not ranked:
+        return found
+    return found.annotate(
+        search_rank=RawSQL(
+            f"ts_rank({table}.search_vector, to_tsquery(%s::regconfig, %s))",
+            [config, tsquery],
+            output_field=FloatField(),
+        )
+    )
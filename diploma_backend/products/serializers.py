@@ -1,6 +1,10 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers  # Импортируем модуль сериализаторов DRF
 
-from .models import Category, Product, Review, Sale
+from .catalog import encode_cursor
+from .models import (REVIEW_RATES, Category, Product, Review, Sale,
+                     rating_histogram_field)
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -38,11 +42,9 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_price(self, obj: Product):
         """
-        Метод вернет цену(price) с учетом скидки, если она есть
+        Метод вернет цену(price) с учетом действующей скидки, если она есть
         """
-        if hasattr(obj, "sale") and obj.sale:
-            return obj.sale.sale_price
-        return obj.price
+        return obj.effective_price
 
     def get_images(self, odj: Product) -> list[dict]:
         """
@@ -60,7 +62,7 @@ class ProductSerializer(serializers.ModelSerializer):
         """
         Метод вернет категорию товара int
         """
-        return obj.category.id
+        return obj.category_id
 
     def get_tags(self, obj: Product):
         """
@@ -89,18 +91,80 @@ class ProductSerializer(serializers.ModelSerializer):
         return obj.avg_rating or 0
 
 
+def detail_reviews_limit() -> int:
+    """
+    Сколько последних отзывов встраивается в страницу товара
+    """
+    return getattr(settings, "PRODUCT_DETAIL_REVIEWS", 20)
+
+
+def newest_reviews(obj: Product) -> list:
+    """
+    detail_reviews_limit() последних отзывов товара
+
+    Берутся из prefetch представления (to_attr newest_reviews),
+    без него - отдельным запросом
+    """
+    reviews = getattr(obj, "newest_reviews", None)
+    if reviews is None:
+        reviews = obj.newest_reviews = list(
+            obj.reviews.order_by("-date", "-pk")[: detail_reviews_limit()]
+        )
+    return reviews
+
+
+def rating_histogram(obj) -> dict:
+    """
+    Кол-во отзывов по оценкам {"1": n, ..., "5": n} из колонок товара obj
+    """
+    return {
+        str(rate): getattr(obj, rating_histogram_field(rate)) for rate in REVIEW_RATES
+    }
+
+
+# порядок отзывов: в странице товара и в GET /product/{id}/reviews (курсор)
+REVIEWS_ORDERING = ["-date", "-pk"]
+
+
+def reviews_page_size() -> int:
+    """
+    Сколько отзывов отдает GET /product/{id}/reviews, если limit не передан
+    """
+    return getattr(settings, "PRODUCT_REVIEWS_PAGE_SIZE", 10)
+
+
+def reviews_next_url(product_id: int, last_review, shown: int, total: int):
+    """
+    Ссылка на следующую страницу отзывов после shown уже показанных
+
+    last_review - (дата, id) последнего показанного отзыва.
+    Вернет None, если показаны все отзывы товара
+    """
+    if not shown or shown >= total:
+        return None
+    cursor = encode_cursor(last_review[0], last_review[1], 1, REVIEWS_ORDERING[0])
+    return f"{reverse('product_reviews', args=[product_id])}?cursor={cursor}"
+
+
 class ProductDetailSerializer(ProductSerializer):
     """
     Служит для обработки запроса конкретного продукта
 
     GET /product{id}
-    Наследует поля от ProductSerializer
+    Наследует поля от ProductSerializer.
+    В reviews попадают только detail_reviews_limit() последних отзывов
+    (newest_reviews: из prefetch представления), всего отзывов - reviewsCount,
+    продолжение списка - по ссылке reviewsNext (GET /product/{id}/reviews),
+    распределение оценок - ratingHistogram
     """
 
     fullDescription = serializers.CharField(source="full_description")
     tags = serializers.SerializerMethodField()
     reviews = serializers.SerializerMethodField()
     specifications = serializers.SerializerMethodField()
+    reviewsCount = serializers.IntegerField(source="reviews_count")
+    reviewsNext = serializers.SerializerMethodField()
+    ratingHistogram = serializers.SerializerMethodField()
 
     class Meta(ProductSerializer.Meta):
         fields = ProductSerializer.Meta.fields + [
@@ -108,6 +172,9 @@ class ProductDetailSerializer(ProductSerializer):
             "tags",
             "reviews",
             "specifications",
+            "reviewsCount",
+            "reviewsNext",
+            "ratingHistogram",
         ]
 
     def get_tags(self, obj: Product):
@@ -127,7 +194,7 @@ class ProductDetailSerializer(ProductSerializer):
 
     def get_reviews(self, obj: Product):
         """
-        метод вернет отзывы в формате [{"author": "Annoying Orange",},...]
+        метод вернет последние отзывы в формате [{"author": "Annoying Orange",},...]
         """
         return [
             {
@@ -137,23 +204,41 @@ class ProductDetailSerializer(ProductSerializer):
                 "rate": review.rate,
                 "date": review.date,
             }
-            for review in obj.reviews.all()
+            for review in newest_reviews(obj)
         ]
 
+    def get_ratingHistogram(self, obj: Product):
+        """
+        метод вернет кол-во отзывов по оценкам {"1": 0, ..., "5": 12}
+        """
+        return rating_histogram(obj)
+
+    def get_reviewsNext(self, obj: Product):
+        """
+        метод вернет ссылку на отзывы, не попавшие в страницу товара
+        """
+        reviews = newest_reviews(obj)
+        if len(reviews) < detail_reviews_limit():
+            return None
+        last = reviews[len(reviews) - 1]
+        return reviews_next_url(
+            obj.pk, (last.date, last.pk), len(reviews), obj.reviews_count
+        )
+
 
 class CategorySerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели Category.
 
-    Преобразует объекты Category <-> JSON.
+    Преобразует объекты Category <-> JSON. Подкатегории сюда не входят:
+    дерево собирается из плоского списка в products/categories.py
     """
 
     image = serializers.SerializerMethodField()
-    subcategories = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ["id", "title", "image", "subcategories"]
+        fields = ["id", "title", "image"]
 
     def get_image(self, odj: Category) -> dict:
         """
@@ -166,19 +251,6 @@ class CategorySerializer(serializers.ModelSerializer):
             }
         return None
 
-    def get_subcategories(self, obj: Category):
-        """
-        Возвращает список подкатегорий рекурсивно
-        """
-        level = self.context.get("level", 1)  # получаем уровень вложенности категории
-        if level >= 2:  # Если уровень больше двух, возвращаем пустой список
-            return []
-        sub = obj.subcategories.all()  # обращаемся ко всем активным подкатегориям
-        # рекурсивно вызываем CategorySerializer и передаем в контекст уровень вложенности
-        return (
-            CategorySerializer(sub, many=True, context={"level": level + 1}).data or []
-        )
-
 
 class ReviewSerializer(serializers.ModelSerializer):
     """
@@ -215,16 +287,13 @@ class SalesSerializer(serializers.ModelSerializer):
         """
         Метод вернет id товара сос кидкой
         """
-        if obj.product:
-            return str(obj.product.pk)
+        return str(obj.product_id)
 
     def get_price(self, obj: Sale):
         """
         Метод вернет цену(price) без учета скидки
         """
-        if hasattr(obj, "product") and obj.product:
-            return float(obj.product.price)
-        return None
+        return float(obj.product.price)
 
     def get_dateFrom(self, obj: Sale):
         # приводим дату к требуемому сваггер виду
@@ -238,12 +307,11 @@ class SalesSerializer(serializers.ModelSerializer):
         """
         Метод вернет список изображений в формате [{"src": url, "alt": name}]
         """
-        if obj.product and obj.product.images.exists():
-            return [
-                {
-                    "src": img.src.url,
-                    "alt": img.alt or "",
-                }
-                for img in obj.product.images.all()
-            ]
-        return []
+        # картинки загружены prefetch_related, отдельный exists() не нужен
+        return [
+            {
+                "src": img.src.url,
+                "alt": img.alt or "",
+            }
+            for img in obj.product.images.all()
+        ]
@@ -0,0 +1,359 @@
+"""
+Сигналы приложения products
+
+Поддерживают в актуальном состоянии производные данные каталога
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import search
+from .cache import bump_catalog_version, touch_products
+from .categories import invalidate_category_tree
+from .engine import loaded_catalog_engine
+from .models import Category, Image, Product, Review, Sale, Specification, Tag
+from .tag_index import adjust_category_tags, product_tag_changes
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, **kwargs):
+    """
+    Любое изменение данных каталога сбрасывает закешированные ответы каталога
+
+    Сброс откладывается до коммита: запрос, прочитавший старые строки
+    до коммита, иначе сохранил бы их в кеш уже под новой версией
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def products_changed(product_ids) -> None:
+    """
+    Отмечает изменение товаров для условных GET-запросов и точечно
+    обновляет снимок колоночного движка каталога, если он загружен
+
+    Оба действия откладываются до коммита транзакции: к этому моменту
+    счетчики отзывов и цена со скидкой уже пересчитаны, и новый ETag
+    не достанется ответу со старыми данными
+    """
+    product_ids = [pk for pk in product_ids if pk is not None]
+    if not product_ids:
+        return
+    transaction.on_commit(lambda: touch_products(product_ids))
+    engine = loaded_catalog_engine()
+    if engine is not None:
+        transaction.on_commit(lambda: engine.refresh_products(product_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    """
+    Изменение категории сбрасывает закешированное дерево категорий
+
+    Сброс откладывается до коммита: Category.save пересчитывает
+    материализованные пути уже после отправки post_save
+    """
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_changed(sender, instance: Image, **kwargs):
+    """
+    Сбрасывает дерево категорий, если картинка может в нем отображаться
+
+    Картинки товаров в дерево не попадают. При удалении ссылки категорий
+    на картинку уже обнулены, поэтому удаление сбрасывает дерево всегда
+    """
+    deleted = "created" not in kwargs
+    if (
+        deleted
+        or instance.product_id is None
+        or Category.objects.filter(image=instance).exists()
+    ):
+        transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Specification)
+@receiver(post_delete, sender=Specification)
+def product_part_changed(sender, instance, **kwargs):
+    """
+    Картинки и характеристики входят в карточку товара
+    """
+    products_changed([instance.product_id])
+
+
+@receiver(pre_save, sender=Review)
+def review_pre_save(sender, instance: Review, raw=False, **kwargs):
+    """
+    Запоминает товар и оценку отзыва до сохранения
+    """
+    instance._rating_state = (
+        Review.objects.filter(pk=instance.pk).values_list("product_id", "rate").first()
+        if instance.pk and not raw
+        else None
+    )
+
+
+@receiver(post_save, sender=Review)
+def review_rate_saved(sender, instance: Review, created, raw=False, **kwargs):
+    """
+    Сдвигает счетчики отзывов и гистограмму оценок товара
+
+    Загрузка фикстур (raw) счетчики не трогает: после нее нужна
+    команда rebuild_product_ratings
+    """
+    if raw:
+        return
+    if created:
+        Product.objects.filter(pk=instance.product_id).add_review_rate(instance.rate)
+        return
+    old_state = getattr(instance, "_rating_state", None)
+    if old_state is None:
+        return
+    old_product, old_rate = old_state
+    if old_product == instance.product_id:
+        Product.objects.filter(pk=instance.product_id).change_review_rate(
+            old_rate, instance.rate
+        )
+    else:
+        Product.objects.filter(pk=old_product).remove_review_rate(old_rate)
+        Product.objects.filter(pk=instance.product_id).add_review_rate(instance.rate)
+        products_changed([old_product])
+
+
+@receiver(post_delete, sender=Review)
+def review_rate_deleted(sender, instance: Review, **kwargs):
+    """
+    Убирает удаленный отзыв из счетчиков и гистограммы оценок товара
+    """
+    Product.objects.filter(pk=instance.product_id).remove_review_rate(instance.rate)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def review_changed(sender, instance: Review, **kwargs):
+    """
+    Отзыв меняет кол-во отзывов и рейтинг товара в снимке движка каталога
+    """
+    products_changed([instance.product_id])
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance: Product, raw=False, **kwargs):
+    """
+    Переиндексирует товар для полнотекстового поиска после сохранения
+
+    и пересчитывает его цену с учетом скидки (цена могла измениться).
+    Загрузка фикстур (raw) индекс и цены не трогает: после нее нужны
+    команды rebuild_search_index и rebuild_effective_prices
+    """
+    if raw:
+        return
+    search.index_products([instance.pk])
+    Product.objects.filter(pk=instance.pk).update_effective_price()
+    products_changed([instance.pk])
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def sale_changed(sender, instance: Sale, **kwargs):
+    """
+    Создание, изменение и удаление скидки пересчитывают цену товара со скидкой
+    """
+    Product.objects.filter(pk=instance.product_id).update_effective_price()
+    products_changed([instance.product_id])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance: Product, **kwargs):
+    """
+    Удаляет товар из поискового индекса и снимка движка каталога
+    """
+    search.remove_products([instance.pk])
+    products_changed([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Переиндексирует товары при изменении связей товар - тег
+    """
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear"):
+        return
+    if action != "pre_clear":
+        transaction.on_commit(bump_catalog_version)
+    if not reverse:
+        # изменились теги одного товара
+        if action != "pre_clear":
+            search.index_products([instance.pk])
+            products_changed([instance.pk])
+        return
+    # изменились товары одного тега: при clear pk_set не передается,
+    # поэтому список товаров запоминаем до очистки
+    if action == "pre_clear":
+        instance._cleared_product_ids = list(
+            instance.products.values_list("pk", flat=True)
+        )
+        return
+    if action == "post_clear":
+        pk_set = getattr(instance, "_cleared_product_ids", [])
+    search.index_products(pk_set or [])
+    products_changed(pk_set or [])
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance: Tag, created, **kwargs):
+    """
+    При переименовании тега переиндексирует все его товары
+
+    (название тега есть в карточке товара)
+    """
+    if not created:
+        product_ids = list(instance.products.values_list("pk", flat=True))
+        search.index_products(product_ids)
+        products_changed(product_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_pre_delete(sender, instance: Tag, **kwargs):
+    """
+    Запоминает товары удаляемого тега: связи удалятся каскадно без m2m_changed
+    """
+    instance._deleted_product_ids = list(instance.products.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance: Tag, **kwargs):
+    """
+    Переиндексирует товары, у которых был удаленный тег
+    """
+    product_ids = getattr(instance, "_deleted_product_ids", [])
+    search.index_products(product_ids)
+    products_changed(product_ids)
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def category_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Изменяет индекс категория - тег при изменении связей товар - тег
+
+    Учитываются только не архивные товары. Перед remove и clear запоминаем
+    связи, которые действительно существуют: в pk_set у remove
+    могут быть и не связанные объекты
+    """
+    if action in ("pre_remove", "pre_clear"):
+        if reverse:
+            # instance - тег: запоминаем категории его не архивных товаров
+            products = instance.products.filter(archived=False)
+            if action == "pre_remove":
+                products = products.filter(pk__in=pk_set)
+            instance._category_tag_links = list(
+                products.values_list("category_id", flat=True)
+            )
+        else:
+            tags = instance.tags.all()
+            if action == "pre_remove":
+                tags = tags.filter(pk__in=pk_set)
+            instance._category_tag_links = list(tags.values_list("pk", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    delta = 1 if action == "post_add" else -1
+    if not reverse:
+        # изменились теги одного товара
+        if instance.archived:
+            return
+        tag_ids = pk_set if action == "post_add" else instance._category_tag_links
+        adjust_category_tags(product_tag_changes(instance.category_id, tag_ids, delta))
+        return
+    # изменились товары одного тега
+    if action == "post_add":
+        categories = Product.objects.filter(
+            pk__in=pk_set, archived=False
+        ).values_list("category_id", flat=True)
+    else:
+        categories = instance._category_tag_links
+    changes = Counter()
+    for category_id in categories:
+        changes[(category_id, instance.pk)] += delta
+    adjust_category_tags(changes)
+
+
+@receiver(pre_save, sender=Product)
+def product_pre_save(sender, instance: Product, raw=False, **kwargs):
+    """
+    Запоминает категорию и архивность товара до сохранения
+    """
+    instance._category_tag_state = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "archived")
+        .first()
+        if instance.pk and not raw
+        else None
+    )
+
+
+@receiver(post_save, sender=Product)
+def product_category_tags(sender, instance: Product, raw=False, **kwargs):
+    """
+    Переносит теги товара в индексе при смене категории или архивации
+
+    Загрузка фикстур (raw) индекс не трогает: после нее нужна
+    команда rebuild_category_tags
+    """
+    if raw:
+        return
+    old_state = getattr(instance, "_category_tag_state", None)
+    if old_state is None or old_state == (instance.category_id, instance.archived):
+        return
+    tag_ids = list(instance.tags.values_list("pk", flat=True))
+    old_category, old_archived = old_state
+    changes = Counter()
+    if not old_archived:
+        changes.update(product_tag_changes(old_category, tag_ids, -1))
+    if not instance.archived:
+        changes.update(product_tag_changes(instance.category_id, tag_ids, 1))
+    adjust_category_tags(changes)
+
+
+@receiver(pre_delete, sender=Product)
+def product_pre_delete(sender, instance: Product, **kwargs):
+    """
+    Запоминает теги удаляемого товара: связи удалятся каскадно без m2m_changed
+    """
+    instance._deleted_tag_ids = (
+        [] if instance.archived else list(instance.tags.values_list("pk", flat=True))
+    )
+
+
+@receiver(post_delete, sender=Product)
+def product_category_tags_deleted(sender, instance: Product, **kwargs):
+    """
+    Убирает из индекса категория - тег теги удаленного товара
+
+    (запомнены в product_pre_delete, у архивного товара их нет)
+    """
+    adjust_category_tags(
+        product_tag_changes(
+            instance.category_id, getattr(instance, "_deleted_tag_ids", []), -1
+        )
+    )
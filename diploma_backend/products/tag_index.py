@@ -0,0 +1,92 @@
+"""
+Индекс "категория - тег" (модель CategoryTag) для GET /api/tags/
+
+Для каждой пары категория - тег хранится кол-во не архивных товаров.
+Сигналы изменяют счетчики на разницу (adjust_category_tags),
+а список тегов каталога читается одним запросом к небольшой таблице.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .catalog import category_subtree_ids
+from .models import CategoryTag, Product
+
+
+def adjust_category_tags(changes: Counter) -> None:
+    """
+    Изменяет счетчики индекса: changes - {(category_id, tag_id): разница}
+
+    Недостающие пары создаются, пары с нулевым счетчиком удаляются
+    """
+    changes = {pair: delta for pair, delta in changes.items() if delta}
+    if not changes:
+        return
+    with transaction.atomic():
+        CategoryTag.objects.bulk_create(
+            [
+                CategoryTag(category_id=category_id, tag_id=tag_id)
+                for (category_id, tag_id), delta in changes.items()
+                if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        for (category_id, tag_id), delta in changes.items():
+            CategoryTag.objects.filter(category_id=category_id, tag_id=tag_id).update(
+                product_count=F("product_count") + delta
+            )
+        CategoryTag.objects.filter(product_count__lte=0).delete()
+
+
+def product_tag_changes(category_id, tag_ids, delta: int) -> Counter:
+    """
+    Изменения индекса для одного товара категории category_id с тегами tag_ids
+    """
+    return Counter({(category_id, tag_id): delta for tag_id in tag_ids})
+
+
+def rebuild_category_tags() -> int:
+    """
+    Полностью пересчитывает индекс по таблице связей товар - тег
+
+    Вернет кол-во пар категория - тег
+    """
+    rows = (
+        Product.tags.through.objects.filter(product__archived=False)
+        .values("product__category_id", "tag_id")
+        .annotate(total=Count("product_id"))
+    )
+    index = [
+        CategoryTag(
+            category_id=row["product__category_id"],
+            tag_id=row["tag_id"],
+            product_count=row["total"],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        CategoryTag.objects.all().delete()
+        CategoryTag.objects.bulk_create(index, batch_size=1_000)
+    return len(index)
+
+
+def category_tags(category=None) -> list[dict]:
+    """
+    Теги товаров категории (вместе с подкатегориями) по убыванию кол-ва товаров
+
+    category=None - теги всего каталога
+    """
+    rows = CategoryTag.objects.all()
+    if category:
+        rows = rows.filter(category_id__in=category_subtree_ids(category))
+    rows = (
+        rows.values("tag_id", "tag__name")
+        .annotate(count=Sum("product_count"))
+        .order_by("-count", "tag__name")
+    )
+    return [
+        {"id": row["tag_id"], "name": row["tag__name"], "count": row["count"]}
+        for row in rows
+    ]
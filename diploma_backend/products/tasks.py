@@ -0,0 +1,48 @@
+import logging
+
+from celery import shared_task
+from django.db.models import F, Q
+
+from .cache import bump_catalog_version, touch_products
+from .models import Product
+from .popularity import rebuild_ranking, update_popularity_scores
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_effective_prices():
+    """
+    Применяет и снимает скидки на границах их дат действия
+
+    Запускается Celery beat ежедневно в полночь (diploma_backend/celery.py).
+    Пересчитываются только товары со скидкой и товары, у которых
+    актуальная цена еще отличается от обычной
+    """
+    updated = Product.objects.filter(
+        Q(sale__isnull=False) | ~Q(effective_price=F("price"))
+    ).update_effective_price()
+    # update() не вызывает сигналы, поэтому кеш каталога
+    # и отметки изменения товаров (ETag карточек) сбрасываем явно
+    bump_catalog_version()
+    touch_products()
+    logger.info(f"Цены с учетом скидок пересчитаны у {updated} товаров")
+    return updated
+
+
+@shared_task
+def refresh_popularity_ranking():
+    """
+    Пересчитывает индекс популярности товаров и рейтинг популярных
+
+    Запускается Celery beat ежечасно (diploma_backend/celery.py)
+    """
+    updated = update_popularity_scores()
+    ranked = rebuild_ranking()
+    # update() и bulk_create() не вызывают сигналы, кеш каталога сбрасываем явно
+    bump_catalog_version()
+    logger.info(
+        f"Индекс популярности пересчитан у {updated} товаров,"
+        f" строк рейтинга: {ranked}"
+    )
+    return ranked
@@ -1,3 +1,1094 @@
-from django.test import TestCase
+import json
+import random
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from orders.models import Order, OrderProduct
+from products.cache import get_catalog_version
+from products.catalog import (catalog_count, catalog_filters, catalog_ordering,
+                              category_subtree_ids, encode_cursor,
+                              filter_products, page_number)
+from products.engine import CatalogEngine, np
+from products.management.commands._synthetic import (
+    seed_category_tree, seed_images_and_specifications, seed_products,
+    seed_reviews, seed_sales, seed_tags)
+from products.models import (RATING_HISTOGRAM_FIELDS, REVIEW_RATES, Category,
+                             Product, Review, Sale, Tag)
+from products.popularity import rebuild_ranking, update_popularity_scores
+from products.query_plans import endpoint_queries, full_scans
+from products.search import FTS_TABLE, search_products
+
+# общий кеш процессов для условных GET (в продакшене Redis, CACHE_REDIS_URL)
+SHARED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": str(Path(tempfile.gettempdir()) / "diploma_backend_test_cache"),
+    }
+}
+PROCESS_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+def create_product(category: Category, title: str, **fields) -> Product:
+    fields.setdefault("price", 100)
+    fields.setdefault("full_description", "")
+    return Product.objects.create(category=category, title=title, **fields)
+
+
+class ReviewCountersTestCase(TestCase):
+    """
+    Счетчики и гистограмма оценок товара сдвигаются сигналами отзыва
+
+    инкрементально и после каждой операции совпадают с пересчетом
+    из таблицы Review
+    """
+
+    FIELDS = ("reviews_count", "rating_sum", "avg_rating", *RATING_HISTOGRAM_FIELDS)
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="counters")
+        cls.first = create_product(category, "first")
+        cls.second = create_product(category, "second")
+
+    def review(self, product: Product, rate: int) -> Review:
+        return Review.objects.create(
+            product=product,
+            author="counters",
+            email="counters@example.com",
+            text="text",
+            rate=rate,
+        )
+
+    def state(self, product: Product) -> tuple:
+        return Product.objects.filter(pk=product.pk).values_list(*self.FIELDS).get()
+
+    def expected(self, rates: list[int]) -> tuple:
+        return (
+            len(rates),
+            sum(rates),
+            sum(rates) / len(rates) if rates else 0.0,
+            *(rates.count(rate) for rate in REVIEW_RATES),
+        )
+
+    def rebuild(self) -> None:
+        Product.objects.all().update_rating_counters()
+        Product.objects.all().update_rating_histograms()
+
+    def assert_counters(self, product: Product, rates: list[int]) -> None:
+        incremental = self.state(product)
+        self.assertEqual(incremental, self.expected(rates))
+        self.rebuild()
+        self.assertEqual(self.state(product), incremental)
+
+    def test_create_edit_move_delete(self):
+        moved = self.review(self.first, 5)
+        edited = self.review(self.first, 3)
+        self.assert_counters(self.first, [5, 3])
+
+        edited.rate = 1
+        edited.save()
+        self.assert_counters(self.first, [5, 1])
+
+        moved.product = self.second
+        moved.save()
+        self.assert_counters(self.first, [1])
+        self.assert_counters(self.second, [5])
+
+        edited.delete()
+        self.assert_counters(self.first, [])
+        self.assert_counters(self.second, [5])
+
+    def test_queryset_delete(self):
+        for rate in (4, 4, 2):
+            self.review(self.second, rate)
+        self.review(self.first, 1)
+        Review.objects.filter(product=self.second, rate=4).delete()
+        self.assert_counters(self.second, [2])
+        Review.objects.all().delete()
+        self.assert_counters(self.first, [])
+        self.assert_counters(self.second, [])
+
+
+class SearchProductsTestCase(TestCase):
+    """
+    Полнотекстовый поиск товаров (фильтр каталога filter[name])
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title="Телефоны")
+        cls.iphone = create_product(cls.category, "Apple iPhone 15")
+        cls.case = create_product(cls.category, "Phone case", description="чехол")
+        cls.laptop = create_product(cls.category, "Ноутбук", description="Смартфон")
+
+    def search(self, query: str, **kwargs) -> list[int]:
+        products = search_products(Product.objects.all(), query, **kwargs)
+        return sorted(products.values_list("pk", flat=True))
+
+    def test_substring(self):
+        """
+        Слово запроса ищется как подстрока, как прежний title__icontains
+        """
+        self.assertEqual(self.search("phone"), [self.iphone.pk, self.case.pk])
+        self.assertEqual(self.search("СМАРТ"), [self.laptop.pk])
+
+    def test_all_words_and_short_words(self):
+        self.assertEqual(self.search("iphone 15"), [self.iphone.pk])
+        self.assertEqual(self.search("phone 16"), [])
+        self.assertEqual(self.search("15"), [self.iphone.pk])
+
+    def test_rank_joins_index_once(self):
+        """
+        Релевантность считается в том же запросе, что и MATCH,
+        без подзапроса к индексу на каждый товар
+        """
+        products = search_products(Product.objects.all(), "phone").order_by(
+            "-search_rank", "pk"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            ranked = list(products.values_list("pk", flat=True))
+        self.assertEqual(ranked, [self.case.pk, self.iphone.pk])
+        if connection.vendor == "sqlite":
+            self.assertEqual(queries[0]["sql"].count(f"FROM {FTS_TABLE}"), 0)
+            self.assertEqual(queries[0]["sql"].count("MATCH"), 1)
+
+    def test_catalog_pages_and_cursor(self):
+        """
+        Каталог по релевантности: страницы с подсчетом кол-ва и курсор
+        """
+        response = self.client.get("/api/catalog/", {"filter[name]": "phone"})
+        self.assertEqual(
+            [item["id"] for item in response.json()["items"]],
+            [self.case.pk, self.iphone.pk],
+        )
+        pages = []
+        params = {"filter[name]": "phone", "pagination": "cursor", "limit": 1}
+        while params:
+            data = self.client.get("/api/catalog/", params).json()
+            pages.extend(item["id"] for item in data["items"])
+            params = data["nextCursor"] and {
+                "filter[name]": "phone", "cursor": data["nextCursor"], "limit": 1
+            }
+        self.assertEqual(pages, [self.case.pk, self.iphone.pk])
+
+    def test_raw_save_is_not_indexed(self):
+        """
+        Сохранение из фикстуры (raw) не трогает индекс - его перестраивает
+        команда rebuild_search_index
+        """
+        product = Product(
+            category=self.category,
+            title="Raw phone",
+            price=1,
+            full_description="",
+            date=timezone.now(),
+        )
+        product.save_base(raw=True)
+        self.assertNotIn(product.pk, self.search("raw"))
+
+
+class CatalogFacetsTestCase(TestCase):
+    """
+    Фасеты каталога совпадают с отфильтрованным каталогом
+    """
+
+    QUERIES = [
+        {},
+        {"filter[available]": "true"},
+        {"filter[minPrice]": 1_000, "filter[maxPrice]": 60_000},
+        {"filter[freeDelivery]": "true", "sort": "price", "sortType": "inc"},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(5)
+        cls.categories = [
+            Category.objects.create(title=f"facets-{number}") for number in range(3)
+        ]
+        cls.tags = [Tag.objects.create(name=f"facets-{n}") for n in range(5)]
+        product_ids = seed_products(60, cls.categories)
+        seed_tags(product_ids, cls.tags)
+        seed_sales(product_ids)
+
+    def setUp(self):
+        cache.clear()
+
+    def facets(self, params: dict) -> dict:
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/catalog/facets/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def catalog_total(self, params: dict) -> int:
+        cache.clear()
+        items = self.client.get("/api/catalog/", {**params, "limit": 1_000}).json()
+        return len(items["items"])
+
+    def test_counts_match_catalog(self):
+        for params in self.QUERIES:
+            with self.subTest(params):
+                facets = self.facets(params)
+                self.assertEqual(facets["total"], self.catalog_total(params))
+                self.assertEqual(
+                    facets["available"],
+                    self.catalog_total({**params, "filter[available]": "true"}),
+                )
+                self.assertEqual(
+                    facets["freeDelivery"],
+                    self.catalog_total({**params, "filter[freeDelivery]": "true"}),
+                )
+                for tag in facets["tags"]:
+                    self.assertEqual(
+                        tag["count"],
+                        self.catalog_total({**params, "tags[]": tag["id"]}),
+                    )
+                for category in facets["categories"]:
+                    self.assertEqual(
+                        category["count"],
+                        self.catalog_total({**params, "category": category["id"]}),
+                    )
+                histogram = facets["price"]["histogram"]
+                self.assertEqual(
+                    sum(bucket["count"] for bucket in histogram), facets["total"]
+                )
+
+    def test_price_buckets_on_boundaries(self):
+        """
+        Цены на границах столбцов попадают в столбец справа:
+        при делении в float (0.30 - 0.10) / 0.10 = 1.999... попадала бы в 1
+        """
+        Product.objects.all().delete()
+        category = Category.objects.create(title="buckets")
+        for cents in range(10, 111, 10):
+            create_product(category, f"bucket-{cents}", price=Decimal(cents) / 100)
+        histogram = self.facets({})["price"]["histogram"]
+        self.assertEqual([bucket["from"] for bucket in histogram[:3]], [0.1, 0.2, 0.3])
+        self.assertEqual([bucket["count"] for bucket in histogram], [1] * 9 + [2])
+
+
+class EffectivePriceTestCase(TestCase):
+    """
+    Цена со скидкой (effective_price) следует за скидками и ценой товара
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="effective price")
+        cls.product = create_product(category, "sale", price=100)
+        cls.other = create_product(category, "other", price=90)
+
+    def setUp(self):
+        cache.clear()
+
+    def effective_price(self) -> float:
+        self.product.refresh_from_db()
+        return float(self.product.effective_price)
+
+    def catalog(self, **params) -> list[int]:
+        cache.clear()
+        data = self.client.get(
+            "/api/catalog/", {"sort": "price", "sortType": "inc", **params}
+        ).json()
+        return [item["id"] for item in data["items"]]
+
+    def test_sale_lifecycle(self):
+        today = timezone.localdate()
+        self.assertEqual(self.effective_price(), 100)
+        self.assertEqual(self.catalog(), [self.other.pk, self.product.pk])
+
+        sale = Sale.objects.create(
+            product=self.product, sale_price=80, date_from=today, date_to=today
+        )
+        self.assertEqual(self.effective_price(), 80)
+        self.assertEqual(self.catalog(), [self.product.pk, self.other.pk])
+        self.assertEqual(
+            self.catalog(**{"filter[maxPrice]": 85}), [self.product.pk]
+        )
+
+        # скидка еще не началась
+        sale.date_from = sale.date_to = today + timedelta(days=1)
+        sale.save()
+        self.assertEqual(self.effective_price(), 100)
+        self.assertEqual(self.catalog(**{"filter[maxPrice]": 85}), [])
+
+        sale.date_from = sale.date_to = today
+        sale.sale_price = 70
+        sale.save()
+        self.assertEqual(self.effective_price(), 70)
+
+        # цена товара не меняет действующую скидку
+        self.product.price = 200
+        self.product.save()
+        self.assertEqual(self.effective_price(), 70)
+
+        sale.delete()
+        self.assertEqual(self.effective_price(), 200)
+        self.assertEqual(self.catalog(), [self.other.pk, self.product.pk])
+
+    def test_price_change_without_sale(self):
+        self.product.price = 50
+        self.product.save()
+        self.assertEqual(self.effective_price(), 50)
+        self.assertEqual(self.catalog(), [self.product.pk, self.other.pk])
+
+    def test_admin_form_has_no_effective_price(self):
+        """
+        effective_price в админке только для чтения: сигнал все равно
+        перезапишет введенное значение
+        """
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "admin")
+        )
+        response = self.client.get(
+            f"/admin/products/product/{self.product.pk}/change/"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'name="effective_price"')
+        self.assertContains(response, 'name="price"')
+
+
+class CatalogCursorTestCase(TestCase):
+    """
+    Курсорная пагинация каталога: порядок страниц и проверка курсора
+    """
+
+    SORTS = [
+        {},
+        {"sort": "price", "sortType": "inc"},
+        {"sort": "date", "sortType": "dec"},
+        {"sort": "rating", "sortType": "dec"},
+        {"sort": "reviews", "sortType": "inc"},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(3)
+        seed_products(25, [Category.objects.create(title="cursor")])
+        seed_sales(list(Product.objects.values_list("pk", flat=True)))
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, params: dict, cursor=None):
+        params = {**params, "limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        else:
+            params["pagination"] = "cursor"
+        return self.client.get("/api/catalog/", params)
+
+    def test_pages_follow_ordering(self):
+        for params in self.SORTS:
+            with self.subTest(params):
+                ordering = catalog_ordering(params.get("sort"), params.get("sortType"))
+                expected = list(
+                    Product.objects.filter(archived=False)
+                    .order_by(*ordering)
+                    .values_list("pk", flat=True)
+                )
+                pages, cursor = [], None
+                while True:
+                    data = self.get(params, cursor).json()
+                    pages.extend(item["id"] for item in data["items"])
+                    cursor = data["nextCursor"]
+                    if not cursor:
+                        break
+                self.assertEqual(pages, expected)
+
+    def test_cursor_of_other_sort(self):
+        price = {"sort": "price", "sortType": "inc"}
+        date = {"sort": "date", "sortType": "dec"}
+        rating = {"sort": "rating", "sortType": "inc"}
+        for issued, reused in (
+            (date, price),
+            (price, date),
+            (price, rating),
+            (price, {"sort": "price", "sortType": "dec"}),
+            ({}, price),
+        ):
+            with self.subTest(issued=issued, reused=reused):
+                cursor = self.get(issued).json()["nextCursor"]
+                self.assertEqual(self.get(reused, cursor).status_code, 400)
+
+    def test_forged_cursor(self):
+        price = {"sort": "price", "sortType": "inc"}
+        date = {"sort": "date", "sortType": "dec"}
+        for params, cursor in (
+            (price, encode_cursor("abc", 1, 1, "effective_price")),
+            (price, encode_cursor(None, 1, 1, "effective_price")),
+            (price, encode_cursor([1], 1, 1, "effective_price")),
+            (date, encode_cursor(1, 1, 1, "-date")),
+            (date, encode_cursor("yesterday", 1, 1, "-date")),
+            (price, "not-a-cursor"),
+        ):
+            with self.subTest(params=params, cursor=cursor):
+                self.assertEqual(self.get(params, cursor).status_code, 400)
+
+
+class CatalogCacheTestCase(TestCase):
+    """
+    Версия каталога в ключах кеша меняется только после коммита изменения
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_version_bumped_on_commit(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            product = create_product(Category.objects.create(title="cache"), "cache")
+            product.tags.add(Tag.objects.create(name="cache"))
+            # до коммита параллельный запрос кеширует старые строки под старой версией
+            self.assertEqual(get_catalog_version(), version)
+        self.assertGreater(get_catalog_version(), version)
+
+
+class QueryPlansTestCase(TestCase):
+    """
+    Запросы публичных эндпоинтов не читают большие таблицы полным просмотром
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(42)
+        cls.categories = [
+            Category.objects.create(title=f"plans-{number}") for number in range(20)
+        ]
+        product_ids = seed_products(2_000, cls.categories)
+        seed_reviews(product_ids)
+        seed_sales(product_ids)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_endpoint_queries_use_indexes(self):
+        for name, queryset in endpoint_queries(self.categories[0]).items():
+            with self.subTest(name):
+                scans, plan = full_scans(queryset)
+                self.assertEqual(scans, set(), plan)
+
+    def test_full_index_scan_is_detected(self):
+        products = Product.objects.filter(archived=False)
+        for name, queryset in (
+            # весь частичный индекс без LIMIT
+            ("index", products.order_by("effective_price").values_list("pk")),
+            # сортировка всех товаров по колонке без индекса
+            ("sort", products.order_by("price")[:20]),
+        ):
+            with self.subTest(name):
+                self.assertEqual(full_scans(queryset)[0], {"products_product"})
+
+    @override_settings(CATALOG_ESTIMATED_COUNT=True, CATALOG_ESTIMATED_COUNT_MIN=1_000)
+    def test_unfiltered_count_without_full_scan(self):
+        """
+        Кол-во товаров всего каталога берется из статистики, а не COUNT(*)
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            total = catalog_count(catalog_filters(QueryDict()))
+        if connection.vendor == "sqlite":
+            self.assertEqual(total, Product.objects.filter(archived=False).count())
+        self.assertFalse(
+            [query for query in queries if "COUNT(" in query["sql"].upper()]
+        )
+
+
+@skipIf(np is None, "колоночному движку каталога нужен numpy")
+class CatalogEngineTestCase(TestCase):
+    """
+    Колоночный движок каталога возвращает те же страницы, что и ORM
+    """
+
+    QUERIES = [
+        "",
+        "sort=price&sortType=inc",
+        "sort=price&sortType=dec&filter[minPrice]=1000&filter[maxPrice]=50000",
+        "sort=date&sortType=dec&filter[available]=true",
+        "sort=reviews&sortType=dec&filter[freeDelivery]=true",
+        "sort=rating&sortType=inc&currentPage=3",
+        "sort=popularity&sortType=dec",
+        "sort=price&sortType=inc&currentPage=1000",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(7)
+        cls.categories = seed_category_tree(depth=2, width=3, title="engine")
+        cls.tags = [Tag.objects.create(name=f"engine-{n}") for n in range(6)]
+        product_ids = seed_products(400, cls.categories)
+        seed_tags(product_ids, cls.tags)
+        seed_sales(product_ids)
+
+    def orm_query(self, params: QueryDict, limit: int):
+        filters = catalog_filters(params)
+        products = filter_products(Product.objects.filter(archived=False), filters)
+        total = products.count()
+        number, _ = page_number(int(params.get("currentPage", 1)), total, limit)
+        ordering = catalog_ordering(params.get("sort"), params.get("sortType"))
+        page = products.order_by(*ordering)[(number - 1) * limit : number * limit]
+        return list(page.values_list("pk", flat=True)), total
+
+    def assert_same_pages(self, query_string: str, limit=20):
+        params = QueryDict(query_string)
+        result = CatalogEngine().query(
+            catalog_filters(params),
+            params.get("sort"),
+            params.get("sortType"),
+            int(params.get("currentPage", 1)),
+            limit,
+        )
+        self.assertEqual(result, self.orm_query(params, limit), query_string)
+
+    def test_filters_and_sorting(self):
+        for query_string in self.QUERIES:
+            with self.subTest(query_string):
+                self.assert_same_pages(query_string)
+
+    def test_category_subtree_and_tags(self):
+        root, child = self.categories[0], self.categories[1]
+        first, second = self.tags[0].pk, self.tags[1].pk
+        for query_string in [
+            f"category={root.pk}&sort=price&sortType=inc",
+            f"category={child.pk}&sort=date&sortType=dec",
+            f"tags[]={first}&tags[]={second}&sort=price&sortType=inc",
+            f"tags[]={first}&tags[]={second}&tagsMode=all&sort=rating&sortType=dec",
+        ]:
+            with self.subTest(query_string):
+                self.assert_same_pages(query_string)
+
+    def test_name_filter_falls_back_to_orm(self):
+        params = QueryDict("filter[name]=smart")
+        self.assertIsNone(
+            CatalogEngine().query(catalog_filters(params), None, None, 1, 20)
+        )
+
+
+@override_settings(CATALOG_ESTIMATED_COUNT=True, CATALOG_ESTIMATED_COUNT_MIN=1_000)
+class CatalogCountTestCase(TestCase):
+    """
+    Оценка кол-ва товаров планировщиком вместо COUNT(*) для больших каталогов
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(10)
+        seed_products(50, [Category.objects.create(title="count")])
+        cls.exact = Product.objects.filter(archived=False).count()
+
+    def setUp(self):
+        cache.clear()
+
+    def count(self, query_string="") -> int:
+        return catalog_count(catalog_filters(QueryDict(query_string)))
+
+    def test_exact_count_below_threshold(self):
+        """
+        Оценка меньше CATALOG_ESTIMATED_COUNT_MIN - считается точное кол-во
+        """
+        with mock.patch("products.catalog._estimated_count", return_value=57):
+            self.assertEqual(self.count(), self.exact)
+        # без оценки (SQLite) кол-во тоже точное
+        cache.clear()
+        with mock.patch("products.catalog._estimated_count", return_value=None):
+            self.assertEqual(self.count(), self.exact)
+
+    def test_estimate_above_threshold(self):
+        with mock.patch("products.catalog._estimated_count", return_value=5_000):
+            self.assertEqual(self.count(), 5_000)
+
+    def test_filtered_catalog_is_counted_exactly(self):
+        with mock.patch(
+            "products.catalog._estimated_count", return_value=5_000
+        ) as estimate:
+            total = self.count("filter[available]=true")
+        estimate.assert_not_called()
+        self.assertEqual(
+            total, Product.objects.filter(archived=False, count__gt=0).count()
+        )
+
+
+class CategoryPathsTestCase(TestCase):
+    """
+    Материализованные пути категорий после загрузки в обход Category.save
+    """
+
+    def test_rebuild_paths(self):
+        root = Category.objects.create(title="Электроника")
+        child = Category.objects.create(title="Телефоны", parent=root)
+        leaf = Category.objects.create(title="Смартфоны", parent=child)
+        expected = dict(Category.objects.values_list("pk", "path"))
+        # так категории выглядят после loaddata
+        Category.objects.update(path="")
+
+        out = StringIO()
+        call_command("rebuild_category_paths", stdout=out)
+        self.assertIn("у 3 категорий", out.getvalue())
+        self.assertEqual(dict(Category.objects.values_list("pk", "path")), expected)
+        self.assertEqual(
+            set(
+                Category.objects.subtree_of(
+                    Category.objects.get(pk=child.pk).path
+                ).values_list("pk", flat=True)
+            ),
+            {child.pk, leaf.pk},
+        )
+        self.assertEqual(Category.objects.rebuild_paths(), 0)
+
+    def test_subtree_without_paths(self):
+        """
+        Пока пути не пересчитаны, фильтр каталога находит подкатегории по parent_id
+        """
+        root = Category.objects.create(title="Электроника")
+        child = Category.objects.create(title="Телефоны", parent=root)
+        leaf = Category.objects.create(title="Смартфоны", parent=child)
+        Category.objects.update(path="")
+        cache.clear()
+        with self.assertLogs("products.catalog", "WARNING"):
+            ids = category_subtree_ids(root.pk)
+        self.assertEqual(sorted(ids), [root.pk, child.pk, leaf.pk])
+        self.assertEqual(category_subtree_ids(0), [])
+
+        # дерево категорий тоже не теряет ветки
+        tree = self.client.get("/api/categories/").json()
+        self.assertEqual([node["id"] for node in tree], [root.pk])
+        self.assertEqual(
+            tree[0]["subcategories"][0]["subcategories"][0]["id"], leaf.pk
+        )
+
+
+@override_settings(
+    CATALOG_POPULARITY_WEIGHTS={"sales": 1.0, "rating": 5.0, "sort_index": 0.1},
+    CATALOG_POPULARITY_TOP_N=2,
+)
+class PopularityRankingTestCase(TestCase):
+    """
+    Индекс популярности, рейтинг ProductRanking и порядок /products/popular/
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.phones = Category.objects.create(title="phones")
+        cls.laptops = Category.objects.create(title="laptops")
+        # (категория, рейтинг, индекс сортировки, продано)
+        rows = [
+            (cls.phones, 5.0, 0, 0),
+            (cls.phones, 1.0, 10, 30),
+            (cls.phones, 4.0, 0, 0),
+            (cls.laptops, 3.0, 0, 2),
+            (cls.laptops, 2.0, 0, 0),
+        ]
+        cls.products = []
+        for number, (category, rating, sort_index, sold) in enumerate(rows):
+            product = create_product(category, f"popular-{number}")
+            Product.objects.filter(pk=product.pk).update(
+                avg_rating=rating, sort_index=sort_index
+            )
+            cls.products.append(product)
+            if sold:
+                user = User.objects.create_user(username=f"popular-{number}")
+                order = Order.objects.create(user=user, status="paid")
+                OrderProduct.objects.create(
+                    order=order, product=product, count=sold, price=1
+                )
+                # неоплаченные заказы в индекс не входят
+                pending = Order.objects.create(user=user)
+                OrderProduct.objects.create(
+                    order=pending, product=product, count=1_000, price=1
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def popular(self, **params) -> list[int]:
+        response = self.client.get("/api/products/popular/", params)
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.json()]
+
+    def test_scores_and_ranking(self):
+        update_popularity_scores()
+        scores = dict(Product.objects.values_list("pk", "popularity_score"))
+        # продано * 1 + рейтинг * 5 - индекс сортировки * 0.1
+        expected = [25.0, 34.0, 20.0, 17.0, 10.0]
+        for product, score in zip(self.products, expected):
+            self.assertAlmostEqual(scores[product.pk], score)
+
+        # общий топ-2 и топ-2 каждой категории
+        self.assertEqual(rebuild_ranking(), 6)
+        first, second, third, fourth, fifth = (p.pk for p in self.products)
+        self.assertEqual(self.popular(), [second, first])
+        self.assertEqual(self.popular(category=self.phones.pk), [second, first])
+        self.assertEqual(self.popular(category=self.laptops.pk), [fourth, fifth])
+
+    def test_fallback_before_first_rebuild(self):
+        self.assertEqual(len(self.popular()), len(self.products))
+
+    def test_invalid_category(self):
+        response = self.client.get("/api/products/popular/", {"category": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+
+class EndpointQueriesTestCase(TestCase):
+    """
+    Кол-во запросов эндпоинтов с карточками товаров не зависит от кол-ва карточек
+
+    Карточки загружаются пакетно: товары, картинки и теги (load_product_cards)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(14)
+        cls.categories = seed_category_tree(depth=1, width=2, title="queries")
+        tags = [Tag.objects.create(name=f"queries-{n}") for n in range(5)]
+        product_ids = seed_products(40, cls.categories)
+        Product.objects.update(archived=False, count=5, is_banner=False)
+        Product.objects.filter(pk__in=product_ids[:20]).update(is_limited=True)
+        Product.objects.filter(pk__in=product_ids[20:25]).update(
+            is_limited=False, is_banner=True
+        )
+        seed_tags(product_ids, tags)
+        seed_images_and_specifications(product_ids)
+        seed_reviews(product_ids)
+        seed_sales(product_ids, share=0.5)
+        today = timezone.localdate()
+        Sale.objects.update(date_from=today, date_to=today)
+        update_popularity_scores()
+        rebuild_ranking()
+        cls.product = Product.objects.filter(reviews_count__gt=0).first()
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_queries(self, expected: int, url: str, params=None, items=None):
+        with self.assertNumQueries(expected):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        if items is not None:
+            cards = data if isinstance(data, list) else data["items"]
+            self.assertEqual(len(cards), items)
+        return data
+
+    def test_product_lists(self):
+        # id товаров + карточки
+        self.assert_queries(4, "/api/products/limited/", items=16)
+        self.assert_queries(4, "/api/products/popular/", items=8)
+        self.assert_queries(4, "/api/banners/", items=3)
+        # id товаров трех блоков + одна пачка карточек на все блоки + категории
+        data = self.assert_queries(7, "/api/home/")
+        self.assertEqual(len(data["limited"]), 16)
+
+    def test_catalog_page_size(self):
+        for limit in (1, 20):
+            with self.subTest(limit=limit):
+                cache.clear()
+                # оценка кол-ва по статистике (ее нет) и точное кол-во
+                # + id страницы + карточки
+                self.assert_queries(6, "/api/catalog/", {"limit": limit}, limit)
+                cache.clear()
+                self.assert_queries(
+                    4, "/api/catalog/", {"limit": limit, "pagination": "cursor"}, limit
+                )
+
+    def test_sales(self):
+        for limit in (1, 10):
+            with self.subTest(limit=limit):
+                cache.clear()
+                # кол-во скидок + скидки с товарами + картинки товаров
+                self.assert_queries(3, "/api/sales", {"limit": limit}, limit)
+
+    def test_product_detail(self):
+        data = self.assert_queries(5, f"/api/product/{self.product.pk}/")
+        self.assertEqual(data["id"], self.product.pk)
+
+
+class LoaddataTestCase(TestCase):
+    """
+    Каталог после загрузки фикстур (loaddata сохраняет записи в обход save)
+    """
+
+    def setUp(self):
+        root = Category.objects.create(title="Электроника")
+        child = Category.objects.create(title="Телефоны", parent=root)
+        tag = Tag.objects.create(name="Apple")
+        product = create_product(child, "Apple iPhone 15")
+        product.tags.add(tag)
+        self.root, self.tag, self.product = root, tag, product
+
+        with tempfile.TemporaryDirectory() as directory:
+            fixture = Path(directory) / "catalog.json"
+            call_command(
+                "dumpdata",
+                "products.category",
+                "products.tag",
+                "products.product",
+                output=str(fixture),
+            )
+            # в fixtures/full_db.json категории еще без материализованного пути
+            rows = json.loads(fixture.read_text())
+            for row in rows:
+                row["fields"].pop("path", None)
+            fixture.write_text(json.dumps(rows))
+            Product.objects.all().delete()
+            Category.objects.all().delete()
+            Tag.objects.all().delete()
+            call_command("loaddata", str(fixture), verbosity=0)
+        cache.clear()
+
+    def get(self, url: str, params: dict):
+        cache.clear()
+        return self.client.get(url, params).json()
+
+    def assert_catalog(self):
+        tags = self.get("/api/tags/", {"category": self.root.pk})
+        self.assertEqual([tag["id"] for tag in tags], [self.tag.pk])
+        catalog = self.get("/api/catalog/", {"category": self.root.pk})
+        self.assertEqual([item["id"] for item in catalog["items"]], [self.product.pk])
+
+    def test_catalog_before_and_after_rebuild(self):
+        self.assertEqual(set(Category.objects.values_list("path", flat=True)), {""})
+        with self.assertLogs("products.catalog", "WARNING"):
+            self.assert_catalog()
+
+        for command in (
+            "rebuild_category_paths",
+            "rebuild_effective_prices",
+            "rebuild_category_tags",
+            "rebuild_search_index",
+        ):
+            call_command(command, stdout=StringIO())
+        self.assertNotIn("", Category.objects.values_list("path", flat=True))
+        self.assert_catalog()
+        found = self.get("/api/catalog/", {"filter[name]": "phone"})
+        self.assertEqual([item["id"] for item in found["items"]], [self.product.pk])
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class ConditionalGetTestCase(TestCase):
+    """
+    ETag / Last-Modified публичных эндпоинтов по отметкам изменения в кеше
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_product(Category.objects.create(title="etag"), "etag")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_until_product_changes(self):
+        url = f"/api/product/{self.product.pk}/"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.title = "etag 2"
+            self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_catalog_etag_changes_after_commit(self):
+        """
+        ETag каталога меняется только после коммита: ответ, собранный
+        до коммита, не получает новый ETag со старыми данными
+        """
+        etag = self.client.get("/api/tags/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="etag")
+            self.assertEqual(self.client.get("/api/tags/")["ETag"], etag)
+        self.assertNotEqual(self.client.get("/api/tags/")["ETag"], etag)
+
+    @override_settings(CATALOG_MODIFIED_TIMEOUT=1)
+    def test_stamps_expire(self):
+        """
+        Отметка изменения живет CATALOG_MODIFIED_TIMEOUT и начинается заново:
+        304 по изменению, не дошедшему до кеша, ограничен этим сроком
+        """
+        etag = self.client.get("/api/tags/")["ETag"]
+        self.assertEqual(
+            self.client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        time.sleep(1.1)
+        self.assertEqual(
+            self.client.get("/api/tags/", HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_no_validators_with_process_cache(self):
+        """
+        С кешем в памяти процесса изменения других процессов не видны - 304 нет
+        """
+        with override_settings(CACHES=PROCESS_CACHES):
+            response = self.client.get(f"/api/product/{self.product.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+
+
+@override_settings(CATALOG_FAST_SERIALIZER=False, PRODUCT_DETAIL_REVIEWS=5)
+class ProductDetailReviewsTestCase(TestCase):
+    """
+    В страницу товара (DRF-сериализатор) попадают только последние отзывы
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="reviews")
+        cls.product = create_product(category, "reviews")
+        cls.other = create_product(category, "other")
+        for product, total in ((cls.product, 8), (cls.other, 3)):
+            for number in range(total):
+                Review.objects.create(
+                    product=product,
+                    author=f"{product.title}-{number}",
+                    email="reviews@example.com",
+                    text="text",
+                    rate=number % 5 + 1,
+                )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_newest_reviews(self):
+        data = self.client.get(f"/api/product/{self.product.pk}/").json()
+        self.assertEqual(
+            [review["author"] for review in data["reviews"]],
+            [f"reviews-{number}" for number in range(7, 2, -1)],
+        )
+        self.assertEqual(data["reviewsCount"], 8)
+        self.assertIsNotNone(data["reviewsNext"])
+
+        data = self.client.get(f"/api/product/{self.other.pk}/").json()
+        self.assertEqual(len(data["reviews"]), 3)
+        self.assertIsNone(data["reviewsNext"])
+
+
+@override_settings(PRODUCT_DETAIL_REVIEWS=3)
+class ProductReviewsTestCase(TestCase):
+    """
+    GET /product/{id}/reviews постранично по курсору и ответ на POST отзыва
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title="reviews page")
+        cls.product = create_product(category, "reviews page")
+        for number in range(7):
+            Review.objects.create(
+                product=cls.product,
+                author=f"author-{number}",
+                email="reviews@example.com",
+                text="text",
+                rate=number % 5 + 1,
+            )
+        cls.url = f"/api/product/{cls.product.pk}/reviews"
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_continue_detail_reviews(self):
+        detail = self.client.get(f"/api/product/{self.product.pk}/").json()
+        authors = [review["author"] for review in detail["reviews"]]
+        url = f"{detail['reviewsNext']}&limit=2"
+        while url:
+            data = self.client.get(url).json()
+            self.assertEqual(data["total"], 7)
+            self.assertLessEqual(len(data["items"]), 2)
+            authors.extend(review["author"] for review in data["items"])
+            url = data["next"]
+        self.assertEqual(authors, [f"author-{number}" for number in range(6, -1, -1)])
+
+    def test_first_page_and_invalid_cursor(self):
+        data = self.client.get(self.url, {"limit": 5}).json()
+        self.assertEqual(len(data["items"]), 5)
+        self.assertIsNotNone(data["nextCursor"])
+        for cursor in (
+            encode_cursor(1, 1, 2, "-date"),
+            encode_cursor("2026-01-01", 1, 2, "-price"),
+            "not-a-cursor",
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/api/product/0/reviews").status_code, 404)
+
+    def test_create_returns_review_and_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url,
+                {
+                    "author": "new",
+                    "email": "new@example.com",
+                    "text": "new review",
+                    "rate": 5,
+                },
+            )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(
+            set(data), {"review", "reviewsCount", "rating", "ratingHistogram"}
+        )
+        self.assertEqual(data["review"]["author"], "new")
+        self.assertEqual(data["review"]["rate"], 5)
+        self.assertEqual(data["reviewsCount"], 8)
+        rates = [number % 5 + 1 for number in range(7)] + [5]
+        self.assertAlmostEqual(data["rating"], sum(rates) / len(rates))
+        self.assertEqual(
+            data["ratingHistogram"],
+            {str(rate): rates.count(rate) for rate in range(1, 6)},
+        )
+        # новый отзыв - первый в списке
+        first = self.client.get(self.url, {"limit": 1}).json()["items"][0]
+        self.assertEqual(first["author"], "new")
+
+
+@override_settings(PRODUCT_DETAIL_REVIEWS=3)
+class FastSerializerTestCase(TestCase):
+    """
+    Быстрый путь сериализации (values_list) отдает тот же JSON, что и DRF
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(19)
+        category = Category.objects.create(title="serializer")
+        tags = [Tag.objects.create(name=f"serializer-{n}") for n in range(5)]
+        product_ids = seed_products(30, [category])
+        Product.objects.update(archived=False, count=5, is_limited=True)
+        # часть товаров без картинок, тегов, отзывов и скидок
+        seed_tags(product_ids[:20], tags)
+        seed_images_and_specifications(product_ids[:20])
+        seed_reviews(product_ids[:20])
+        seed_sales(product_ids[:20], share=0.5)
+        today = timezone.localdate()
+        Sale.objects.update(date_from=today, date_to=today)
+        cls.product_ids = product_ids
+
+    def get(self, url: str, fast: bool) -> bytes:
+        cache.clear()
+        with override_settings(CATALOG_FAST_SERIALIZER=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_same_json(self):
+        urls = [
+            "/api/catalog/?limit=30",
+            "/api/products/limited/",
+            *(f"/api/product/{pk}/" for pk in self.product_ids[:3]),
+            f"/api/product/{self.product_ids[-1]}/",
+        ]
+        for url in urls:
+            with self.subTest(url):
+                self.assertEqual(self.get(url, fast=True), self.get(url, fast=False))
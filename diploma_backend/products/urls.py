@@ -1,9 +1,10 @@
 from django.urls import path
 
 from .views import (  # представление для обработки запроса GET /product{id}; представление обрабатывает запрос: создание отзыва; функция представления, для обработки запроса GET /sale; функция представления, для обработки запроса catalog; функция представления, для обработки запроса GET /tags
-    ProductCategoryListView, ProductDetailView, ProductReviewCreateView,
+    ProductCategoryListView, ProductDetailView, ProductReviewsView,
     ProductsBannersListView, ProductsLimitedListView, ProductsPopularListView,
-    discounted_products, product_catalog, tags_popular)
+    catalog_cache_stats, catalog_facets_view, discounted_products, home_page,
+    product_catalog, tags_popular)
 
 urlpatterns = [
     path(
@@ -14,13 +15,16 @@ urlpatterns = [
         "products/popular/", ProductsPopularListView.as_view(), name="products_popular"
     ),
     path("banners/", ProductsBannersListView.as_view(), name="products_banners"),
+    path("home/", home_page, name="home_page"),
     path("catalog/", product_catalog, name="products_catalog"),
+    path("catalog/facets/", catalog_facets_view, name="catalog_facets"),
+    path("catalog/cache-stats/", catalog_cache_stats, name="catalog_cache_stats"),
     path("tags/", tags_popular, name="tags_popular"),
     path("product/<int:pk>/", ProductDetailView.as_view(), name="product_detail"),
     path(
         "product/<int:id>/reviews",
-        ProductReviewCreateView.as_view(),
-        name="product_create_review",
+        ProductReviewsView.as_view(),
+        name="product_reviews",
     ),
     path("sales", discounted_products, name="sales_products"),
 ]
@@ -1,41 +1,131 @@
 import logging
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Avg, Count, Prefetch
-from django.db.models.functions import Coalesce
+from django.db import transaction
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
-from rest_framework.decorators import api_view
-from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.generics import (ListAPIView, ListCreateAPIView,
+                                     RetrieveAPIView)
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
-from .models import Category, Product, Review, Sale, Tag
-from .serializers import (CategorySerializer, ProductDetailSerializer,
-                          ProductSerializer, ReviewSerializer, SalesSerializer)
+from .cache import (catalog_cache_key, catalog_cache_timeout, get_cache_stats,
+                    product_cache_key, product_cache_timeout, record_cache_hit,
+                    record_cache_miss, seconds_until_midnight)
+from .catalog import (InvalidCursor, catalog_count, catalog_facets,
+                      catalog_filters, catalog_ordering, filter_products,
+                      page_number, paginate_by_cursor)
+from .categories import category_tree
+from .conditional import (catalog_conditional, catalog_conditional_view,
+                          product_conditional_view, sales_conditional)
+from .engine import get_catalog_engine
+from .fast_serializers import (render_product_detail, serialize_product_cards,
+                               use_fast_serializer)
+from .models import (RATING_HISTOGRAM_FIELDS, Category, Image, Product, Review,
+                     Sale, Specification, Tag)
+from .popularity import fallback_popular_products, popular_product_ids
+from .tag_index import category_tags
+from .serializers import (REVIEWS_ORDERING, CategorySerializer,
+                          ProductDetailSerializer, ProductSerializer,
+                          ReviewSerializer, SalesSerializer,
+                          detail_reviews_limit, rating_histogram,
+                          reviews_page_size)
 
 logger = logging.getLogger(__name__)  # Создаем логгер
 
+# сортировка действующих скидок: обратный порядок индекса sale_active_dates_idx,
+# первыми идут недавно начавшиеся скидки
+SALES_ORDERING = ("-date_from", "-date_to", "-pk")
 
+
+@product_conditional_view
 class ProductDetailView(RetrieveAPIView):
     """
     представление на основе класса
 
     обрабатывает запрос на получение одного товара
+    Готовый ответ кешируется отдельно для каждого товара: ключ содержит
+    отметку изменения товара, которую сбрасывают только изменения самого
+    товара, его скидки, характеристик, картинок, тегов и отзывов
     """
 
-    queryset = (
-        Product.objects.filter(archived=False)
-        .select_related("category")
-        .prefetch_related("specifications", "images", "reviews", "tags")
-        .annotate(  # Добавляем в qs вычисляемые поля:
-            avg_rating=Avg("reviews__rate")  # Средний рейтинг
-        )
-    )
     serializer_class = ProductDetailSerializer
+    # None - по настройке CATALOG_FAST_SERIALIZER
+    fast_serializer = None
+
+    def get_queryset(self):
+        # из отзывов загружаем только последние, всего отзывов - reviews_count.
+        # Срез в Prefetch не используем: номер отзыва в товаре считает
+        # ROW_NUMBER, а условие по нему фильтрует в подзапросе
+        newest_reviews = (
+            Review.objects.annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("product_id"),
+                    order_by=[F("date").desc(), F("pk").desc()],
+                )
+            )
+            .filter(position__lte=detail_reviews_limit())
+            .order_by("-date", "-pk")
+        )
+        return Product.objects.filter(archived=False).prefetch_related(
+            Prefetch("specifications", queryset=Specification.objects.order_by("pk")),
+            Prefetch("images", queryset=Image.objects.order_by("pk")),
+            Prefetch("reviews", queryset=newest_reviews, to_attr="newest_reviews"),
+            Prefetch("tags", queryset=Tag.objects.order_by("pk")),
+        )
+
+    def render_product(self):
+        if not use_fast_serializer(self.fast_serializer):
+            return self.get_serializer(self.get_object()).data
+        data = render_product_detail(self.kwargs["pk"])
+        if data is None:
+            raise Http404
+        return data
+
+    def retrieve(self, request, *args, **kwargs):
+        cache_key = product_cache_key(self.kwargs["pk"])
+        data = cache.get(cache_key)
+        if data is not None:
+            record_cache_hit()
+            return Response(data)
+        record_cache_miss()
+        data = self.render_product()
+        cache.set(cache_key, data, product_cache_timeout())
+        return Response(data)
+
+
+class ProductCardsListView(ListAPIView):
+    """
+    Базовое представление списка карточек товаров
+
+    queryset выбирает только id и порядок товаров, сами карточки
+    загружаются пакетно (serialize_product_cards)
+    """
+
+    serializer_class = ProductSerializer
+    # None - по настройке CATALOG_FAST_SERIALIZER
+    fast_serializer = None
+
+    def get_product_ids(self):
+        return self.get_queryset().values_list("pk", flat=True)
+
+    def list(self, request, *args, **kwargs):
+        return Response(
+            serialize_product_cards(self.get_product_ids(), self.fast_serializer)
+        )
 
 
-class ProductsLimitedListView(ListAPIView):
+@catalog_conditional_view
+class ProductsLimitedListView(ProductCardsListView):
     """
     Представление для получения списка лимитированных товаров.
     """
@@ -43,48 +133,55 @@ class ProductsLimitedListView(ListAPIView):
     queryset = (
         Product.objects.filter(is_limited=True, archived=False, count__gt=0)
         .order_by("-date")
-        .select_related("sale", "category")
-        .prefetch_related("tags", "images", "reviews")
-        .annotate(  # Добавляем в qs вычисляемые поля:
-            reviews_count=Count("reviews"),  # Кол-во отзывов
-            avg_rating=Avg("reviews__rate"),  # Средний рейтинг
-        )
     )[:16]
-    serializer_class = ProductSerializer
 
 
+@catalog_conditional_view
 class ProductCategoryListView(ListAPIView):
     """
     Представление для получения категорий товаров
+
+    Дерево любой глубины отдается готовым JSON из кеша
     """
 
-    queryset = (
-        Category.objects.filter(is_active=True, parent=None)
-        .select_related("image")  # В одном запросе загружаем связанные картинки
-        .prefetch_related(
-            Prefetch("subcategories", queryset=Category.objects.filter(is_active=True))
-        )
-    )
+    queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
 
+    def list(self, request, *args, **kwargs):
+        return Response(category_tree())
+
 
-class ProductsPopularListView(ListAPIView):
+@catalog_conditional_view
+class ProductsPopularListView(ProductCardsListView):
     """
     Представление для получения популярных товаров
+
+    Товары берутся из готового рейтинга популярности (products/popularity.py),
+    ?category= - топ товаров категории
     """
 
-    queryset = (
-        Product.objects.filter(archived=False, is_limited=False, is_banner=False)
-        .order_by("sort_index", "-purchases_count")
-        .annotate(  # Добавляем в qs вычисляемые поля:
-            reviews_count=Count("reviews"),  # Кол-во отзывов
-            avg_rating=Avg("reviews__rate"),  # Средний рейтинг
-        )
-    )[:8]
-    serializer_class = ProductSerializer
+    limit = 8
+    queryset = fallback_popular_products()[:limit]
+
+    def list(self, request, *args, **kwargs):
+        category = request.query_params.get("category") or None
+        if category is not None:
+            try:
+                category = int(category)
+            except ValueError:
+                return Response(
+                    {"error": "Некорректный category"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        self.category = category
+        return super().list(request, *args, **kwargs)
+
+    def get_product_ids(self):
+        return popular_product_ids(self.limit, self.category)
 
 
-class ProductsBannersListView(ListAPIView):
+@catalog_conditional_view
+class ProductsBannersListView(ProductCardsListView):
     """
     Представление для получения банеров с товарами
     """
@@ -92,170 +189,260 @@ class ProductsBannersListView(ListAPIView):
     queryset = (
         Product.objects.filter(is_limited=False, is_banner=True)
         .order_by("-date")
-        .annotate(  # Добавляем в qs вычисляемые поля:
-            reviews_count=Count("reviews"),  # Кол-во отзывов
-            avg_rating=Avg("reviews__rate"),  # Средний рейтинг
-        )
     )[:3]
-    serializer_class = ProductSerializer
 
 
+@catalog_conditional
 @api_view(["GET"])
-def product_catalog(request):
+def home_page(request):
     """
-    Представление на основе функции, обслуживает страницу catalog
+    Представление на основе функции, все блоки главной страницы одним запросом
+
+    GET /home/
+    Баннеры, популярные и лимитированные товары загружаются одним пакетом
+    карточек, готовый ответ кешируется под версией каталога
     """
-    # получаем все доступные продукты
-    products = (
-        Product.objects.filter(archived=False)
-        .select_related("sale", "category")
-        .prefetch_related("tags", "images")
-        .annotate(  # Добавляем в qs вычисляемые поля:
-            reviews_count=Count("reviews"),  # Кол-во отзывов
-            avg_rating=Coalesce(Avg("reviews__rate"), 0.0),  # Средний рейтинг
+    cache_key = catalog_cache_key("home", {})
+    data = cache.get(cache_key)
+    if data is not None:
+        record_cache_hit()
+        return Response(data)
+    record_cache_miss()
+
+    # сначала только id товаров каждого блока, в том же порядке, что и в
+    # отдельных эндпоинтах, затем карточки всех блоков одним пакетом
+    block_ids = {
+        "banners": list(
+            ProductsBannersListView.queryset.values_list("pk", flat=True)
+        ),
+        "popular": popular_product_ids(ProductsPopularListView.limit),
+        "limited": list(
+            ProductsLimitedListView.queryset.values_list("pk", flat=True)
+        ),
+    }
+    cards = {
+        card["id"]: card
+        for card in serialize_product_cards(
+            pk for ids in block_ids.values() for pk in ids
         )
-    )
+    }
+
+    data = {
+        name: [cards[pk] for pk in ids if pk in cards]
+        for name, ids in block_ids.items()
+    }
+    data["categories"] = category_tree()
+    cache.set(cache_key, data, catalog_cache_timeout())
+    return Response(data)
 
-    # получаем все фильтры из строки запроса
-    filter_name = request.GET.get("filter[name]", "")
-    filter_min_price = float(request.GET.get("filter[minPrice]", 0))
-    filter_max_price = float(request.GET.get("filter[maxPrice]", 50000))
-    filter_available = request.GET.get("filter[available]")
-    filter_free_delivery = request.GET.get("filter[freeDelivery]")
-    filter_tags = request.GET.getlist("tags[]")
-    category_filter = request.GET.get("category")
+
+@catalog_conditional
+@api_view(["GET"])
+def product_catalog(request):
+    """
+    Представление на основе функции, обслуживает страницу catalog
+
+    Ответ кешируется по нормализованным параметрам запроса,
+    кеш сбрасывается при изменении версии каталога
+    """
+    # получаем все фильтры из строки запроса в каноническом виде
+    filters = catalog_filters(request.GET)
     # получаем все сортировки из строки запроса
     sort = request.GET.get("sort")
     sort_type = request.GET.get("sortType")
+    # пагинация
+    limit = max(int(request.GET.get("limit", 20)), 1)  # кол-во товаров на странице
+    current_page = int(request.GET.get("currentPage", 1))  # получаем текущую страницу
+    # режим курсора: ?pagination=cursor для первой страницы, далее ?cursor=...
+    cursor = request.GET.get("cursor")
+    cursor_mode = cursor is not None or request.GET.get("pagination") == "cursor"
 
     # логируем данные по фильтрации и сортировкам из запроса
     logger.info(
         f"Параметры фильтрации и сортировки запроса:\n"
-        f"  - Фильтр по имени товара: {filter_name}\n"
-        f"  - Фильтр по минимальной цене: {filter_min_price}\n"
-        f"  - Фильтр по максимальной цене: {filter_max_price}\n"
-        f"  - Только товары в наличии: {filter_available}\n"
-        f"  - Бесплатная доставка: {filter_free_delivery}\n"
-        f"  - Фильтр по категории: {category_filter}\n"
+        f"  - Фильтр по имени товара: {filters['name']}\n"
+        f"  - Фильтр по минимальной цене: {filters['min_price']}\n"
+        f"  - Фильтр по максимальной цене: {filters['max_price']}\n"
+        f"  - Только товары в наличии: {filters['available']}\n"
+        f"  - Бесплатная доставка: {filters['free_delivery']}\n"
+        f"  - Фильтр по категории: {filters['category']}\n"
         f"  - Сортировка по: {sort}\n"
         f"  - Тип сортировки: {sort_type}\n"
-        f"  - Массив тегов: {filter_tags}"
+        f"  - Массив тегов: {filters['tags']} ({filters['tags_mode']})"
     )
 
-    # проверяем, пришел ли в строке запроса фильтр, имени товара
-    if filter_name:
-        # поиск по имени продукта, накапливаем в qs условия фильтрации
-        products = products.filter(title__icontains=filter_name)
-    # проверяем что minPrice не равно 0, значение фильтра передано!
-    if filter_min_price != 0:
-        # применяя фильтр >= minPrice, накапливаем в qs условия фильтрации
-        products = products.filter(price__gte=filter_min_price)
-    # проверяем что maxPrice передано и применяем фильтр
-    if filter_max_price != 50000:
-        # применяя фильтр <= maxPrice, накапливаем в qs условия фильтрации
-        products = products.filter(price__lte=filter_max_price)
-    # проверяем, пришел ли в строке запроса фильтр, наличия товара
-    if filter_available == "true":
-        # применяя фильтр available=True, накапливаем в qs условия фильтрации
-        products = products.filter(count__gt=0)
-    # проверяем, пришел ли в строке запроса фильтр, бесплатная доставка
-    if filter_free_delivery == "true":
-        # применяя фильтр freeDelivery=True, накапливаем в qs условия фильтрации
-        products = products.filter(free_delivery=True)
-    # проверяем, пришел ли в строке запроса массив с тегами ['1', '2']
-    if filter_tags:
-        products = products.filter(tags__pk__in=filter_tags).distinct()
-    # проверяем, пришел ли в строке запроса фильтр, category
-    if category_filter:
-        # применяя фильтр category, накапливаем в qs условия фильтрации
-        products = products.filter(category=category_filter)
-
-    # применяем сортировки
-    if sort == "price" and sort_type == "inc":
-        # если сортировка по цене, от меньшего к большему
-        products = products.order_by("price")
-    elif sort == "price" and sort_type == "dec":
-        products = products.order_by("-price")
-    elif sort == "reviews" and sort_type == "dec":
-        # products = products.annotate(review_count=Count('reviews'))
-        products = products.order_by("-reviews_count")
-    elif sort == "reviews" and sort_type == "inc":
-        # products = products.annotate(review_count=Count('reviews'))
-        products = products.order_by("reviews_count")
-    elif sort == "date" and sort_type == "inc":
-        products = products.order_by("date")
-    elif sort == "date" and sort_type == "dec":
-        products = products.order_by("-date")
-    # сортировка по рейтингу
-    elif sort == "rating":
-        # products = products.annotate(
-        #     avg_rating=Coalesce(Avg('reviews__rate'), 0.0))
-        if sort_type == "dec":
-            # по убыванию среднего рейтинга
-            products = products.order_by("-avg_rating")
-        else:
-            # по возрастанию среднего рейтинга
-            products = products.order_by("avg_rating")
-
-    # пагинация
-    limit = int(request.GET.get("limit", 20))  # получаем кол-во товаров на странице
-    current_page = int(request.GET.get("currentPage", 1))  # получаем текущую страницу
-
-    paginator = Paginator(products, limit)  # В пагинатор передаем qs и лимит страниц
-    products_page = paginator.get_page(
-        current_page
-    )  # получаем только товары с переданной в запросе страницы
+    cache_key = catalog_cache_key(
+        "page",
+        {
+            **filters,
+            "sort": sort,
+            "sort_type": sort_type,
+            "limit": limit,
+            # в режиме курсора номер страницы определяется самим курсором
+            "page": (cursor or "") if cursor_mode else current_page,
+            "cursor_mode": cursor_mode,
+        },
+    )
+    data = cache.get(cache_key)
+    if data is not None:
+        record_cache_hit()
+        return Response(data)
+    record_cache_miss()
+
+    # анонимный трафик без поиска по имени может обслуживать колоночный движок
+    # в памяти (CATALOG_COLUMNAR_ENGINE): из базы читаются только товары страницы
+    engine = get_catalog_engine() if request.user.is_anonymous else None
+    if engine is not None and not cursor_mode:
+        result = engine.query(filters, sort, sort_type, current_page, limit)
+        if result is not None:
+            page_ids, total = result
+            data = {
+                "items": serialize_product_cards(page_ids),
+                "currentPage": current_page,
+                "lastPage": page_number(current_page, total, limit)[1],
+            }
+            cache.set(cache_key, data, catalog_cache_timeout())
+            return Response(data)
 
-    # В сериализатор передаем обьекты продуктов с пагинацией
-    serializer = ProductSerializer(products_page, many=True)
+    # получаем все доступные продукты
+    # кол-во отзывов и средний рейтинг хранятся в колонках товара (reviews_count, avg_rating)
+    # карточки товаров страницы сериализуются отдельно (serialize_product_cards)
+    products = filter_products(Product.objects.filter(archived=False), filters)
+
+    # применяем сортировки, последним ключом всегда идет id товара;
+    # без явной сортировки результаты поиска выдаем по релевантности
+    ordering = catalog_ordering(
+        sort, sort_type, ranked="search_rank" in products.query.annotations
+    )
+    products = products.order_by(*ordering)
+
+    if cursor_mode:
+        # без COUNT(*) и OFFSET, lastPage известен только на одну страницу вперед
+        # для курсора нужны только id и ключ сортировки товаров страницы
+        key_fields = {"pk", ordering[0].lstrip("-")} - {"search_rank"}
+        try:
+            page = paginate_by_cursor(
+                products.only(*key_fields), ordering, cursor, limit
+            )
+        except InvalidCursor:
+            return Response({"error": "Некорректный cursor"}, status=400)
+        data = {
+            "items": serialize_product_cards(product.pk for product in page.items),
+            "currentPage": page.number,
+            "lastPage": page.number + 1 if page.next_cursor else page.number,
+            "nextCursor": page.next_cursor,
+        }
+    else:
+        # кол-во товаров считаем отдельным дешевым запросом с коротким кешем
+        number, num_pages = page_number(current_page, catalog_count(filters), limit)
+        # получаем только товары с переданной в запросе страницы
+        page_ids = products[(number - 1) * limit : number * limit].values_list(
+            "pk", flat=True
+        )
 
-    return Response(
-        {
-            "items": serializer.data,
+        # сериализуем карточки товаров страницы
+        data = {
+            "items": serialize_product_cards(page_ids),
             "currentPage": current_page,
-            "lastPage": paginator.num_pages,
+            "lastPage": num_pages,
         }
-    )
+
+    cache.set(cache_key, data, catalog_cache_timeout())
+    return Response(data)
 
 
+@catalog_conditional
+@api_view(["GET"])
+def catalog_facets_view(request):
+    """
+    Представление на основе функции, фасеты для боковой панели каталога
+
+    GET /catalog/facets/
+    Принимает те же фильтры, что и catalog, и возвращает кол-во товаров
+    по тегам, категориям, наличию, бесплатной доставке и гистограмму цен
+    """
+    filters = catalog_filters(request.GET)
+    cache_key = catalog_cache_key("facets", filters)
+    data = cache.get(cache_key)
+    if data is not None:
+        record_cache_hit()
+        return Response(data)
+    record_cache_miss()
+
+    products = filter_products(Product.objects.filter(archived=False), filters)
+    data = catalog_facets(products)
+    cache.set(cache_key, data, catalog_cache_timeout())
+    return Response(data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    """
+    Счетчики попаданий и промахов кеша каталога (только для администраторов)
+
+    GET /catalog/cache-stats/
+    """
+    return Response(get_cache_stats())
+
+
+@catalog_conditional
 @api_view(["GET"])
 def tags_popular(request):
     """
     представление на основе функции
 
     обрабатывает запрос GET tags/
-    отдает теги товаров
+    отдает теги товаров категории (вместе с подкатегориями) или всего каталога
+    по убыванию кол-ва товаров. Теги читаются из индекса CategoryTag,
+    ответ кешируется под версией каталога
     """
-    category = request.GET.get("category", None)
-
-    if category:
-        # получаем все товары относящиеся к переданной категории
-        products = Product.objects.filter(category_id=category)
-        # получаем все теги от продуктов с переданной категорией
-        tags = Tag.objects.filter(products__in=products).distinct()
-        return Response([{"id": tag.pk, "name": tag.name} for tag in tags])
-
-    tags = Tag.objects.all()
+    category = request.GET.get("category") or None
+    cache_key = catalog_cache_key("tags", {"category": category})
+    data = cache.get(cache_key)
+    if data is not None:
+        record_cache_hit()
+        return Response(data)
+    record_cache_miss()
 
-    return Response([{"id": tag.pk, "name": tag.name} for tag in tags])
+    data = category_tags(category)
+    cache.set(cache_key, data, catalog_cache_timeout())
+    return Response(data)
 
 
+@sales_conditional
 @api_view(["GET"])
 def discounted_products(request):
     """
     Представление на основе функции, обслуживает страницу товаров со скидкой
 
     GET /sales
+    Список действующих скидок меняется только в полночь, поэтому страница
+    кешируется до конца текущих суток (и сбрасывается с версией каталога)
     """
-    current_data = timezone.now().date()
-    # получаем все активные скидки\акции Sale
-    queryset = Sale.objects.filter(
-        date_from__lte=current_data, date_to__gte=current_data
-    )
+    today = timezone.localdate()
     # получаем текущую страницу
     current_page = int(request.GET.get("currentPage", 1))
     # лимит товаров на 1 странице
-    limit = 10
+    limit = max(int(request.GET.get("limit", settings.CATALOG_SALES_PAGE_SIZE)), 1)
+
+    cache_key = catalog_cache_key(
+        "sales", {"date": today, "page": current_page, "limit": limit}
+    )
+    data = cache.get(cache_key)
+    if data is not None:
+        record_cache_hit()
+        return Response(data)
+    record_cache_miss()
+
+    # получаем все активные скидки\акции Sale вместе с товарами и их картинками
+    # (условие и сортировка по датам читают индекс sale_active_dates_idx)
+    queryset = (
+        Sale.objects.filter(date_from__lte=today, date_to__gte=today)
+        .select_related("product")
+        .prefetch_related("product__images")
+        .order_by(*SALES_ORDERING)
+    )
 
     paginator = Paginator(queryset, limit)  # В пагинатор передаем qs и лимит страниц
     last_page = paginator.num_pages  # вычисляем последнюю страницу
@@ -266,34 +453,90 @@ def discounted_products(request):
     # В сериализатор передаем обьекты Sale (акции с товарами по скидке)
     serializer = SalesSerializer(sale_page, many=True)
 
-    return Response(
-        {"items": serializer.data, "currentPage": current_page, "lastPage": last_page}
-    )
+    data = {
+        "items": serializer.data,
+        "currentPage": current_page,
+        "lastPage": last_page,
+    }
+    cache.set(cache_key, data, seconds_until_midnight())
+    return Response(data)
 
 
-class ProductReviewCreateView(CreateAPIView):
+class ProductReviewsView(ListCreateAPIView):
     """
-    представление на основе класса CreateAPIView
+    представление на основе класса ListCreateAPIView
 
-    Обеспечивает создание отзыва о конкретном товаре
+    GET - отзывы товара постранично, новые сверху
+    (?limit=, продолжение - по ?cursor= из nextCursor/next)
+    POST - создание отзыва о конкретном товаре, в ответе только новый отзыв
+    и обновленные счетчики товара, без перечитывания всех отзывов
     """
 
     serializer_class = ReviewSerializer
+    max_limit = 100
+
+    def list(self, request, *args, **kwargs):
+        product = get_object_or_404(
+            Product.objects.only("pk", "reviews_count"), pk=self.kwargs["id"]
+        )
+        try:
+            limit = int(request.GET.get("limit", reviews_page_size()))
+        except ValueError:
+            limit = reviews_page_size()
+        limit = min(max(limit, 1), self.max_limit)
+        reviews = Review.objects.filter(product_id=product.pk).only(
+            "author", "email", "text", "rate", "date"
+        )
+        try:
+            page = paginate_by_cursor(
+                reviews, REVIEWS_ORDERING, request.GET.get("cursor"), limit
+            )
+        except InvalidCursor:
+            return Response(
+                {"error": "Некорректный cursor"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        next_url = None
+        if page.next_cursor:
+            next_url = (
+                f"{reverse('product_reviews', args=[product.pk])}"
+                f"?cursor={page.next_cursor}&limit={limit}"
+            )
+        return Response(
+            {
+                "items": ReviewSerializer(page.items, many=True).data,
+                "nextCursor": page.next_cursor,
+                "next": next_url,
+                "total": product.reviews_count,
+            }
+        )
 
     def perform_create(self, serializer):
         """
         переопределяем родительский метод perform_create
 
-        он сохранит и вернет отзыв о конкретном товаре
+        он сохранит отзыв о конкретном товаре и вернет товар с новыми счетчиками
         """
         product_pk = self.kwargs["id"]
-        queryset = Product.objects
+        queryset = Product.objects.only("pk")
         product = get_object_or_404(queryset, id=product_pk)
-        serializer.save(product=product)
+        # счетчики отзывов товара сдвигает сигнал post_save отзыва,
+        # в той же транзакции читаем их новые значения
+        with transaction.atomic():
+            serializer.save(product=product)
+            return Product.objects.only(
+                "reviews_count", "avg_rating", *RATING_HISTOGRAM_FIELDS
+            ).get(pk=product.pk)
 
     def create(self, request, *args, **kwargs):
-        super().create(request, *args, **kwargs)
-        product_pk = self.kwargs["id"]
-        reviews = Review.objects.filter(product=product_pk)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = self.perform_create(serializer)
+        return Response(
+            {
+                "review": serializer.data,
+                "reviewsCount": product.reviews_count,
+                "rating": product.avg_rating or 0,
+                "ratingHistogram": rating_histogram(product),
+            },
+            status=status.HTTP_201_CREATED,
+        )